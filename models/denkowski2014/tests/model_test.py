@@ -38,3 +38,32 @@ class TestDenkowski2014Models(unittest.TestCase):
         assert len(expected_micro) == len(actual_micro)
         for expected, actual in zip(expected_micro, actual_micro):
             assert_dicts_approx_equal(expected, actual, abs=1e-4)
+
+    def test_meteor_server(self):
+        # Runs the inputs through the METEOR server twice to ensure the
+        # server returns the same scores as the file-based backend
+        inputs = [
+            {
+                "candidate": inp["candidate"],
+                "references": inp["references"][:2],
+            }
+            for inp in self.multiling2011_examples
+        ]
+        expected_macro = self.multiling2011_expected["macro"]
+        expected_micro = self.multiling2011_expected["micro"]
+
+        with METEOR(server=True) as metric:
+            for _ in range(2):
+                actual_macro, actual_micro = metric.predict_batch(inputs)
+                assert_dicts_approx_equal(expected_macro, actual_macro, abs=1e-4)
+                assert len(expected_micro) == len(actual_micro)
+                for expected, actual in zip(expected_micro, actual_micro):
+                    assert_dicts_approx_equal(expected, actual, abs=1e-4)
+
+            # The server does not require the same number of references
+            inputs = [
+                {"candidate": inp["candidate"], "references": inp["references"]}
+                for inp in self.multiling2011_examples
+            ]
+            _, micro = metric.predict_batch(inputs)
+            assert len(micro) == len(inputs)
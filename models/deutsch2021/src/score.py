@@ -1,12 +1,60 @@
 import argparse
 import json
+import sys
+
+from typing import Any, Dict, List
 
 from qaeval import QAEval
 
 
-def main(args):
+class CachedReferenceQAEval(QAEval):
+    """
+    A `QAEval` which does not generate the QA pairs for references that are
+    in `reference_qa_pairs`, a mapping from the reference to its QA pairs.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.reference_qa_pairs = {}
+
+    def _generate_qa_pairs(
+        self, references_list: List[List[str]]
+    ) -> List[List[List[Dict[str, Any]]]]:
+        qa_pairs_dict = dict(self.reference_qa_pairs)
+        missing = []
+        for references in references_list:
+            for reference in references:
+                if reference not in qa_pairs_dict:
+                    qa_pairs_dict[reference] = None
+                    missing.append(reference)
+
+        if len(missing) > 0:
+            generated = super()._generate_qa_pairs(
+                [[reference] for reference in missing]
+            )
+            for reference, (qa_pairs,) in zip(missing, generated):
+                qa_pairs_dict[reference] = qa_pairs
+
+        # The question IDs depend on the position of the reference in the input
+        qa_pairs_lists = []
+        for i, references in enumerate(references_list):
+            qa_pairs_lists.append([])
+            for j, reference in enumerate(references):
+                qa_pairs_lists[-1].append([])
+                for qa in qa_pairs_dict[reference]:
+                    question_id = self._get_question_id(
+                        i, j, qa["answer_start"], qa["answer_end"]
+                    )
+                    qa = {
+                        key: value for key, value in qa.items() if key != "question_id"
+                    }
+                    qa_pairs_lists[-1][-1].append({"question_id": question_id, **qa})
+        return qa_pairs_lists
+
+
+def load_metric(args) -> CachedReferenceQAEval:
     kwargs = json.loads(args.kwargs)
-    metric = QAEval(
+    return CachedReferenceQAEval(
         generation_model_path="models/generation/model.tar.gz",
         answering_model_dir="models/answering",
         lerc_model_path="models/lerc/model.tar.gz",
@@ -14,6 +62,10 @@ def main(args):
         **kwargs
     )
 
+
+def main(args):
+    metric = load_metric(args)
+
     candidates = []
     references_list = []
     with open(args.input_file, "r") as f:
@@ -22,6 +74,10 @@ def main(args):
             candidates.append(data["candidate"])
             references_list.append(data["references"])
 
+    if args.qa_pairs_file:
+        with open(args.qa_pairs_file, "r") as f:
+            metric.reference_qa_pairs = json.load(f)
+
     results = metric.score_batch(candidates, references_list, return_qa_pairs=True)
 
     with open(args.output_file, "w") as out:
@@ -29,10 +85,49 @@ def main(args):
             out.write(json.dumps({"metrics": metrics, "qa_pairs": qa_pairs}) + "\n")
 
 
+def serve(args):
+    # Responses are written to the original stdout. Anything else which is
+    # printed (e.g., by the libraries) goes to stderr so it does not break the protocol
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+
+    metric = load_metric(args)
+
+    for line in sys.stdin:
+        try:
+            request = json.loads(line)
+            metric.reference_qa_pairs = request.get("reference_qa_pairs", {})
+            results = metric.score_batch(
+                request["candidates"], request["references_list"], return_qa_pairs=True
+            )
+            outputs = [
+                {"metrics": metrics, "qa_pairs": qa_pairs}
+                for metrics, qa_pairs in results
+            ]
+            response = {"outputs": outputs}
+        except Exception as e:
+            response = {"error": repr(e)}
+        protocol_out.write(json.dumps(response) + "\n")
+        protocol_out.flush()
+
+
 if __name__ == "__main__":
     argp = argparse.ArgumentParser()
-    argp.add_argument("--input-file", required=True)
+    argp.add_argument("--input-file")
     argp.add_argument("--kwargs", required=True)
-    argp.add_argument("--output-file", required=True)
+    argp.add_argument("--output-file")
+    argp.add_argument(
+        "--qa-pairs-file",
+        help="A json file which maps references to QA pairs that do not need to be generated again",
+    )
+    argp.add_argument(
+        "--server",
+        action="store_true",
+        help="Keeps the models loaded and answers json requests on stdin",
+    )
     args = argp.parse_args()
-    main(args)
+
+    if args.server:
+        serve(args)
+    else:
+        main(args)
@@ -96,6 +96,33 @@ class TestDeutsch2021Models(unittest.TestCase):
         for expected, actual in zip(expected_micro, actual_micro):
             assert_dicts_approx_equal(expected, actual, abs=1e-4)
 
+    @parameterized.expand(
+        get_testing_device_parameters(gpu_only=True), skip_on_empty=True
+    )
+    def test_qaeval_cached_qa_pairs(self, device: int):
+        # The second call reuses the QA pairs which were generated for the
+        # references by the first, so the results should be identical
+        model = QAEval(device=device)
+        inputs = self.multiling2011_examples
+        expected_macro, expected_micro, expected_qa_pairs = model.predict_batch(
+            inputs, return_qa_pairs=True
+        )
+        actual_macro, actual_micro, actual_qa_pairs = model.predict_batch(
+            inputs[::-1], return_qa_pairs=True
+        )
+
+        assert_dicts_approx_equal(expected_macro, actual_macro, abs=1e-4)
+        for expected, actual in zip(expected_micro, actual_micro[::-1]):
+            assert_dicts_approx_equal(expected, actual, abs=1e-4)
+        for expected, actual in zip(expected_qa_pairs, actual_qa_pairs[::-1]):
+            expected = [
+                [qa["question"]["question"] for qa in qa_pairs] for qa_pairs in expected
+            ]
+            actual = [
+                [qa["question"]["question"] for qa in qa_pairs] for qa_pairs in actual
+            ]
+            assert expected == actual
+
     @parameterized.expand(
         get_testing_device_parameters(gpu_only=True), skip_on_empty=True
     )
@@ -4,13 +4,11 @@ input=$1
 output=$2
 model=$3
 device=$4
-sleep=$5
 
-# Start the CoreNLP server and sleep
+# Start the CoreNLP server. score.py waits until it is ready
 cd stanford-corenlp-full-2018-01-31
 java -mx4g -cp "*" edu.stanford.nlp.pipeline.StanfordCoreNLPServer &
 CORENLP_PID=$!
-sleep ${sleep}
 
 # Run the scoring script
 cd ../dae-factuality
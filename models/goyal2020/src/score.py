@@ -4,9 +4,16 @@ to calculate the scores for input text rather than evaluate the accuracy.
 """
 # fmt: off
 import argparse
+import atexit
 import os
 import json
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
+import requests
 import torch
 import utils
 from sklearn.utils.extmath import softmax
@@ -24,10 +31,60 @@ MODEL_CLASSES = {"bert_dae": (BertConfig, utils.BertDAEModel, BertTokenizer),
                  "electra_dae": (ElectraConfig, utils.ElectraDAEModel, ElectraTokenizer), }
 
 
-def score_example_single_context(decode_text, input_text, model, tokenizer, args):
-    gen_tok, _, gen_dep = get_relevant_deps_and_context(decode_text, args)
+CORENLP_URL = "http://localhost:9000"
+
+
+def is_corenlp_ready():
+    # The server is ready once it can answer a small annotation request
+    properties = json.dumps({"annotators": "tokenize", "outputFormat": "json"})
+    try:
+        response = requests.post(CORENLP_URL, params={"properties": properties}, data=b"ready", timeout=5)
+        return response.status_code == 200
+    except requests.exceptions.RequestException:
+        return False
+
+
+def wait_for_corenlp(timeout):
+    # Polls the CoreNLP server until it is ready instead of sleeping for a fixed time
+    deadline = time.time() + timeout
+    while not is_corenlp_ready():
+        if time.time() > deadline:
+            raise Exception(f"The CoreNLP server was not ready after {timeout} seconds")
+        time.sleep(0.1)
 
+
+def start_corenlp(corenlp_dir, timeout):
+    # Starts a CoreNLP server which is stopped when this process exits. Its output
+    # goes to stderr so that it does not get mixed with the server's responses
+    if is_corenlp_ready():
+        return
+    process = subprocess.Popen(
+        ["java", "-mx4g", "-cp", "*", "edu.stanford.nlp.pipeline.StanfordCoreNLPServer"],
+        cwd=corenlp_dir,
+        stdout=sys.stderr,
+        stderr=sys.stderr,
+    )
+    atexit.register(process.terminate)
+    wait_for_corenlp(timeout)
+
+
+def parse_example(decode_text, input_text, args):
+    gen_tok, _, gen_dep = get_relevant_deps_and_context(decode_text, args)
     tokenized_text = get_tokens(input_text)
+    return gen_tok, gen_dep, tokenized_text
+
+
+def parse_examples(candidates, sources, args):
+    # The CoreNLP server processes requests in parallel, so the parses for all of the
+    # examples are requested concurrently instead of one at a time
+    with ThreadPoolExecutor(args.corenlp_threads) as executor:
+        return list(executor.map(lambda example: parse_example(*example, args), zip(candidates, sources)))
+
+
+def score_example_single_context(decode_text, input_text, model, tokenizer, args, parse=None):
+    if parse is None:
+        parse = parse_example(decode_text, input_text, args)
+    gen_tok, gen_dep, tokenized_text = parse
 
     ex = {'input': tokenized_text, 'deps': [], 'context': ' '.join(gen_tok), 'sentlabel': -1}
     for dep in gen_dep:
@@ -78,24 +135,26 @@ def score_example_single_context(decode_text, input_text, model, tokenizer, args
     tmp_eval_loss, logits = outputs[:2]
     preds = logits.detach().cpu().numpy()
 
-    f_out = open('test.txt', 'a')
-    text = tokenizer.decode(input_ids[0])
-    text = text.replace(tokenizer.pad_token, '').strip()
-    f_out.write(text + '\n')
-    for j, arc in enumerate(arcs[0]):
-        arc_text = tokenizer.decode(arc)
-        arc_text = arc_text.replace(tokenizer.pad_token, '').strip()
+    # The debug output is not written by the server because the file would keep growing
+    if not args.server:
+        f_out = open('test.txt', 'a')
+        text = tokenizer.decode(input_ids[0])
+        text = text.replace(tokenizer.pad_token, '').strip()
+        f_out.write(text + '\n')
+        for j, arc in enumerate(arcs[0]):
+            arc_text = tokenizer.decode(arc)
+            arc_text = arc_text.replace(tokenizer.pad_token, '').strip()
 
-        if arc_text == '':
-            break
+            if arc_text == '':
+                break
 
-        pred_temp = softmax([preds[0][j]])
-        f_out.write(arc_text + '\n')
-        f_out.write('pred:\t' + str(np.argmax(pred_temp)) + '\n')
-        f_out.write(str(pred_temp[0][0]) + '\t' + str(pred_temp[0][1]) + '\n')
-        f_out.write('\n')
+            pred_temp = softmax([preds[0][j]])
+            f_out.write(arc_text + '\n')
+            f_out.write('pred:\t' + str(np.argmax(pred_temp)) + '\n')
+            f_out.write(str(pred_temp[0][0]) + '\t' + str(pred_temp[0][1]) + '\n')
+            f_out.write('\n')
 
-    f_out.close()
+        f_out.close()
     preds = preds.reshape(-1, 2)
     preds = softmax(preds)
     preds = preds[:, 1]
@@ -104,6 +163,28 @@ def score_example_single_context(decode_text, input_text, model, tokenizer, args
     return score
 
 
+def score_examples(candidates, sources, model, tokenizer, args):
+    parses = parse_examples(candidates, sources, args)
+    return [
+        float(score_example_single_context(candidate, source, model, tokenizer, args, parse=parse))
+        for candidate, source, parse in zip(candidates, sources, parses)
+    ]
+
+
+def serve(model, tokenizer, args, protocol_out):
+    start_corenlp(args.corenlp_dir, args.corenlp_timeout)
+
+    for line in sys.stdin:
+        try:
+            request = json.loads(line)
+            scores = score_examples(request["candidates"], request["sources"], model, tokenizer, args)
+            response = {"outputs": [{"dae": score} for score in scores]}
+        except Exception as e:
+            response = {"error": repr(e)}
+        protocol_out.write(json.dumps(response) + "\n")
+        protocol_out.flush()
+
+
 def main():
     parser = argparse.ArgumentParser()
 
@@ -138,11 +219,24 @@ def main():
     parser.add_argument("--gpu_device", type=int, default=0, help="gpu device")
     parser.add_argument("--dependency_type", default='enhancedDependencies', help='type of dependency labels')
 
-    parser.add_argument("--input-file", required=True)
-    parser.add_argument("--output-file", required=True)
+    parser.add_argument("--input-file")
+    parser.add_argument("--output-file")
+    parser.add_argument("--server", action="store_true", help="Keeps the model loaded and answers json requests on stdin")
+    parser.add_argument("--corenlp-dir", default="../stanford-corenlp-full-2018-01-31",
+                        help="The CoreNLP directory, used to start the CoreNLP server in server mode")
+    parser.add_argument("--corenlp-timeout", type=float, default=300,
+                        help="The number of seconds to wait for the CoreNLP server to be ready")
+    parser.add_argument("--corenlp-threads", type=int, default=4,
+                        help="The number of parsing requests which are sent to the CoreNLP server at once")
 
     args = parser.parse_args()
 
+    # In server mode, responses are written to the original stdout. Anything else which
+    # is printed (e.g., by the libraries) goes to stderr so it does not break the protocol
+    protocol_out = sys.stdout
+    if args.server:
+        sys.stdout = sys.stderr
+
     args.n_gpu = 1
     if args.gpu_device != -1:
         device = torch.device("cuda", args.gpu_device)
@@ -161,15 +255,23 @@ def main():
     model = model_class.from_pretrained(args.input_dir)
     model.to(args.device)
 
+    if args.server:
+        serve(model, tokenizer, args, protocol_out)
+        return
+
+    candidates, sources = [], []
+    with open(args.input_file, "r") as f:
+        for line in f:
+            data = json.loads(line)
+            candidates.append(data["candidate"])
+            sources.append(data["source"])
+
+    # The CoreNLP server is started by run.sh
+    wait_for_corenlp(args.corenlp_timeout)
+    scores = score_examples(candidates, sources, model, tokenizer, args)
     with open(args.output_file, "w") as out:
-        with open(args.input_file, "r") as f:
-            for line in f:
-                data = json.loads(line)
-                candidate = data["candidate"]
-                source = data["source"]
-
-                score = score_example_single_context(candidate, source, model, tokenizer, args)
-                out.write(json.dumps({"dae": float(score)}) + "\n")
+        for score in scores:
+            out.write(json.dumps({"dae": score}) + "\n")
 
 
 if __name__ == "__main__":
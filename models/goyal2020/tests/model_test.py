@@ -56,3 +56,23 @@ class TestGoyal2020Models(unittest.TestCase):
         assert len(expected_micro) == len(actual_micro)
         for expected, actual in zip(expected_micro, actual_micro):
             assert_dicts_approx_equal(expected, actual, abs=1e-4)
+
+    @parameterized.expand(get_testing_device_parameters())
+    def test_dae_server(self, device: int):
+        # Runs the same inputs through the server twice to ensure the
+        # reused model returns the same scores as the regular backend
+        inputs = [
+            {
+                "candidate": example["candidate"][0],
+                "sources": [example["sources"][0][0]],
+            }
+            for example in self.examples
+        ]
+        expected_micro = self.expected["dae_w_syn"]["micro"]
+
+        with DAE(device=device, server=True) as model:
+            for _ in range(2):
+                _, actual_micro = model.predict_batch(inputs)
+                assert len(expected_micro) == len(actual_micro)
+                for expected, actual in zip(expected_micro, actual_micro):
+                    assert_dicts_approx_equal(expected, actual, abs=1e-4)
@@ -0,0 +1,135 @@
+import argparse
+import hashlib
+import json
+import numpy as np
+import torch
+from typing import Callable, List
+
+import clip
+import clipscore
+from embedding_store import EmbeddingStore
+
+MODEL_NAME = "ViT-B/32"
+
+# This script computes the same scores as the `main` function of the original
+# repository's clipscore.py, except that the images are passed as a list of paths
+# instead of a directory. If an embedding store is used, `extract_all_images` and
+# `extract_all_captions` are replaced by versions which only encode the images and
+# texts that are not in the store. The images are keyed by the digest of the file's
+# contents, so the same image is found in the store under any path.
+
+
+def _get_file_digest(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cache_features(
+    store: EmbeddingStore,
+    extract_function: Callable,
+    get_key: Callable[[str], str],
+    device: str,
+) -> Callable:
+    # The model runs in float16 on the GPU, so the features are
+    # returned with the same dtype as the original function
+    dtype = np.float16 if device == "cuda" else np.float32
+
+    def extract(items: List[str], model, device: str, **kwargs) -> np.ndarray:
+        keys = [get_key(item) for item in items]
+        features = store.get_many(keys)
+
+        missing = {}
+        for key, item in zip(keys, items):
+            if key not in features and key not in missing:
+                missing[key] = item
+        if len(missing) > 0:
+            computed = extract_function(list(missing.values()), model, device, **kwargs)
+            # The stored features are float16, so the new ones are rounded the same way
+            computed = dict(zip(missing.keys(), computed.astype(np.float16)))
+            store.put_many(computed)
+            features.update(computed)
+
+        return np.vstack([features[key] for key in keys]).astype(dtype)
+
+    return extract
+
+
+def main(args):
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    if args.embedding_store is not None:
+        store = EmbeddingStore(args.embedding_store)
+        clipscore.extract_all_images = _cache_features(
+            store,
+            clipscore.extract_all_images,
+            lambda path: store.get_key(
+                f"{MODEL_NAME}-{device}-image", -1, _get_file_digest(path)
+            ),
+            device,
+        )
+        clipscore.extract_all_captions = _cache_features(
+            store,
+            clipscore.extract_all_captions,
+            lambda text: store.get_key(f"{MODEL_NAME}-{device}-text", -1, text),
+            device,
+        )
+
+    candidates = []
+    image_files = []
+    references_list = []
+    with open(args.input_file, "r") as f:
+        for line in f:
+            data = json.loads(line)
+            candidates.append(data["candidate"])
+            image_files.append(data["image_file"])
+            references_list.append(data.get("references"))
+    has_references = all(references is not None for references in references_list)
+
+    model, _ = clip.load(MODEL_NAME, device=device, jit=False)
+    model.eval()
+
+    # The images are decoded lazily from their paths by the data loader
+    image_feats = clipscore.extract_all_images(
+        image_files, model, device, batch_size=64, num_workers=8
+    )
+    _, per_instance_image_text, candidate_feats = clipscore.get_clip_score(
+        model, image_feats, candidates, device
+    )
+
+    if has_references:
+        _, per_instance_text_text = clipscore.get_refonlyclipscore(
+            model, references_list, candidate_feats, device
+        )
+        per_instance_text_text = np.array(per_instance_text_text)
+        refclipscores = (
+            2
+            * per_instance_image_text
+            * per_instance_text_text
+            / (per_instance_image_text + per_instance_text_text)
+        )
+        scores = [
+            {"CLIPScore": float(image_text), "RefCLIPScore": float(refclipscore)}
+            for image_text, refclipscore in zip(per_instance_image_text, refclipscores)
+        ]
+    else:
+        scores = [{"CLIPScore": float(score)} for score in per_instance_image_text]
+
+    with open(args.output_file, "w") as out:
+        for score in scores:
+            out.write(json.dumps(score) + "\n")
+
+
+if __name__ == "__main__":
+    argp = argparse.ArgumentParser()
+    argp.add_argument("--input-file", required=True)
+    argp.add_argument("--output-file", required=True)
+    argp.add_argument(
+        "--embedding-store",
+        help="The directory of an embedding store which is used to avoid "
+        "encoding the same images and texts again",
+    )
+    args = argp.parse_args()
+    main(args)
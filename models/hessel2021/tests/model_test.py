@@ -1,6 +1,9 @@
 import json
+import os
+import shutil
 import unittest
 from parameterized import parameterized
+from tempfile import TemporaryDirectory
 
 from repro.models.hessel2021 import CLIPScore
 from repro.testing import assert_dicts_approx_equal, get_testing_device_parameters
@@ -93,3 +96,39 @@ class TestHessel2021Models(unittest.TestCase):
         assert len(expected_micro) == len(actual_micro)
         for expected, actual in zip(expected_micro, actual_micro):
             assert_dicts_approx_equal(expected, actual, abs=1e-4)
+
+    @parameterized.expand(get_testing_device_parameters())
+    def test_clipscore_cache_embeddings(self, device: int):
+        # The features are rounded to float16 on the CPU, so the scores are only
+        # approximately equal to the expected ones. The second pass reads the images
+        # from copies with different names, which must be found in the store by their
+        # contents and give the same scores as the first pass
+        device_str = "cpu" if device == -1 else "gpu"
+        expected_micro = self.good_examples["metrics"]["reference_based"][device_str][
+            "micro"
+        ]
+
+        with TemporaryDirectory() as temp:
+            os.makedirs(f"{temp}/images")
+            inputs = []
+            copied_inputs = []
+            for i, image_file in enumerate(self.good_examples["image_files"]):
+                copied_file = f"{temp}/images/copy-{i}.jpeg"
+                shutil.copy(f"{FIXTURES_ROOT}/{image_file}", copied_file)
+                inp = {
+                    "candidate": self.good_examples["candidates"][i],
+                    "references": self.good_examples["references"][i],
+                }
+                inputs.append({**inp, "image_file": f"{FIXTURES_ROOT}/{image_file}"})
+                copied_inputs.append({**inp, "image_file": copied_file})
+
+            model = CLIPScore(
+                device=device, cache_embeddings=True, embeddings_dir=f"{temp}/store"
+            )
+            _, first_micro = model.predict_batch(inputs)
+            _, second_micro = model.predict_batch(copied_inputs)
+
+        assert len(expected_micro) == len(first_micro) == len(second_micro)
+        for expected, first, second in zip(expected_micro, first_micro, second_micro):
+            assert_dicts_approx_equal(expected, first, abs=1e-3)
+            assert_dicts_approx_equal(first, second, abs=1e-6)
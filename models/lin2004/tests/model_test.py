@@ -1,7 +1,9 @@
 import json
+import pytest
 import unittest
 
 from repro.models.lin2004 import ROUGE
+from repro.models.lin2004.python_rouge import stem
 from repro.testing import FIXTURES_ROOT as REPRO_FIXTURES_ROOT
 from repro.testing import assert_dicts_approx_equal
 
@@ -28,3 +30,81 @@ class TestLin2004Models(unittest.TestCase):
         assert_dicts_approx_equal(expected_macro, actual_macro, abs=1e-4)
         for expected, actual in zip(expected_micro, actual_micro):
             assert_dicts_approx_equal(expected, actual, abs=1e-4)
+
+    def test_rouge_python_backend(self):
+        # The Python backend should exactly replicate the Perl output
+        model = ROUGE(backend="python")
+        inputs = [
+            {"candidate": inp["candidate"], "references": inp["references"]}
+            for inp in self.examples
+        ]
+        expected_macro = self.expected["macro"]
+        expected_micro = self.expected["micro"]
+        actual_macro, actual_micro = model.predict_batch(inputs)
+
+        assert_dicts_approx_equal(expected_macro, actual_macro, abs=1e-4)
+        for expected, actual in zip(expected_micro, actual_micro):
+            assert_dicts_approx_equal(expected, actual, abs=1e-4)
+
+    def test_rouge_num_shards(self):
+        # Sharding the inputs across processes should not change the scores
+        model = ROUGE(num_shards=4)
+        inputs = [
+            {"candidate": inp["candidate"], "references": inp["references"]}
+            for inp in self.examples
+        ]
+        expected_macro = self.expected["macro"]
+        expected_micro = self.expected["micro"]
+        actual_macro, actual_micro = model.predict_batch(inputs)
+
+        assert_dicts_approx_equal(expected_macro, actual_macro, abs=1e-4)
+        for expected, actual in zip(expected_micro, actual_micro):
+            assert_dicts_approx_equal(expected, actual, abs=1e-4)
+
+    def test_stem(self):
+        # Verified against the `stem` subroutine in ROUGE-1.5.5.pl
+        assert stem("caresses") == "caress"
+        assert stem("ponies") == "poni"
+        assert stem("agreed") == "agre"
+        assert stem("hopping") == "hop"
+        assert stem("filing") == "file"
+        assert stem("happy") == "happi"
+        assert stem("relational") == "relat"
+        assert stem("replacement") == "replac"
+        assert stem("adjustment") == "adjust"
+        assert stem("dependent") == "depend"
+        assert stem("adoption") == "adopt"
+        assert stem("controll") == "control"
+        assert stem("yelling") == "yell"
+        assert stem("by") == "by"
+
+    def test_rouge_confidence_intervals(self):
+        model = ROUGE(confidence_intervals=True, num_bootstrap_samples=100)
+        inputs = [
+            {"candidate": inp["candidate"], "references": inp["references"]}
+            for inp in self.examples
+        ]
+        macro, micro = model.predict_batch(inputs)
+
+        # The scores themselves should not change
+        for expected, actual in zip(self.expected["micro"], micro):
+            assert_dicts_approx_equal(expected, actual, abs=1e-4)
+        for metric, stats in self.expected["macro"].items():
+            for stat, value in stats.items():
+                assert macro[metric][stat] == pytest.approx(value, abs=1e-4)
+                interval = macro[metric][f"{stat}_ci"]
+                assert interval["lower"] <= value <= interval["upper"]
+
+    def test_compute_confidence_intervals(self):
+        model = ROUGE(num_bootstrap_samples=10)
+        micro = [{"rouge-1": {"recall": 10.0}}] * 5
+        intervals = model._compute_confidence_intervals(micro)
+        assert intervals == {"rouge-1": {"recall_ci": {"lower": 10.0, "upper": 10.0}}}
+
+        micro = [{"rouge-1": {"recall": float(i)}} for i in range(100)]
+        intervals = model._compute_confidence_intervals(micro)
+        assert 40 < intervals["rouge-1"]["recall_ci"]["lower"] < 49.5
+        assert 49.5 < intervals["rouge-1"]["recall_ci"]["upper"] < 60
+
+        with self.assertRaises(ValueError):
+            ROUGE(num_bootstrap_samples=0)
@@ -90,3 +90,57 @@ class TestPapineni2002Models(unittest.TestCase):
         actual_macro, actual_micro = model.predict_batch(inputs)
         assert actual_macro["bleu"] == pytest.approx(expected, abs=1e-4)
         assert len(actual_micro) == 0
+
+    def test_python_backend(self):
+        # The python backend should exactly match sacrebleu in the Docker image
+        inputs = [
+            {"candidate": inp["candidate"], "references": inp["references"]}
+            for inp in self.examples
+        ]
+
+        model = SentBLEU(backend="python")
+        expected_macro = self.expected["sentbleu"]["macro"]
+        expected_micro = self.expected["sentbleu"]["micro"]
+        actual_macro, actual_micro = model.predict_batch(inputs)
+        assert_dicts_approx_equal(expected_macro, actual_macro, abs=1e-8)
+        assert len(expected_micro) == len(actual_micro)
+        for expected, actual in zip(expected_micro, actual_micro):
+            assert_dicts_approx_equal(expected, actual, abs=1e-8)
+
+        model = BLEU(backend="python")
+        expected_macro = self.expected["bleu"]["macro"]
+        actual_macro, actual_micro = model.predict_batch(inputs)
+        assert_dicts_approx_equal(expected_macro, actual_macro, abs=1e-8)
+        assert len(actual_micro) == 0
+
+    def test_python_backend_sacrebleu_tests(self):
+        # Tests the examples from the sacrebleu unit tests, including one in which
+        # the candidates have an unequal number of references
+        model = BLEU(backend="python")
+        inputs = [
+            {
+                "candidate": "The dog bit the man.",
+                "references": ["The dog bit the man.", "The dog had bit the man."],
+            },
+            {
+                "candidate": "It wasn't surprising.",
+                "references": ["It was not unexpected.", "No one was surprised."],
+            },
+            {
+                "candidate": "The man had just bitten him.",
+                "references": ["The man bit him first.", "The man had bitten the dog."],
+            },
+        ]
+        actual_macro, _ = model.predict_batch(inputs)
+        assert actual_macro["bleu"] == pytest.approx(48.530827, abs=1e-4)
+
+        inputs[1]["references"] = ["No one was surprised."]
+        inputs[2]["references"].append("The man bit the dog before.")
+        actual_macro, _ = model.predict_batch(inputs)
+        assert actual_macro["bleu"] == pytest.approx(47.63997460581784, abs=1e-8)
+
+    def test_python_backend_invalid(self):
+        with pytest.raises(ValueError):
+            BLEU(backend="perl")
+        with pytest.raises(ValueError):
+            SentBLEU(backend="perl")
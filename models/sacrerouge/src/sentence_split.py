@@ -1,6 +1,7 @@
 import argparse
 import json
 import os
+import sys
 from nltk.tokenize import sent_tokenize
 
 
@@ -18,9 +19,35 @@ def main(args):
                 out.write(json.dumps({"sentences": sentences}) + "\n")
 
 
+def serve(args):
+    # Responses are written to the original stdout. Anything else which is
+    # printed goes to stderr so it does not break the protocol
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+
+    for line in sys.stdin:
+        try:
+            request = json.loads(line)
+            sentences = [sent_tokenize(text) for text in request["texts"]]
+            response = {"sentences": sentences}
+        except Exception as e:
+            response = {"error": repr(e)}
+        protocol_out.write(json.dumps(response) + "\n")
+        protocol_out.flush()
+
+
 if __name__ == "__main__":
     argp = argparse.ArgumentParser()
-    argp.add_argument("input_file")
-    argp.add_argument("output_file")
+    argp.add_argument("input_file", nargs="?")
+    argp.add_argument("output_file", nargs="?")
+    argp.add_argument(
+        "--server",
+        action="store_true",
+        help="Answers json requests to sentence split texts on stdin",
+    )
     args = argp.parse_args()
-    main(args)
+
+    if args.server:
+        serve(args)
+    else:
+        main(args)
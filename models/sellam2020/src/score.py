@@ -0,0 +1,40 @@
+import argparse
+import json
+import sys
+
+from bleurt import score
+
+
+def serve(args):
+    # Responses are written to the original stdout. Anything else which is
+    # printed (e.g., by the libraries) goes to stderr so it does not break the protocol
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+
+    if args.batch_same_length:
+        scorer = score.LengthBatchingBleurtScorer(args.bleurt_checkpoint)
+    else:
+        scorer = score.BleurtScorer(args.bleurt_checkpoint)
+
+    for line in sys.stdin:
+        try:
+            request = json.loads(line)
+            scores = scorer.score(
+                references=request["references"],
+                candidates=request["candidates"],
+                batch_size=args.bleurt_batch_size,
+            )
+            response = {"outputs": [float(value) for value in scores]}
+        except Exception as e:
+            response = {"error": repr(e)}
+        protocol_out.write(json.dumps(response) + "\n")
+        protocol_out.flush()
+
+
+if __name__ == "__main__":
+    argp = argparse.ArgumentParser()
+    argp.add_argument("--bleurt-checkpoint", required=True)
+    argp.add_argument("--bleurt-batch-size", type=int, default=100)
+    argp.add_argument("--batch-same-length", action="store_true")
+    args = argp.parse_args()
+    serve(args)
@@ -54,6 +54,23 @@ class TestSellam2020Models(unittest.TestCase):
         for expected, actual in zip(expected_micro, actual_micro):
             assert_dicts_approx_equal(expected, actual, abs=1e-4)
 
+    @parameterized.expand(get_testing_device_parameters())
+    def test_bleurt_20_server(self, device: int):
+        # The server should return the same scores as running the command
+        name = "BLEURT-20"
+        inputs = [
+            {"candidate": example["candidate"], "references": example["references"]}
+            for example in self.multiling2011_examples
+        ]
+        expected_micro = self.expected[name]["micro"]
+
+        with BLEURT(device=device, server=True) as model:
+            for _ in range(2):
+                _, actual_micro = model.predict_batch(inputs)
+                assert len(expected_micro) == len(actual_micro)
+                for expected, actual in zip(expected_micro, actual_micro):
+                    assert_dicts_approx_equal(expected, actual, abs=1e-4)
+
     @parameterized.expand(get_testing_device_parameters())
     def test_bleurt_unittest_examples(self, device: int):
         # Tests the examples from the BLEURT repository unit tests
@@ -1,36 +1,224 @@
 import argparse
 import json
+import numpy as np
+import torch
+from fairseq.data import data_utils
+from typing import Dict, List, Tuple
 
 from prism import Prism
 
+# `score_segments` computes the same segment scores as `Prism.score` (the average
+# log-probability of the output's tokens after the language tag) without the
+# corpus-level bookkeeping of `Prism._score_forward`. The (input, output) pairs of all
+# of the instances are scored together in batches which are grouped by the input and
+# output lengths, and the pairs with the same input are placed next to each other so
+# that each distinct input in a batch is only encoded once. For instance, a candidate
+# with several references is encoded once for all of the reverse directions.
+
+
+def _get_batches(
+    input_ids: List[int],
+    input_lengths: List[int],
+    output_lengths: List[int],
+    batch_size: int,
+    max_tokens: int,
+) -> List[List[int]]:
+    # Like fairseq, the size of a pair is the length of its longer sequence, and a
+    # batch is full when it has `batch_size` pairs or its padded size would exceed
+    # `max_tokens`. Either limit may be `None`
+    order = sorted(
+        range(len(input_ids)),
+        key=lambda i: (input_lengths[i], input_ids[i], output_lengths[i]),
+    )
+    batches = []
+    batch = []
+    longest = 0
+    for index in order:
+        size = max(input_lengths[index], output_lengths[index])
+        if len(batch) > 0:
+            full = batch_size is not None and len(batch) == batch_size
+            if max_tokens is not None:
+                full = full or (len(batch) + 1) * max(longest, size) > max_tokens
+            if full:
+                batches.append(batch)
+                batch = []
+                longest = 0
+        batch.append(index)
+        longest = max(longest, size)
+    if len(batch) > 0:
+        batches.append(batch)
+    return batches
+
+
+@torch.no_grad()
+def _score_batch(
+    metric: Prism,
+    inputs: List[torch.LongTensor],
+    input_indices: List[int],
+    outputs: List[torch.LongTensor],
+) -> List[np.float32]:
+    # Scores each output given the input at its index in `inputs`. This follows
+    # `SequenceScorer.generate` except that the encoder runs once per distinct input
+    dictionary = metric.task.target_dictionary
+    pad, eos = dictionary.pad(), dictionary.eos()
+
+    src_tokens = data_utils.collate_tokens(inputs, pad, eos, left_pad=True)
+    src_lengths = torch.LongTensor([tokens.numel() for tokens in inputs])
+    target = data_utils.collate_tokens(outputs, pad, eos, left_pad=False)
+    prev_output_tokens = data_utils.collate_tokens(
+        outputs, pad, eos, left_pad=False, move_eos_to_beginning=True
+    )
+    new_order = torch.LongTensor(input_indices)
+    if metric.use_cuda:
+        src_tokens = src_tokens.cuda()
+        src_lengths = src_lengths.cuda()
+        target = target.cuda()
+        prev_output_tokens = prev_output_tokens.cuda()
+        new_order = new_order.cuda()
+
+    log_probs = len(metric.models) == 1
+    avg_probs = None
+    for model in metric.models:
+        model.eval()
+        encoder_out = model.encoder(src_tokens, src_lengths=src_lengths)
+        encoder_out = model.encoder.reorder_encoder_out(encoder_out, new_order)
+        decoder_out = model.decoder(prev_output_tokens, encoder_out=encoder_out)
+        decoder_out[0].div_(metric.generator.temperature)
+        probs = model.get_normalized_probs(
+            decoder_out, log_probs=log_probs, sample={"target": target}
+        )
+        probs = probs.gather(dim=2, index=target.unsqueeze(-1)).squeeze(-1)
+        if avg_probs is None:
+            avg_probs = probs
+        else:
+            avg_probs.add_(probs)
+    if not log_probs:
+        avg_probs.div_(len(metric.models))
+        avg_probs.log_()
+
+    # The outputs are right-padded, and the first token is the language tag
+    lengths = target.ne(pad).sum(dim=1).tolist()
+    avg_probs = avg_probs.float().cpu().numpy()
+    return [np.mean(avg_probs[i, 1:length]) for i, length in enumerate(lengths)]
+
+
+def score_segments(
+    metric: Prism,
+    pairs: List[Tuple[str, str]],
+    batch_size: int = None,
+    max_tokens: int = None,
+) -> np.ndarray:
+    """
+    Scores the output of each (input, output) pair given its input. The batch limits
+    default to the ones which `Prism` uses.
+    """
+    if batch_size is None and max_tokens is None:
+        batch_size = metric.args.max_sentences
+        max_tokens = metric.args.max_tokens
+
+    # Each distinct text is only encoded once
+    input_ids = {}
+    inputs = []
+    for text, _ in pairs:
+        if text not in input_ids:
+            input_ids[text] = len(inputs)
+            inputs.append(metric._encode(text, prepend=False))
+    outputs = {}
+    for _, text in pairs:
+        if text not in outputs:
+            outputs[text] = metric._encode(text, prepend=True)
+
+    pair_input_ids = [input_ids[text] for text, _ in pairs]
+    pair_outputs = [outputs[text] for _, text in pairs]
+    batches = _get_batches(
+        pair_input_ids,
+        [inputs[i].numel() for i in pair_input_ids],
+        [tokens.numel() for tokens in pair_outputs],
+        batch_size,
+        max_tokens,
+    )
+
+    scores = np.zeros(len(pairs), dtype=np.float32)
+    for batch in batches:
+        # The inputs of the batch in order of their first pair
+        batch_input_ids = list(dict.fromkeys(pair_input_ids[i] for i in batch))
+        positions = {input_id: j for j, input_id in enumerate(batch_input_ids)}
+        batch_scores = _score_batch(
+            metric,
+            [inputs[input_id] for input_id in batch_input_ids],
+            [positions[pair_input_ids[i]] for i in batch],
+            [pair_outputs[i] for i in batch],
+        )
+        scores[batch] = batch_scores
+    return scores
+
+
+def score_pairs(
+    metric: Prism,
+    candidates: List[str],
+    others: List[str],
+    has_references: bool,
+    args,
+) -> np.ndarray:
+    if not args.segment_scores_only:
+        if args.batch_size is not None or args.max_tokens is not None:
+            metric.args.max_sentences = args.batch_size
+            metric.args.max_tokens = args.max_tokens
+        if has_references:
+            return metric.score(cand=candidates, ref=others, segment_scores=True)
+        return metric.score(cand=candidates, src=others, segment_scores=True)
+
+    if not has_references:
+        # Prism-src scores the candidate given the source
+        pairs = list(zip(others, candidates))
+        return score_segments(metric, pairs, args.batch_size, args.max_tokens)
+
+    # Prism-ref averages the scores of the candidate given the reference and the
+    # reference given the candidate. Both directions are scored in the same batches
+    pairs = list(zip(others, candidates)) + list(zip(candidates, others))
+    scores = score_segments(metric, pairs, args.batch_size, args.max_tokens)
+    forward_scores = scores[: len(candidates)]
+    reverse_scores = scores[len(candidates) :]
+    return 0.5 * forward_scores + 0.5 * reverse_scores
+
 
 def main(args):
     metric = Prism(model_dir="../m39v1", lang=args.language)
 
     candidates = []
-    references = []
-    sources = []
-
+    references_list = []
+    sources_list = []
     with open(args.input_file, "r") as f:
         for line in f:
             data = json.loads(line)
             candidates.append(data["candidate"])
-            references.append(data["reference"])
-            sources.append(data["source"])
+            references_list.append(data["references"])
+            sources_list.append(data["sources"])
 
     # Input error checking is done in the model code, so we don't need to check here.
     # Assume that if there are references, they all have references and no sources.
-    has_references = any(reference is not None for reference in references)
-    if has_references:
-        scores = metric.score(cand=candidates, ref=references, segment_scores=True)
-    else:
-        # Assume all have sources
-        scores = metric.score(cand=candidates, src=sources, segment_scores=True)
+    has_references = any(references is not None for references in references_list)
+    others_list = references_list if has_references else sources_list
+
+    # Each distinct (candidate, reference or source) pair is scored once, and the
+    # score of an instance is the average over its references or sources
+    pairs = {}
+    for candidate, others in zip(candidates, others_list):
+        for other in others:
+            pairs.setdefault((candidate, other), len(pairs))
+    pair_scores = score_pairs(
+        metric,
+        [candidate for candidate, _ in pairs],
+        [other for _, other in pairs],
+        has_references,
+        args,
+    )
 
     name = "prism" if has_references else "prism-src"
     with open(args.output_file, "w") as out:
-        for score in scores:
-            out.write(json.dumps({name: float(score)}) + "\n")
+        for candidate, others in zip(candidates, others_list):
+            scores = [float(pair_scores[pairs[(candidate, other)]]) for other in others]
+            out.write(json.dumps({name: float(np.mean(scores))}) + "\n")
 
 
 if __name__ == "__main__":
@@ -38,5 +226,22 @@ if __name__ == "__main__":
     argp.add_argument("--input-file", required=True)
     argp.add_argument("--language", required=True)
     argp.add_argument("--output-file", required=True)
+    argp.add_argument(
+        "--batch-size",
+        type=int,
+        help="The maximum number of pairs in a batch. Defaults to the model's setting",
+    )
+    argp.add_argument(
+        "--max-tokens",
+        type=int,
+        help="The maximum number of tokens in a batch, including padding. "
+        "Defaults to the model's setting",
+    )
+    argp.add_argument(
+        "--segment-scores-only",
+        action="store_true",
+        help="Score the segments in length-grouped batches which encode each distinct "
+        "input once instead of with `Prism.score`",
+    )
     args = argp.parse_args()
     main(args)
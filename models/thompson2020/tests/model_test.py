@@ -88,6 +88,31 @@ class TestThompson202Models(unittest.TestCase):
         for expected, actual in zip(expected_micro, actual_micro):
             assert_dicts_approx_equal(expected, actual, abs=1e-4)
 
+    @parameterized.expand(get_testing_device_parameters())
+    def test_multi_reference_batch_limits(self, device: int):
+        # The scores must not depend on how the pairs are batched
+        inputs = [
+            {"candidate": "Hi world.", "references": ["Hello world."]},
+            {"candidate": "Hi world.", "references": ["This is a Test."]},
+            {
+                "candidate": "Hi world.",
+                "references": ["Hello world.", "This is a Test."],
+            },
+        ]
+        expected_micro = [
+            {"prism": -1.4878592491149902},
+            {"prism": -6.387360095977783},
+            {"prism": -3.9376096725463867},
+        ]
+        for model in [
+            Prism(device=device, batch_size=1),
+            Prism(device=device, max_tokens=16),
+        ]:
+            _, actual_micro = model.predict_batch(inputs)
+            assert len(expected_micro) == len(actual_micro)
+            for expected, actual in zip(expected_micro, actual_micro):
+                assert_dicts_approx_equal(expected, actual, abs=1e-4)
+
     @parameterized.expand(get_testing_device_parameters())
     def test_prism_translation_regression(self, device: int):
         # Tests using Prism as a translation system using
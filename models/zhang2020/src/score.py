@@ -1,8 +1,16 @@
 import argparse
 import json
 import os
+import sys
+from collections import defaultdict
+from typing import Dict, List
 
 import bert_score
+import torch
+from bert_score.utils import bert_encode, greedy_cos_idf, padding, sent_encode
+from torch.nn.utils.rnn import pad_sequence
+
+from embedding_store import EmbeddingStore
 
 
 def main(args):
@@ -15,14 +23,14 @@ def main(args):
             candidates.append(data["candidate"])
             references_list.append(data["references"])
 
-    device = None if args.cuda_device == -1 else args.cuda_device
-    precisions, recall, f1s = bert_score.score(
+    scorer = _load_scorer(args)
+    outputs = _score(
+        scorer,
         candidates,
         references_list,
-        model_type=args.model_name,
-        device=device,
-        batch_size=args.batch_size,
-        lang=args.language,
+        args.batch_size,
+        args.max_tokens,
+        _load_store(args),
     )
 
     dirname = os.path.dirname(args.output_file)
@@ -30,26 +38,272 @@ def main(args):
         os.makedirs(dirname, exist_ok=True)
 
     with open(args.output_file, "w") as out:
-        for precision, recall, f1 in zip(precisions, recall, f1s):
-            out.write(
-                json.dumps(
-                    {
-                        "precision": precision.item(),
-                        "recall": recall.item(),
-                        "f1": f1.item(),
-                    }
-                )
-                + "\n"
+        for scores in outputs:
+            out.write(json.dumps(scores) + "\n")
+
+
+def _load_scorer(args) -> bert_score.BERTScorer:
+    device = None if args.cuda_device == -1 else args.cuda_device
+    return bert_score.BERTScorer(
+        model_type=args.model_name,
+        device=device,
+        batch_size=args.batch_size,
+        lang=args.language,
+    )
+
+
+def _load_store(args) -> EmbeddingStore:
+    if args.embedding_store is None:
+        return None
+    return EmbeddingStore(args.embedding_store)
+
+
+def _get_batches(
+    lengths: List[int], batch_size: int, max_tokens: int
+) -> List[List[int]]:
+    # Groups the indices of the items into batches of items with similar lengths
+    # so that little computation is wasted on padding. If `max_tokens` is set, each
+    # batch is as large as possible without its padded size exceeding that many
+    # tokens, otherwise each batch has `batch_size` items
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batches = []
+    batch = []
+    for index in order:
+        if len(batch) > 0:
+            # The first item is the longest in the batch
+            if max_tokens is not None:
+                full = (len(batch) + 1) * lengths[batch[0]] > max_tokens
+            else:
+                full = len(batch) == batch_size
+            if full:
+                batches.append(batch)
+                batch = []
+        batch.append(index)
+    if len(batch) > 0:
+        batches.append(batch)
+    return batches
+
+
+def _pad_batch_stats(stats: List, device):
+    # The same padding as `bert_score.utils.bert_cos_score_idf`
+    embeddings = [embedding.to(device) for embedding, _ in stats]
+    idfs = [idf.to(device) for _, idf in stats]
+    lengths = torch.tensor([embedding.size(0) for embedding in embeddings])
+    embeddings = pad_sequence(embeddings, batch_first=True, padding_value=2.0)
+    idfs = pad_sequence(idfs, batch_first=True)
+    mask = torch.arange(lengths.max().item()).expand(
+        len(lengths), -1
+    ) < lengths.unsqueeze(1)
+    return embeddings, mask.to(device), idfs
+
+
+def _score(
+    scorer: bert_score.BERTScorer,
+    candidates: List[str],
+    references_list: List[List[str]],
+    batch_size: int,
+    max_tokens: int = None,
+    store: EmbeddingStore = None,
+) -> List[Dict[str, float]]:
+    # This computes the same scores as `scorer.score()`, except the batches are
+    # created from items with similar lengths in tokens for both the embeddings and
+    # the greedy matching instead of in file order, then the scores are put back
+    # into the original order. If `store` is not `None`, only the texts which are
+    # not in the store are encoded
+    if len(candidates) == 0:
+        return []
+
+    tokenizer = scorer._tokenizer
+    idf_dict = defaultdict(lambda: 1.0)
+    idf_dict[tokenizer.sep_token_id] = 0
+    idf_dict[tokenizer.cls_token_id] = 0
+
+    # Every (candidate, reference) pair is scored and the best score is
+    # taken for each candidate, like `scorer.score()` does
+    pairs = []
+    boundaries = []
+    for candidate, references in zip(candidates, references_list):
+        start = len(pairs)
+        pairs.extend((candidate, reference) for reference in references)
+        boundaries.append((start, len(pairs)))
+
+    # Each distinct text is only embedded once
+    sentences = sorted(set(text for pair in pairs for text in pair))
+    token_ids = [sent_encode(tokenizer, sentence) for sentence in sentences]
+    stats = {}
+    if store is not None:
+        keys = [
+            EmbeddingStore.get_key(scorer.model_type, scorer.num_layers, sentence)
+            for sentence in sentences
+        ]
+        stored = store.get_many(keys)
+        for sentence, ids, key in zip(sentences, token_ids, keys):
+            if key in stored:
+                idf = torch.tensor([idf_dict[i] for i in ids], dtype=torch.float)
+                stats[sentence] = (torch.from_numpy(stored[key]), idf)
+
+    missing = [i for i, sentence in enumerate(sentences) if sentence not in stats]
+    with torch.no_grad():
+        for batch in _get_batches(
+            [len(token_ids[i]) for i in missing], batch_size, max_tokens
+        ):
+            batch = [missing[i] for i in batch]
+            batch_ids = [token_ids[i] for i in batch]
+            padded, lengths, mask = padding(batch_ids, tokenizer.pad_token_id)
+            padded_idf, _, _ = padding(
+                [[idf_dict[i] for i in ids] for ids in batch_ids], 0, dtype=torch.float
+            )
+            embeddings = bert_encode(
+                scorer._model,
+                padded.to(scorer.device),
+                attention_mask=mask.to(scorer.device),
+                all_layers=scorer.all_layers,
+            ).cpu()
+            if store is not None:
+                # The new embeddings are rounded like the stored ones so the
+                # scores do not depend on which texts were already stored
+                embeddings = embeddings.half().float()
+            for j, (i, length) in enumerate(zip(batch, lengths.tolist())):
+                stats[sentences[i]] = (embeddings[j, :length], padded_idf[j, :length])
+
+    if store is not None and len(missing) > 0:
+        store.put_many({keys[i]: stats[sentences[i]][0].numpy() for i in missing})
+
+    device = next(scorer._model.parameters()).device
+    pair_lengths = [
+        max(stats[candidate][0].size(0), stats[reference][0].size(0))
+        for candidate, reference in pairs
+    ]
+    all_preds = [None] * len(pairs)
+    with torch.no_grad():
+        for batch in _get_batches(pair_lengths, batch_size, max_tokens):
+            reference_stats = _pad_batch_stats(
+                [stats[pairs[i][1]] for i in batch], device
             )
+            candidate_stats = _pad_batch_stats(
+                [stats[pairs[i][0]] for i in batch], device
+            )
+            P, R, F1 = greedy_cos_idf(
+                *reference_stats, *candidate_stats, scorer.all_layers
+            )
+            preds = torch.stack((P, R, F1), dim=-1).cpu()
+            for i, pred in zip(batch, preds):
+                all_preds[i] = pred
+    all_preds = torch.stack(all_preds, dim=0)
+
+    all_preds = torch.stack(
+        [all_preds[start:end].max(dim=0)[0] for start, end in boundaries], dim=0
+    )
+    if scorer.rescale_with_baseline:
+        all_preds = (all_preds - scorer.baseline_vals) / (1 - scorer.baseline_vals)
+
+    return [
+        {"precision": precision, "recall": recall, "f1": f1}
+        for precision, recall, f1 in all_preds.tolist()
+    ]
+
+
+def stream(args):
+    # Reads the inputs as json lines from stdin and writes the scores for every
+    # chunk of inputs to stdout as soon as they are computed. Anything else which is
+    # printed goes to stderr so it does not get mixed with the output
+    output = sys.stdout
+    sys.stdout = sys.stderr
+
+    scorer = _load_scorer(args)
+    store = _load_store(args)
+
+    def _flush(chunk):
+        candidates = [data["candidate"] for data in chunk]
+        references_list = [data["references"] for data in chunk]
+        for scores in _score(
+            scorer,
+            candidates,
+            references_list,
+            args.batch_size,
+            args.max_tokens,
+            store,
+        ):
+            output.write(json.dumps(scores) + "\n")
+        output.flush()
+
+    chunk = []
+    for line in sys.stdin:
+        chunk.append(json.loads(line))
+        if len(chunk) == args.chunk_size:
+            _flush(chunk)
+            chunk = []
+    if len(chunk) > 0:
+        _flush(chunk)
+
+
+def serve(args):
+    # Responses are written to the original stdout. Anything else which is
+    # printed (e.g., by the libraries) goes to stderr so it does not break the protocol
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+
+    scorer = _load_scorer(args)
+    store = _load_store(args)
+
+    for line in sys.stdin:
+        try:
+            request = json.loads(line)
+            outputs = _score(
+                scorer,
+                request["candidates"],
+                request["references_list"],
+                args.batch_size,
+                args.max_tokens,
+                store,
+            )
+            response = {"outputs": outputs}
+        except Exception as e:
+            response = {"error": repr(e)}
+        protocol_out.write(json.dumps(response) + "\n")
+        protocol_out.flush()
 
 
 if __name__ == "__main__":
     argp = argparse.ArgumentParser()
-    argp.add_argument("--input-file", required=True)
+    argp.add_argument("--input-file")
     argp.add_argument("--model-name")
     argp.add_argument("--cuda-device", required=True, type=int)
     argp.add_argument("--batch-size", type=int, default=64)
+    argp.add_argument(
+        "--max-tokens",
+        type=int,
+        help="If set, the inputs are batched so each batch has at most this many "
+        "tokens including padding instead of --batch-size inputs",
+    )
     argp.add_argument("--language")
-    argp.add_argument("--output-file", required=True)
+    argp.add_argument(
+        "--embedding-store",
+        help="The directory of an embedding store which is used to avoid "
+        "encoding the same texts again",
+    )
+    argp.add_argument("--output-file")
+    argp.add_argument(
+        "--server",
+        action="store_true",
+        help="Keeps the model loaded and answers json requests on stdin",
+    )
+    argp.add_argument(
+        "--stream",
+        action="store_true",
+        help="Reads the inputs from stdin and writes the scores to stdout",
+    )
+    argp.add_argument(
+        "--chunk-size",
+        type=int,
+        default=1024,
+        help="The number of inputs to score at once when streaming",
+    )
     args = argp.parse_args()
-    main(args)
+
+    if args.server:
+        serve(args)
+    elif args.stream:
+        stream(args)
+    else:
+        main(args)
@@ -2,6 +2,7 @@ import json
 import unittest
 from parameterized import parameterized
 
+from repro.common import TemporaryDirectory
 from repro.models.zhang2020 import BERTScore
 from repro.testing import FIXTURES_ROOT as REPRO_FIXTURES_ROOT
 from repro.testing import assert_dicts_approx_equal, get_testing_device_parameters
@@ -35,6 +36,60 @@ class TestZhang2020Models(unittest.TestCase):
         for expected, actual in zip(expected_micro, actual_micro):
             assert_dicts_approx_equal(expected, actual, abs=1e-4)
 
+    @parameterized.expand(get_testing_device_parameters())
+    def test_bertscore_server(self, device: int):
+        # Runs the same inputs through the server twice to ensure the
+        # reused model returns the same scores as the regular backend
+        inputs = [
+            {"candidate": inp["candidate"], "references": inp["references"]}
+            for inp in self.examples
+        ]
+        expected_micro = self.expected["micro"]
+
+        with BERTScore(device=device, server=True) as model:
+            for _ in range(2):
+                _, actual_micro = model.predict_batch(inputs)
+                assert len(expected_micro) == len(actual_micro)
+                for expected, actual in zip(expected_micro, actual_micro):
+                    assert_dicts_approx_equal(expected, actual, abs=1e-4)
+
+    @parameterized.expand(get_testing_device_parameters())
+    def test_bertscore_max_tokens(self, device: int):
+        # Ensures batching by the number of tokens and repeated
+        # inputs do not change the scores or their order
+        inputs = [
+            {"candidate": inp["candidate"], "references": inp["references"]}
+            for inp in self.examples
+        ]
+        expected_micro = self.expected["micro"]
+
+        model = BERTScore(device=device, max_tokens=2048)
+        _, actual_micro = model.predict_batch(inputs + inputs)
+        assert len(actual_micro) == 2 * len(expected_micro)
+        for expected, actual in zip(expected_micro + expected_micro, actual_micro):
+            assert_dicts_approx_equal(expected, actual, abs=1e-4)
+
+    @parameterized.expand(get_testing_device_parameters())
+    def test_bertscore_cache_embeddings(self, device: int):
+        # The embeddings are rounded to float16, so the scores are only approximately
+        # equal to the expected ones. The second pass reads every embedding from the
+        # store and must give the same scores as the first
+        inputs = [
+            {"candidate": inp["candidate"], "references": inp["references"]}
+            for inp in self.examples
+        ]
+        expected_micro = self.expected["micro"]
+
+        with TemporaryDirectory() as temp:
+            model = BERTScore(device=device, cache_embeddings=True, embeddings_dir=temp)
+            _, first_micro = model.predict_batch(inputs)
+            _, second_micro = model.predict_batch(inputs)
+
+        assert len(expected_micro) == len(first_micro) == len(second_micro)
+        for expected, first, second in zip(expected_micro, first_micro, second_micro):
+            assert_dicts_approx_equal(expected, first, abs=1e-3)
+            assert_dicts_approx_equal(first, second, abs=1e-6)
+
     @parameterized.expand(get_testing_device_parameters())
     def test_bertscore_unittests(self, device: int):
         # This tests the examples in the bert_score repo unit tests
@@ -40,6 +40,20 @@ class TestZhang2021Models(unittest.TestCase):
         actual_stus = metric.extract_stus(input_references, True)
         assert actual_stus == expected_stus
 
+    @parameterized.expand(get_testing_device_parameters())
+    def test_extract_stus_cached(self, device: int):
+        # The cached STUs should be identical to the ones which are extracted
+        # without the cache
+        input_references = self.references[:4]
+        expected_stus = Lite3Pyramid(device=device, cache_stus=False).extract_stus(
+            input_references, True
+        )
+
+        metric = Lite3Pyramid(device=device)
+        metric.extract_stus(input_references[:2], True)
+        actual_stus = metric.extract_stus(input_references, True)
+        assert actual_stus == expected_stus
+
     @parameterized.expand(
         get_testing_device_parameters(gpu_only=True), skip_on_empty=True
     )
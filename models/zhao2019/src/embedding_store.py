@@ -0,0 +1,116 @@
+import fcntl
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from typing import Dict, Iterable
+
+import numpy as np
+
+
+class EmbeddingStore(object):
+    """
+    An on-disk store of the contextual embeddings of texts so that texts which were
+    already encoded (e.g., the references of a test set which is used to score many
+    systems) do not need to be encoded again.
+
+    The embeddings are appended as float16 arrays to "embeddings.bin", which is
+    memory-mapped for reading, and "index.jsonl" records the offset and shape of the
+    embedding for every key. Several processes may share the same directory. Writes
+    are serialized with a file lock, and the index is re-read when a key is missing.
+    """
+
+    def __init__(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.data_file = f"{directory}/embeddings.bin"
+        self.index_file = f"{directory}/index.jsonl"
+        self.lock_file = f"{directory}/lock"
+
+        self._index = {}
+        self._index_position = 0
+        self._data = None
+
+    @staticmethod
+    def get_key(model: str, layer: int, text: str) -> str:
+        text_digest = hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+        serialized = json.dumps([model, layer, text_digest])
+        return hashlib.blake2b(serialized.encode(), digest_size=16).hexdigest()
+
+    @contextmanager
+    def _lock(self):
+        with open(self.lock_file, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refresh_index(self) -> None:
+        # Reads the entries which were added since the index was last read. An
+        # incomplete last line is skipped until it has been fully written
+        if not os.path.exists(self.index_file):
+            return
+        with open(self.index_file, "rb") as f:
+            f.seek(self._index_position)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                entry = json.loads(line)
+                self._index[entry["key"]] = (entry["offset"], tuple(entry["shape"]))
+                self._index_position += len(line)
+
+    def _get_data(self, end: int) -> np.ndarray:
+        # The data file is mapped again if it has grown since it was last mapped
+        if self._data is None or len(self._data) < end:
+            self._data = np.memmap(self.data_file, dtype=np.float16, mode="r")
+        return self._data
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        """
+        Looks up the embeddings of :code:`keys` as float32 arrays. Keys which are not
+        in the store are not included in the returned dictionary.
+        """
+        keys = set(keys)
+        if any(key not in self._index for key in keys):
+            self._refresh_index()
+
+        embeddings = {}
+        for key in keys:
+            if key in self._index:
+                offset, shape = self._index[key]
+                end = offset + int(np.prod(shape))
+                if end == offset:
+                    embeddings[key] = np.zeros(shape, dtype=np.float32)
+                    continue
+                data = self._get_data(end)
+                embeddings[key] = np.array(data[offset:end], dtype=np.float32).reshape(
+                    shape
+                )
+        return embeddings
+
+    def put_many(self, embeddings: Dict[str, np.ndarray]) -> None:
+        """
+        Appends the embeddings to the store as float16 arrays. Keys which are
+        already in the store are skipped.
+        """
+        with self._lock():
+            self._refresh_index()
+            entries = []
+            with open(self.data_file, "ab") as out:
+                offset = out.tell() // 2
+                for key, embedding in embeddings.items():
+                    if key in self._index:
+                        continue
+                    embedding = np.asarray(embedding, dtype=np.float16)
+                    out.write(embedding.tobytes())
+                    entries.append(
+                        {"key": key, "offset": offset, "shape": list(embedding.shape)}
+                    )
+                    offset += embedding.size
+
+            # The index is written after the data so readers
+            # never see an entry whose data is incomplete
+            with open(self.index_file, "a") as out:
+                for entry in entries:
+                    out.write(json.dumps(entry) + "\n")
+            self._refresh_index()
@@ -27,6 +27,10 @@ if use_cuda:
     model.to("cuda")
 model.eval()
 
+# An optional `EmbeddingStore` which is set by score.py. If it is set, the embeddings
+# of the texts which are already in the store are not computed again
+embedding_store = None
+
 
 def truncate(tokens):
     if len(tokens) > tokenizer.model_max_length - 2:
@@ -97,12 +101,48 @@ def collate_idf(arr, tokenize, numericalize, idf_dict,
     return padded, padded_idf, lens, mask, tokens
 
 
+def get_stored_bert_embedding(all_sens, model, padded_sens, lens, mask):
+    # Only the last layer (-1) is returned because it is the only one that
+    # `word_mover_score` uses. The padding positions are zero vectors
+    keys = [embedding_store.get_key(model_name, -1, sen) for sen in all_sens]
+    stored = embedding_store.get_many(keys)
+
+    missing = {}
+    for i, key in enumerate(keys):
+        if key not in stored and key not in missing:
+            missing[key] = i
+    if len(missing) > 0:
+        indices = list(missing.values())
+        max_len = lens[indices].max().item()
+        with torch.no_grad():
+            batch_embedding = bert_encode(model, padded_sens[indices, :max_len],
+                                          attention_mask=mask[indices, :max_len])[-1].cpu()
+        computed = {key: batch_embedding[j, :lens[i]].numpy()
+                    for j, (key, i) in enumerate(missing.items())}
+        embedding_store.put_many(computed)
+        # The new embeddings are rounded like the stored ones so the
+        # scores do not depend on which texts were already stored
+        stored.update({key: embedding.astype(np.float16).astype(np.float32)
+                       for key, embedding in computed.items()})
+
+    device = next(model.parameters()).device
+    dim = stored[keys[0]].shape[-1]
+    total_embedding = torch.zeros(1, len(all_sens), lens.max().item(), dim, device=device)
+    for i, key in enumerate(keys):
+        total_embedding[0, i, :lens[i]] = torch.from_numpy(stored[key]).to(device)
+    return total_embedding
+
+
 def get_bert_embedding(all_sens, model, tokenizer, idf_dict,
                        batch_size=-1):
     padded_sens, padded_idf, lens, mask, tokens = collate_idf(all_sens,
                                                               tokenizer.tokenize, tokenizer.convert_tokens_to_ids,
                                                               idf_dict)
 
+    if embedding_store is not None:
+        total_embedding = get_stored_bert_embedding(all_sens, model, padded_sens, lens, mask)
+        return total_embedding, lens, mask, padded_idf, tokens
+
     if batch_size == -1: batch_size = len(all_sens)
 
     embeddings = []
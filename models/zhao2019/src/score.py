@@ -1,33 +1,138 @@
 import argparse
 import json
+import string
 import numpy as np
+import torch
 from collections import defaultdict
-from typing import List
-
-from moverscore_v2 import get_idf_dict, word_mover_score
-
-# Copied from the original repository:
-# https://github.com/AIPHES/emnlp19-moverscore/blob/55e785bb3554b8f1c3e32525d97be1ee7bc23a76/examples/example.py
-# Edited to accept stopwords
-def sentence_score(hypothesis: str, references: List[str], stopwords: List[str]):
-    idf_dict_hyp = defaultdict(lambda: 1.0)
-    idf_dict_ref = defaultdict(lambda: 1.0)
-
-    hypothesis = [hypothesis] * len(references)
-
-    scores = word_mover_score(
-        references,
-        hypothesis,
-        idf_dict_ref,
-        idf_dict_hyp,
-        stop_words=stopwords,
-        n_gram=1,
-        remove_subwords=False,
-    )
+from pyemd import emd_with_flow
+from torch.nn.utils.rnn import pad_sequence
+from typing import List, Set
+
+import moverscore_v2
+from embedding_store import EmbeddingStore
+from moverscore_v2 import (
+    batched_cdist_l2,
+    get_bert_embedding,
+    model,
+    tokenizer,
+    truncate,
+    _safe_divide,
+)
+
+# The `sentence_score` function in the original repository's example code
+# (https://github.com/AIPHES/emnlp19-moverscore/blob/55e785bb3554b8f1c3e32525d97be1ee7bc23a76/examples/example.py)
+# scores a hypothesis by repeating it once per reference, running `word_mover_score`
+# on those pairs, and averaging the scores. `score_batch` computes the same scores for
+# all of the inputs at once. Each distinct text is embedded once in batches of texts
+# with similar lengths, the (reference, hypothesis) pairs are scored in batches, and
+# each transport problem is only solved over the tokens which have a non-zero weight.
+
+
+def _get_batches(lengths: List[int], batch_size: int) -> List[List[int]]:
+    # Groups the indices of the items into batches of items with similar lengths
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    return [order[i : i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+def _embed_texts(texts: List[str], stopwords: Set[str], batch_size: int):
+    # Computes the last layer's embeddings and the weights of the tokens of every
+    # text. The stopwords, subwords, and punctuation get zero vectors and weights
+    # like in `word_mover_score`. The IDF weights are not used, so all of the
+    # other tokens have a weight of 1
+    idf_dict = defaultdict(lambda: 1.0)
+    punctuation = set(string.punctuation)
+    lengths = [len(truncate(tokenizer.tokenize(text))) for text in texts]
+
+    stats = {}
+    for batch in _get_batches(lengths, batch_size):
+        batch_texts = [texts[i] for i in batch]
+        embeddings, lens, _, padded_idf, tokens = get_bert_embedding(
+            batch_texts, model, tokenizer, idf_dict
+        )
+        embeddings = embeddings[-1]
+        for j, text in enumerate(batch_texts):
+            length = lens[j].item()
+            embedding = embeddings[j, :length].clone()
+            idf = padded_idf[j, :length].clone()
+            ids = [
+                k
+                for k, w in enumerate(tokens[j])
+                if w in stopwords or "##" in w or w in punctuation
+            ]
+            embedding[ids, :] = 0
+            idf[ids] = 0
+            stats[text] = (embedding, idf)
+    return stats
+
+
+def _score_pairs(pairs: List, stats, batch_size: int) -> List[float]:
+    # The padding is the same as in `word_mover_score`
+    pad_token = tokenizer.convert_tokens_to_ids(["[PAD]"])[0]
+    lengths = [
+        max(len(stats[reference][1]), len(stats[hypothesis][1]))
+        for reference, hypothesis in pairs
+    ]
 
-    sentence_score = np.mean(scores)
+    scores = [None] * len(pairs)
+    for batch in _get_batches(lengths, batch_size):
+        references = [stats[pairs[i][0]] for i in batch]
+        hypotheses = [stats[pairs[i][1]] for i in batch]
+        ref_embedding = pad_sequence([e for e, _ in references], batch_first=True)
+        hyp_embedding = pad_sequence([e for e, _ in hypotheses], batch_first=True)
+        ref_idf = pad_sequence(
+            [idf for _, idf in references], batch_first=True, padding_value=pad_token
+        )
+        hyp_idf = pad_sequence(
+            [idf for _, idf in hypotheses], batch_first=True, padding_value=pad_token
+        )
 
-    return sentence_score
+        raw = torch.cat([ref_embedding, hyp_embedding], 1)
+        raw.div_(torch.norm(raw, dim=-1).unsqueeze(-1) + 1e-30)
+        distance_matrix = batched_cdist_l2(raw, raw).double().cpu().numpy()
+
+        num_ref_tokens = ref_idf.size(1)
+        for j, index in enumerate(batch):
+            c1 = np.zeros(raw.shape[1], dtype=np.float64)
+            c2 = np.zeros(raw.shape[1], dtype=np.float64)
+            c1[:num_ref_tokens] = ref_idf[j].cpu().numpy()
+            c2[num_ref_tokens:] = hyp_idf[j].cpu().numpy()
+
+            c1 = _safe_divide(c1, np.sum(c1))
+            c2 = _safe_divide(c2, np.sum(c2))
+
+            # Tokens without any weight do not change the optimal flow,
+            # so they are removed from the transport problem
+            nonzero = np.nonzero(c1 + c2)[0]
+            dst = np.ascontiguousarray(distance_matrix[j][np.ix_(nonzero, nonzero)])
+            _, flow = emd_with_flow(c1[nonzero], c2[nonzero], dst)
+            flow = np.array(flow, dtype=np.float32)
+            scores[index] = 1.0 / (1.0 + np.sum(flow * dst))
+    return scores
+
+
+def score_batch(
+    candidates: List[str],
+    references_list: List[List[str]],
+    stopwords: Set[str],
+    batch_size: int,
+) -> List[float]:
+    pairs = [
+        (reference, candidate)
+        for candidate, references in zip(candidates, references_list)
+        for reference in references
+    ]
+    texts = sorted(set(text for pair in pairs for text in pair))
+    with torch.no_grad():
+        stats = _embed_texts(texts, stopwords, batch_size)
+        pair_scores = _score_pairs(pairs, stats, batch_size)
+
+    # Each candidate's score is the average over its references
+    scores = []
+    offset = 0
+    for references in references_list:
+        scores.append(float(np.mean(pair_scores[offset : offset + len(references)])))
+        offset += len(references)
+    return scores
 
 
 def main(args):
@@ -36,17 +141,23 @@ def main(args):
         with open("stopwords.txt", "r", encoding="utf-8") as f:
             stopwords = set(f.read().strip().split(" "))
     else:
-        stopwords = []
+        stopwords = set()
 
-    with open(args.output_file, "w") as out:
-        with open(args.input_file, "r") as f:
-            for line in f:
-                data = json.loads(line)
-                candidate = data["candidate"]
-                references = data["references"]
+    if args.embedding_store is not None:
+        moverscore_v2.embedding_store = EmbeddingStore(args.embedding_store)
 
-                score = sentence_score(candidate, references, stopwords)
-                out.write(json.dumps({"moverscore": score}) + "\n")
+    candidates = []
+    references_list = []
+    with open(args.input_file, "r") as f:
+        for line in f:
+            data = json.loads(line)
+            candidates.append(data["candidate"])
+            references_list.append(data["references"])
+
+    scores = score_batch(candidates, references_list, stopwords, args.batch_size)
+    with open(args.output_file, "w") as out:
+        for score in scores:
+            out.write(json.dumps({"moverscore": score}) + "\n")
 
 
 if __name__ == "__main__":
@@ -55,5 +166,10 @@ if __name__ == "__main__":
     argp.add_argument("--use-stopwords", required=True)
     argp.add_argument("--batch-size", type=int, default=48)
     argp.add_argument("--output-file", required=True)
+    argp.add_argument(
+        "--embedding-store",
+        help="The directory of an embedding store which is used to avoid "
+        "encoding the same texts again",
+    )
     args = argp.parse_args()
     main(args)
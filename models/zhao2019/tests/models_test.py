@@ -2,6 +2,7 @@ import json
 import unittest
 from parameterized import parameterized
 
+from repro.common import TemporaryDirectory
 from repro.models.zhao2019 import MoverScore, MoverScoreForSummarization
 from repro.testing import FIXTURES_ROOT as REPRO_FIXTURES_ROOT
 from repro.testing import assert_dicts_approx_equal, get_testing_device_parameters
@@ -48,6 +49,45 @@ class TestZhao2019Models(unittest.TestCase):
         for expected, actual in zip(expected_micro, actual_micro):
             assert_dicts_approx_equal(expected, actual, abs=1e-4)
 
+    @parameterized.expand(get_testing_device_parameters())
+    def test_moverscore_cache_embeddings(self, device: int):
+        # The embeddings are rounded to float16, so the scores are only approximately
+        # equal to the expected ones. The second pass reads every embedding from the
+        # store and must give the same scores as the first
+        inputs = [
+            {"candidate": inp["candidate"], "references": inp["references"]}
+            for inp in self.examples
+        ]
+        expected_micro = self.expected["default"]["micro"]
+
+        with TemporaryDirectory() as temp:
+            model = MoverScore(
+                device=device, cache_embeddings=True, embeddings_dir=temp
+            )
+            _, first_micro = model.predict_batch(inputs)
+            _, second_micro = model.predict_batch(inputs)
+
+        assert len(expected_micro) == len(first_micro) == len(second_micro)
+        for expected, first, second in zip(expected_micro, first_micro, second_micro):
+            assert_dicts_approx_equal(expected, first, abs=1e-3)
+            assert_dicts_approx_equal(first, second, abs=1e-6)
+
+    @parameterized.expand(get_testing_device_parameters())
+    def test_moverscore_batch_matches_single(self, device: int):
+        # The scores of the batched pass must not depend on the
+        # other inputs in the batch or on repeated inputs
+        model = MoverScore(device=device)
+        inputs = [
+            {"candidate": inp["candidate"], "references": inp["references"]}
+            for inp in self.examples[:3]
+        ]
+        _, batch_micro = model.predict_batch(inputs + inputs[:1])
+        assert len(batch_micro) == 4
+        assert_dicts_approx_equal(batch_micro[0], batch_micro[3], abs=1e-6)
+        for inp, batch in zip(inputs, batch_micro):
+            single = model.predict(inp["candidate"], inp["references"])
+            assert_dicts_approx_equal(single, batch, abs=1e-4)
+
     def test_moverscore_for_summarization_invalid_kwargs(self):
         model = MoverScoreForSummarization()
         with self.assertRaises(Exception):
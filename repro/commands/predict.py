@@ -1,15 +1,21 @@
 import argparse
 import inspect
 import json
+import logging
+import os
+from collections import Counter
 from overrides import overrides
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, List, Tuple, Union
 
 from repro.commands.subcommand import RootSubcommand
 from repro.commands.util import load_dataset_reader, load_model, load_output_writer
 from repro.common.logging import prepare_global_logging
 from repro.data.dataset_readers import HuggingfaceDatasetsDatasetReader
+from repro.data.output_writers import OutputWriter
 from repro.data.types import InstanceDict
-from repro.models import Model
+from repro.models import CachedModel, Model
+
+logger = logging.getLogger(__name__)
 
 
 def predict_with_model(
@@ -44,6 +50,115 @@ def predict_with_model(
     return predictions
 
 
+def get_progress_file(output_file: str) -> str:
+    """
+    Gets the path to the sidecar file which records the progress of a chunked
+    prediction that writes to :code:`output_file`.
+    """
+    return f"{output_file}.progress"
+
+
+def load_progress(progress_file: str) -> Tuple[Counter, int]:
+    """
+    Loads the progress file of a chunked prediction. Each line of the file corresponds
+    to one finished chunk and records the IDs of its instances and the size of the
+    output file after the chunk's predictions were written.
+
+    Parameters
+    ----------
+    progress_file : str
+        The progress file
+
+    Returns
+    -------
+    Counter
+        The number of times each instance ID has been completed. Instance IDs
+        are counted because they are not required to be unique.
+    int
+        The size of the output file in bytes after the last completed chunk
+    """
+    completed = Counter()
+    offset = 0
+    if os.path.exists(progress_file):
+        with open(progress_file, "r") as f:
+            for line in f:
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last line may be incomplete if the process was killed
+                    # while writing it
+                    break
+                completed.update(data["instance_ids"])
+                offset = data["offset"]
+    return completed, offset
+
+
+def predict_in_chunks(
+    model: Model,
+    instances: List[InstanceDict],
+    output_writer: OutputWriter,
+    output_file: str,
+    model_name: str,
+    chunk_size: int,
+    kwargs: Union[str, Dict[str, Any]] = None,
+    resume: bool = False,
+) -> None:
+    """
+    Runs prediction over :code:`instances` in chunks of :code:`chunk_size` instances,
+    appending the predictions for each chunk to :code:`output_file` as soon as the chunk
+    is finished. The progress is recorded in a sidecar file (see :code:`get_progress_file`)
+    so that if :code:`resume` is :code:`True`, the instances which were completed by
+    a previous run are skipped. Any output written after the last recorded chunk
+    (e.g., by a chunk which was interrupted) is discarded.
+    """
+    if not output_writer.prediction_per_instance:
+        raise ValueError(
+            "Predicting in chunks requires an output writer with one prediction per instance"
+        )
+
+    progress_file = get_progress_file(output_file)
+    completed, offset = Counter(), 0
+    if resume:
+        completed, offset = load_progress(progress_file)
+    elif os.path.exists(progress_file):
+        os.remove(progress_file)
+
+    if os.path.exists(output_file):
+        with open(output_file, "r+") as f:
+            f.truncate(offset)
+    elif offset > 0:
+        raise Exception(
+            f"Progress file {progress_file} exists but output file {output_file} does not"
+        )
+
+    # Skip as many occurrences of each instance ID as were completed
+    remaining = []
+    for instance in instances:
+        instance_id = instance["instance_id"]
+        if completed[instance_id] > 0:
+            completed[instance_id] -= 1
+        else:
+            remaining.append(instance)
+    logger.info(
+        f"Predicting {len(remaining)} of {len(instances)} instances in chunks of {chunk_size}"
+    )
+
+    for i in range(0, len(remaining), chunk_size):
+        chunk = remaining[i : i + chunk_size]
+        predictions = predict_with_model(model, chunk, kwargs)
+        output_writer.write(
+            chunk, predictions, output_file, model_name=model_name, append=True
+        )
+
+        with open(progress_file, "a") as out:
+            data = {
+                "instance_ids": [instance["instance_id"] for instance in chunk],
+                "offset": os.path.getsize(output_file),
+            }
+            out.write(json.dumps(data) + "\n")
+        logger.info(f"Finished {i + len(chunk)} of {len(remaining)} instances")
+
+
 @RootSubcommand.register("predict")
 class PredictSubcommand(RootSubcommand):
     @overrides
@@ -111,6 +226,28 @@ class PredictSubcommand(RootSubcommand):
             help="A serialized json object which will be deserialized and passed as "
             "**kwargs to the output writer constructor",
         )
+        self.parser.add_argument(
+            "--chunk-size",
+            required=False,
+            type=int,
+            help="If set, the instances are processed in chunks of this size and the "
+            "predictions for each chunk are appended to the output as soon as it is finished. "
+            "The progress is recorded in a sidecar file next to the output",
+        )
+        self.parser.add_argument(
+            "--resume",
+            required=False,
+            action="store_true",
+            help="Skips the instances which were already completed by a previous run "
+            "with --chunk-size instead of starting over",
+        )
+        self.parser.add_argument(
+            "--cache-file",
+            required=False,
+            help="If set, the model's output for every instance is cached in this file "
+            "and instances which were already scored with the same model, kwargs, and "
+            "Docker image are not run again",
+        )
         self.parser.add_argument(
             "--log-file",
             required=False,
@@ -154,12 +291,25 @@ class PredictSubcommand(RootSubcommand):
                     "is also used"
                 )
 
+        if args.chunk_size is not None and args.chunk_size <= 0:
+            raise ValueError("Parameter --chunk-size must be positive")
+
+        # --resume only makes sense if the progress is recorded in chunks
+        if args.resume and args.chunk_size is None:
+            raise ValueError("Parameter --chunk-size must be used if --resume is used")
+
     @overrides
     def run(self, args):
         self._check_args(args)
         prepare_global_logging(args.log_file, args.silent)
 
-        model = load_model(args.model_name, args.model_kwargs)
+        if args.cache_file is not None:
+            model_kwargs = json.loads(args.model_kwargs) if args.model_kwargs else {}
+            model = CachedModel(
+                args.model_name, model_kwargs, cache_file=args.cache_file
+            )
+        else:
+            model = load_model(args.model_name, args.model_kwargs)
 
         if args.dataset_name is not None:
             dataset_reader = HuggingfaceDatasetsDatasetReader(
@@ -172,11 +322,23 @@ class PredictSubcommand(RootSubcommand):
             )
             instances = dataset_reader.read(*args.input_files)
 
-        predictions = predict_with_model(model, instances, args.predict_kwargs)
-
         output_writer = load_output_writer(
             args.output_writer, args.output_writer_kwargs
         )
-        output_writer.write(
-            instances, predictions, args.output, model_name=args.model_name
-        )
+
+        if args.chunk_size is not None:
+            predict_in_chunks(
+                model,
+                instances,
+                output_writer,
+                args.output,
+                args.model_name,
+                args.chunk_size,
+                kwargs=args.predict_kwargs,
+                resume=args.resume,
+            )
+        else:
+            predictions = predict_with_model(model, instances, args.predict_kwargs)
+            output_writer.write(
+                instances, predictions, args.output, model_name=args.model_name
+            )
@@ -16,5 +16,8 @@ else:
     config = {}
 
 REPRO_CONFIG = {
-    "docker_server": config.pop("docker_server", "unix://var/run/docker.sock")
+    "docker_server": config.pop("docker_server", "unix://var/run/docker.sock"),
+    "max_containers_per_image": config.pop("max_containers_per_image", None),
+    "max_containers_per_device": config.pop("max_containers_per_device", None),
+    "cache_dir": config.pop("cache_dir", str(Path.home() / ".repro/cache")),
 }
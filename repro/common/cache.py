@@ -0,0 +1,176 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def hash_object(obj: Any) -> str:
+    """
+    Computes a stable digest of a json-serializable object. Unlike Python's
+    built-in :code:`hash()`, the digest is the same across processes and runs, so it
+    can be used as a key for data which is persisted to disk. Dictionaries are hashed
+    independently of the order of their keys.
+
+    Parameters
+    ----------
+    obj : Any
+        The object to hash
+
+    Returns
+    -------
+    str
+        The hexadecimal BLAKE2 digest of the object
+    """
+    serialized = json.dumps(obj, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(serialized.encode(), digest_size=16).hexdigest()
+
+
+class ResultCache(object):
+    """
+    A key-value cache backed by an SQLite database on disk. The values must be
+    json-serializable. Once the total size of the stored values exceeds
+    :code:`max_size` bytes, the least-recently used entries are evicted.
+
+    The cache may be used concurrently by multiple threads and processes because
+    every operation uses its own connection to the database.
+
+    Parameters
+    ----------
+    path : str
+        The path to the SQLite database file. It will be created if it does not exist.
+    max_size : int, default=None
+        The maximum total size of the values in bytes. If :code:`None`, the cache
+        is never evicted.
+    """
+
+    def __init__(self, path: str, max_size: Optional[int] = None) -> None:
+        if max_size is not None and max_size <= 0:
+            raise ValueError(f"`max_size` must be positive")
+        self.path = path
+        self.max_size = max_size
+        self._lock = threading.Lock()
+
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, "
+                "value TEXT NOT NULL, "
+                "size INTEGER NOT NULL, "
+                "last_access REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS results_last_access ON results(last_access)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=60)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        Looks up the values of :code:`keys`. Keys which are not in the cache are
+        not included in the returned dictionary.
+        """
+        keys = list(set(keys))
+        found = {}
+        with self._lock:
+            connection = self._connect()
+            try:
+                with connection:
+                    # Query in batches to stay under SQLite's limit on the number of variables
+                    for i in range(0, len(keys), 500):
+                        batch = keys[i : i + 500]
+                        placeholders = ",".join("?" * len(batch))
+                        rows = connection.execute(
+                            f"SELECT key, value FROM results WHERE key IN ({placeholders})",
+                            batch,
+                        )
+                        for key, value in rows:
+                            found[key] = json.loads(value)
+
+                    now = time.time()
+                    connection.executemany(
+                        "UPDATE results SET last_access = ? WHERE key = ?",
+                        [(now, key) for key in found],
+                    )
+            finally:
+                connection.close()
+        return found
+
+    def put_many(self, items: Dict[str, Any]) -> None:
+        """
+        Saves the values in :code:`items` to the cache, then evicts the least-recently
+        used entries if the cache is larger than :code:`max_size`.
+        """
+        now = time.time()
+        rows = []
+        for key, value in items.items():
+            try:
+                serialized = json.dumps(value)
+            except TypeError:
+                logger.warning(f"Skipping caching a value which is not serializable")
+                continue
+            rows.append((key, serialized, len(serialized), now))
+
+        with self._lock:
+            connection = self._connect()
+            try:
+                with connection:
+                    connection.executemany(
+                        "INSERT OR REPLACE INTO results (key, value, size, last_access) "
+                        "VALUES (?, ?, ?, ?)",
+                        rows,
+                    )
+                    if self.max_size is not None:
+                        self._evict(connection)
+            finally:
+                connection.close()
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        (total_size,) = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM results"
+        ).fetchone()
+        if total_size <= self.max_size:
+            return
+
+        evicted = []
+        rows = connection.execute(
+            "SELECT key, size FROM results ORDER BY last_access ASC"
+        ).fetchall()
+        for key, size in rows:
+            if total_size <= self.max_size:
+                break
+            evicted.append((key,))
+            total_size -= size
+        connection.executemany("DELETE FROM results WHERE key = ?", evicted)
+        logger.info(f"Evicted {len(evicted)} entries from the cache {self.path}")
+
+    def clear(self) -> None:
+        """
+        Removes all of the entries from the cache.
+        """
+        with self._lock:
+            connection = self._connect()
+            try:
+                with connection:
+                    connection.execute("DELETE FROM results")
+            finally:
+                connection.close()
+
+    def __len__(self) -> int:
+        connection = self._connect()
+        try:
+            (count,) = connection.execute("SELECT COUNT(*) FROM results").fetchone()
+        finally:
+            connection.close()
+        return count
@@ -1,10 +1,18 @@
 import argparse
+import atexit
 import docker
 import json
 import logging
+import os
 import shutil
+import socket
 import tempfile
-from typing import Dict, Optional
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from docker.utils.socket import next_frame_header, read_exactly
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
 
 from overrides import overrides
 
@@ -22,27 +30,141 @@ def make_volume_map(*volumes: str) -> Dict[str, str]:
     return volumes_dict
 
 
+# The number of seconds that the result of looking up an image which exists locally
+# is cached. Images which do not exist are never cached
+IMAGE_CACHE_TTL = 300
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+# Maps from the image name to its ID and the time the cached ID expires
+_image_cache = {}
+_image_cache_lock = threading.Lock()
+
+
+def get_client() -> docker.DockerClient:
+    """
+    Gets the Docker client which is shared by all of the functions in this module.
+    It is created the first time it is needed (and again in child processes which
+    were forked after it was created) and is closed when the Python process exits.
+
+    Returns
+    -------
+    docker.DockerClient
+        The shared client
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = docker.from_env()
+            _client_pid = os.getpid()
+        return _client
+
+
+@atexit.register
+def _close_client() -> None:
+    global _client
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+
+
+def clear_image_cache(image: str = None) -> None:
+    """
+    Removes :code:`image` from the cache of images which exist locally. If :code:`image`
+    is :code:`None`, the whole cache is cleared. This only needs to be called if images
+    are changed outside of this module.
+    """
+    with _image_cache_lock:
+        if image is None:
+            _image_cache.clear()
+        else:
+            _image_cache.pop(image, None)
+
+
+def get_image_digest(image: str) -> Optional[str]:
+    """
+    Gets the ID of the local image, which is the digest of its configuration and
+    therefore changes whenever the image is rebuilt. Results for images which exist are
+    cached for :code:`IMAGE_CACHE_TTL` seconds to avoid repeated calls to the Docker daemon.
+
+    Parameters
+    ----------
+    image : str
+        The name of the Docker image
+
+    Returns
+    -------
+    Optional[str]
+        The image ID or :code:`None` if the image does not exist locally
+    """
+    now = time.monotonic()
+    with _image_cache_lock:
+        if image in _image_cache:
+            digest, expiration = _image_cache[image]
+            if now < expiration:
+                return digest
+            del _image_cache[image]
+
+    try:
+        digest = get_client().images.get(image).id
+    except docker.errors.ImageNotFound:
+        return None
+
+    with _image_cache_lock:
+        _image_cache[image] = (digest, now + IMAGE_CACHE_TTL)
+    return digest
+
+
 def image_exists(image: str) -> bool:
     try:
-        client = docker.from_env()
+        return get_image_digest(image) is not None
     except docker.errors.DockerException as e:
         logger.error("Could not connect to the Docker client. Is the Daemon running?")
         logger.exception(e)
         return False
 
-    found = True
-    try:
-        client.images.get(image)
-    except docker.errors.ImageNotFound:
-        found = False
-    client.close()
-    return found
-
 
 def remove_image(image: str, force: bool = False) -> None:
-    client = docker.from_env()
-    client.images.remove(image, force)
-    client.close()
+    clear_image_cache(image)
+    get_client().images.remove(image, force)
+
+
+def _pull_image_if_missing(client: docker.DockerClient, image: str) -> None:
+    # Check to see if the image already exists locally. If it doesn't,
+    # pull it from Dockerhub. The `client.containers.run` function already
+    # does this automatically, but it is silent. We pull it out here
+    # so that we can add logging around it
+    if not image_exists(image):
+        logger.info(f"Image {image} does not exist locally. Pulling")
+        client.images.pull(image)
+        clear_image_cache(image)
+        logger.info(f"Finished pulling {image}")
+
+
+def _get_volumes(volume_map: Optional[Dict[str, str]]) -> Dict[str, Dict[str, str]]:
+    # Container paths which end with ":ro" are mounted read-only, like in `docker run -v`
+    volume_map = volume_map or {}
+    volumes = {}
+    for host_path, container_path in volume_map.items():
+        mode = "rw"
+        if container_path.endswith(":ro"):
+            container_path, mode = container_path[: -len(":ro")], "ro"
+        volumes[host_path] = {"bind": container_path, "mode": mode}
+    return volumes
+
+
+def _collect_output(logs, silent: bool) -> str:
+    # Collect the stdout and/or stderr, printing if verbose
+    output = []
+    for item in logs:
+        item = item.decode()
+        output.append(item)
+        if not silent:
+            print(item, end="")
+    return "".join(output)
 
 
 def run_command(
@@ -90,23 +212,10 @@ def run_command(
             f"The `docker` package requires either `stdout` or `stderr` is `True`"
         )
 
-    client = docker.from_env()
-
-    # Check to see if the image already exists locally. If it doesn't,
-    # pull it from Dockerhub. The `client.containers.run` function already
-    # does this automatically, but it is silent. We pull it out here
-    # so that we can add logging around it
-    if not image_exists(image):
-        logger.info(f"Image {image} does not exist locally. Pulling")
-        client.images.pull(image)
-        logger.info(f"Finished pulling {image}")
-
-    volume_map = volume_map or {}
-    volumes = {
-        host_path: {"bind": container_path, "mode": "rw"}
-        for host_path, container_path in volume_map.items()
-    }
+    client = get_client()
+    _pull_image_if_missing(client, image)
 
+    volumes = _get_volumes(volume_map)
     runtime = "nvidia" if cuda else None
 
     # Escape any single quotes from the command
@@ -124,19 +233,8 @@ def run_command(
         runtime=runtime,
     )
     logs = container.logs(stream=True, stdout=stdout, stderr=stderr)
-
-    # Collect the stdout and/or stderr, printing if verbose
-    output = []
-    for item in logs:
-        item = item.decode()
-        output.append(item)
-        if not silent:
-            print(item, end="")
+    output = _collect_output(logs, silent)
     logger.info("Command finished")
-
-    client.close()
-
-    output = "".join(output)
     return output
 
 
@@ -163,6 +261,7 @@ def build_image(
 
     logger.info("Finished building image")
     client.close()
+    clear_image_cache(image)
 
 
 def pull_image(image: str) -> None:
@@ -175,10 +274,9 @@ def pull_image(image: str) -> None:
         The name of the image to pull.
     """
     logger.info(f"Pulling image {image} from Docker Hub")
-    client = docker.from_env()
-    client.images.pull(image)
+    get_client().images.pull(image)
+    clear_image_cache(image)
     logger.info("Pulled image")
-    client.close()
 
 
 class BuildDockerImageSubcommand(SetupSubcommand):
@@ -210,18 +308,324 @@ class BuildDockerImageSubcommand(SetupSubcommand):
         build_image(self.root, args.image_name, silent=args.silent)
 
 
+def _wait_for_exec(api: docker.APIClient, exec_id: str) -> int:
+    # The output streams can close slightly before the exec instance is
+    # marked as finished, so poll until the exit code is available
+    while True:
+        result = api.exec_inspect(exec_id)
+        if not result["Running"]:
+            return result["ExitCode"]
+        time.sleep(0.05)
+
+
+class ContainerProcess(object):
+    """
+    A process inside of a container that is communicated with through its stdin
+    and stdout streams, which are multiplexed with stderr over one socket. Anything
+    the process writes to stderr is logged.
+
+    Long-running server processes are expected to implement a simple JSON-lines
+    protocol which is used by :code:`request()`: the process reads one serialized
+    json object per line from stdin and writes exactly one serialized json object
+    per line to stdout in response. If processing the request failed, the response
+    should have an :code:`"error"` key with the error message.
+
+    This allows for models to be loaded once by a server process and then used to
+    answer many requests without paying the startup cost again. Instances should
+    be created with :py:meth:`DockerContainer.get_process`.
+    """
+
+    def __init__(
+        self, sock, is_running: Callable[[], bool], silent: bool = True
+    ) -> None:
+        self.sock = sock
+        self.silent = silent
+        self._is_running = is_running
+        self._buffer = b""
+        self._closed = False
+
+    @property
+    def _raw_socket(self):
+        # For Unix sockets, the docker library returns a `SocketIO` object wrapping
+        # the actual socket, which is necessary to write to the process's stdin
+        return getattr(self.sock, "_sock", self.sock)
+
+    @property
+    def is_running(self) -> bool:
+        if self._closed:
+            return False
+        return self._is_running()
+
+    def write_line(self, line: str) -> None:
+        self._raw_socket.sendall((line + "\n").encode())
+
+    def _read_line(self) -> Optional[str]:
+        # The stdout and stderr streams are multiplexed over the same socket
+        # as frames. Read frames until a full line of stdout is available.
+        # `None` is returned if stdout was closed
+        while b"\n" not in self._buffer:
+            stream, size = next_frame_header(self.sock)
+            if stream == -1:
+                self._closed = True
+                if self._buffer:
+                    line, self._buffer = self._buffer, b""
+                    return line.decode()
+                return None
+            data = read_exactly(self.sock, size)
+            if stream == 1:
+                self._buffer += data
+            else:
+                data = data.decode(errors="replace")
+                logger.debug(data)
+                if not self.silent:
+                    print(data, end="")
+
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return line.decode()
+
+    def read_line(self) -> str:
+        line = self._read_line()
+        if line is None:
+            raise Exception(
+                f"The process in the container exited before finishing a response"
+            )
+        return line
+
+    def read_lines(self) -> Iterator[str]:
+        """Yields the lines written to stdout until the process closes it."""
+        while True:
+            line = self._read_line()
+            if line is None:
+                return
+            yield line
+
+    def request(self, data: Dict[str, Any]) -> Any:
+        """
+        Sends :code:`data` to the process as one line of json and returns
+        the deserialized response.
+        """
+        self.write_line(json.dumps(data))
+        response = json.loads(self.read_line())
+        if isinstance(response, dict) and "error" in response:
+            raise Exception(f"The process in the container failed: {response['error']}")
+        return response
+
+    def close_stdin(self) -> None:
+        """Closes the process's stdin, which signals there is no more input."""
+        try:
+            self._raw_socket.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self.close_stdin()
+        self.sock.close()
+
+
+def _stream_json_lines(
+    process: ContainerProcess, records: Iterable[Any]
+) -> Iterator[Any]:
+    # Writes the records to the process on a separate thread so the process can
+    # start working before all of the records are written and the output can
+    # be read while the input is still being written
+    errors = []
+
+    def _write():
+        try:
+            for record in records:
+                process.write_line(json.dumps(record))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            process.close_stdin()
+
+    writer = threading.Thread(target=_write, daemon=True)
+    writer.start()
+    for line in process.read_lines():
+        yield json.loads(line)
+    writer.join()
+    if errors:
+        raise errors[0]
+
+
+def stream_command(
+    image: str,
+    command: str,
+    records: Iterable[Any],
+    volume_map: Optional[Dict[str, str]] = None,
+    silent: bool = True,
+    network_disabled: bool = False,
+    cuda: bool = False,
+) -> Iterator[Any]:
+    """
+    Runs a shell command in a new container of a Docker image and streams data through
+    the container's stdin and stdout instead of files. Each item in :code:`records` is
+    serialized as one line of json and written to the command's stdin while each line
+    the command writes to stdout is deserialized and yielded as soon as it is available.
+    The container is removed when the command finishes.
+
+    Parameters
+    ----------
+    image : str
+        The name of the Docker image
+    command : str
+        The command to run. It should read json lines from stdin and write json lines to stdout
+    records : Iterable[Any]
+        The json-serializable records to write to stdin
+    volume_map : Dict[str, str], default=None
+        A mapping between host directories to container directories
+    silent : bool, default=True
+        Indicates whether the stderr stream of the command should be written to stdout
+    network_disabled : bool, default=False
+        Indicates the container's network connection should be disabled
+    cuda : bool, default=False
+        Indicates that the processes uses cuda, in which the runtime will be set to "nvidia"
+
+    Returns
+    -------
+    Iterator[Any]
+        The deserialized lines written to stdout by the command
+    """
+    client = get_client()
+    _pull_image_if_missing(client, image)
+
+    runtime = "nvidia" if cuda else None
+    logger.info(f'Streaming command in Docker image {image}: "{command}"')
+    # Because `detach` is not set, `stdin_open` also sets "StdinOnce", so the
+    # command's stdin is closed when the attached socket stops writing
+    container = client.containers.create(
+        image,
+        ["/bin/sh", "-c", command],
+        volumes=_get_volumes(volume_map),
+        stdin_open=True,
+        network_disabled=network_disabled,
+        runtime=runtime,
+    )
+    try:
+        # Attach before starting so none of the output is missed
+        sock = client.api.attach_socket(
+            container.id, params={"stdin": 1, "stdout": 1, "stderr": 1, "stream": 1}
+        )
+        process = ContainerProcess(
+            sock,
+            lambda: client.api.inspect_container(container.id)["State"]["Running"],
+            silent=silent,
+        )
+        container.start()
+        try:
+            yield from _stream_json_lines(process, records)
+        finally:
+            process.close()
+
+        exit_code = container.wait()["StatusCode"]
+        if exit_code != 0:
+            raise Exception(f"Command exited with non-zero exit code {exit_code}")
+        logger.info("Command finished")
+    finally:
+        container.remove(force=True)
+
+
 class DockerContainer(object):
-    def __init__(self, image: str):
+    """
+    A :code:`DockerContainer` provides a temporary host directory that is mounted
+    into the container and runs commands in the Docker image with that directory
+    available.
+
+    By default, every call to :code:`run_command()` starts a brand new container which
+    exits when the command finishes, and the host directory is deleted at the end of
+    the :code:`with` block.
+
+    If :code:`persistent` is :code:`True`, a single long-running container is started
+    the first time a command is run. Subsequent commands are executed inside of that same
+    container with :code:`exec`, which avoids paying the cost of creating a new container
+    on every call. The host directory is kept for the lifetime of the container and its
+    contents are cleared at the end of every :code:`with` block. The container is stopped
+    when :code:`close()` is called, after it has been idle for :code:`idle_timeout` seconds,
+    or when the Python process exits. A stopped container is automatically restarted the
+    next time a command is run.
+
+    Persistent containers can also run long-lived processes, such as servers which
+    keep a model loaded in memory, with :code:`get_process()`.
+
+    Parameters
+    ----------
+    image : str
+        The name of the Docker image
+    persistent : bool, default=False
+        Indicates whether one long-running container should be reused across commands
+    idle_timeout : float, default=None
+        The number of seconds a persistent container may be unused before it is stopped.
+        If :code:`None`, the container runs until :code:`close()` is called.
+    mounts : Dict[str, str], default=None
+        Additional host directories which are mounted into the container, mapped to their
+        paths in the container. Unlike the temporary directory, they are not deleted or
+        cleared, so they can hold data which is kept across containers (e.g., caches).
+        A container path which ends with ":ro" is mounted read-only.
+    """
+
+    def __init__(
+        self,
+        image: str,
+        persistent: bool = False,
+        idle_timeout: float = None,
+        mounts: Dict[str, str] = None,
+    ):
         self.image = image
+        self.persistent = persistent
+        self.idle_timeout = idle_timeout
+        self.mounts = dict(mounts or {})
+
+        self.host_dir = None
+        self._container = None
+        self._container_settings = None
+        self._processes = {}
+        self._idle_timer = None
+        self._lock = threading.RLock()
 
     def __enter__(self):
-        self.host_dir = tempfile.mkdtemp()
-        self.volume_map = make_volume_map(self.host_dir)
-        self.container_dir = self.volume_map[self.host_dir]
+        if not self.persistent:
+            self.host_dir = tempfile.mkdtemp()
+            self.volume_map = self._get_volume_map()
+            return self
+
+        # Only one caller may use the persistent container's directory at a time
+        self._lock.acquire()
+        self._cancel_idle_timer()
+        if self.host_dir is None:
+            self.host_dir = tempfile.mkdtemp()
+            self.volume_map = self._get_volume_map()
+            _live_containers.add(self)
         return self
 
+    def _get_volume_map(self) -> Dict[str, str]:
+        volume_map = make_volume_map(self.host_dir)
+        self.container_dir = volume_map[self.host_dir]
+        for host_path, container_path in self.mounts.items():
+            os.makedirs(host_path, exist_ok=True)
+            volume_map[os.path.abspath(host_path)] = container_path
+        return volume_map
+
     def __exit__(self, *args):
-        shutil.rmtree(self.host_dir)
+        if not self.persistent:
+            shutil.rmtree(self.host_dir)
+            return
+
+        try:
+            # Clear the directory so the next caller starts from a clean state,
+            # but keep the directory itself because it is mounted into the container
+            if self.host_dir is not None and os.path.exists(self.host_dir):
+                for name in os.listdir(self.host_dir):
+                    path = f"{self.host_dir}/{name}"
+                    if os.path.isdir(path) and not os.path.islink(path):
+                        shutil.rmtree(path)
+                    else:
+                        os.remove(path)
+            self._start_idle_timer()
+        finally:
+            self._lock.release()
 
     def run_command(self, **kwargs) -> str:
         for arg in ["image", "volume_map"]:
@@ -230,4 +634,528 @@ class DockerContainer(object):
                     f"`{arg}` parameter cannot be passed to the `DockerContainer`"
                     f"`run_command` function."
                 )
-        return run_command(self.image, volume_map=self.volume_map, **kwargs)
+        if not self.persistent:
+            return run_command(self.image, volume_map=self.volume_map, **kwargs)
+
+        with self._lock:
+            return self._exec_command(**kwargs)
+
+    def stream_command(
+        self, command: str, records: Iterable[Any], **kwargs
+    ) -> Iterator[Any]:
+        """
+        Runs :code:`command` and streams :code:`records` through its stdin and stdout. See
+        :py:meth:`repro.common.docker.stream_command` for details. The command is run
+        inside of the running container if this container is persistent.
+        """
+        for arg in ["image", "volume_map"]:
+            if arg in kwargs:
+                raise Exception(
+                    f"`{arg}` parameter cannot be passed to the `DockerContainer`"
+                    f"`stream_command` function."
+                )
+        if not self.persistent:
+            return stream_command(
+                self.image, command, records, volume_map=self.volume_map, **kwargs
+            )
+        return self._stream_exec_command(command, records, **kwargs)
+
+    def _stream_exec_command(
+        self,
+        command: str,
+        records: Iterable[Any],
+        silent: bool = True,
+        network_disabled: bool = False,
+        cuda: bool = False,
+    ) -> Iterator[Any]:
+        with self._lock:
+            self._ensure_container(network_disabled, cuda)
+            logger.info(
+                f'Streaming command in persistent container for image {self.image}: "{command}"'
+            )
+            api = get_client().api
+            exec_id = api.exec_create(
+                self._container.id,
+                ["/bin/sh", "-c", command],
+                stdin=True,
+                stdout=True,
+                stderr=True,
+            )["Id"]
+            sock = api.exec_start(exec_id, socket=True)
+            process = ContainerProcess(
+                sock, lambda: api.exec_inspect(exec_id)["Running"], silent=silent
+            )
+            try:
+                yield from _stream_json_lines(process, records)
+            finally:
+                process.close()
+
+            exit_code = _wait_for_exec(api, exec_id)
+            if exit_code != 0:
+                raise Exception(f"Command exited with non-zero exit code {exit_code}")
+            logger.info("Command finished")
+
+    @property
+    def is_running(self) -> bool:
+        """Indicates whether the persistent container is currently running."""
+        return self._container is not None
+
+    def _start_container(self, network_disabled: bool, cuda: bool) -> None:
+        client = get_client()
+        _pull_image_if_missing(client, self.image)
+
+        runtime = "nvidia" if cuda else None
+        logger.info(f"Starting persistent container for Docker image {self.image}")
+        # The container runs a command which never exits so that it stays
+        # alive until it is explicitly stopped
+        self._container = client.containers.run(
+            self.image,
+            ["/bin/sh", "-c", "tail -f /dev/null"],
+            volumes=_get_volumes(self.volume_map),
+            detach=True,
+            network_disabled=network_disabled,
+            runtime=runtime,
+        )
+        self._container_settings = (network_disabled, cuda)
+
+    def _ensure_container(self, network_disabled: bool, cuda: bool) -> None:
+        if self.host_dir is None:
+            raise Exception(
+                f"A persistent `DockerContainer` must be used within a `with` block"
+            )
+
+        # The network and runtime can only be set when the container is created,
+        # so a different configuration requires restarting the container
+        if self._container is not None:
+            if self._container_settings != (network_disabled, cuda):
+                logger.info(
+                    f"Restarting persistent container for {self.image} with new settings"
+                )
+                self._stop_container()
+        if self._container is None:
+            self._start_container(network_disabled, cuda)
+
+    def get_process(
+        self,
+        command: str,
+        network_disabled: bool = False,
+        cuda: bool = False,
+        silent: bool = True,
+    ) -> ContainerProcess:
+        """
+        Gets the :code:`ContainerProcess` which is running :code:`command` in the
+        persistent container, starting it if it is not already running. Processes are
+        stopped when the container is stopped.
+
+        Parameters
+        ----------
+        command : str
+            The command which starts the process
+        network_disabled : bool, default=False
+            Indicates the container's network connection should be disabled
+        cuda : bool, default=False
+            Indicates that the processes uses cuda, in which the runtime will be set to "nvidia"
+        silent : bool, default=True
+            Indicates whether the stderr stream of the process should be written to stdout
+
+        Returns
+        -------
+        ContainerProcess
+            The running process
+        """
+        if not self.persistent:
+            raise Exception(
+                f"`get_process` can only be used with a persistent `DockerContainer`"
+            )
+
+        with self._lock:
+            self._ensure_container(network_disabled, cuda)
+            process = self._processes.get(command)
+            if process is not None and process.is_running:
+                return process
+
+            logger.info(
+                f'Starting process in persistent container for image {self.image}: "{command}"'
+            )
+            api = get_client().api
+            exec_id = api.exec_create(
+                self._container.id,
+                ["/bin/sh", "-c", command],
+                stdin=True,
+                stdout=True,
+                stderr=True,
+            )["Id"]
+            sock = api.exec_start(exec_id, socket=True)
+            process = ContainerProcess(
+                sock, lambda: api.exec_inspect(exec_id)["Running"], silent=silent
+            )
+            self._processes[command] = process
+            return process
+
+    def _exec_command(
+        self,
+        command: str,
+        stdout: bool = True,
+        stderr: bool = True,
+        silent: bool = False,
+        network_disabled: bool = False,
+        cuda: bool = False,
+    ) -> str:
+        if not stdout and not stderr:
+            raise ValueError(
+                f"The `docker` package requires either `stdout` or `stderr` is `True`"
+            )
+        self._ensure_container(network_disabled, cuda)
+
+        logger.info(
+            f'Running command in persistent container for image {self.image}: "{command}"'
+        )
+        api = get_client().api
+        exec_id = api.exec_create(
+            self._container.id,
+            ["/bin/sh", "-c", command],
+            stdout=stdout,
+            stderr=stderr,
+        )["Id"]
+        logs = api.exec_start(exec_id, stream=True)
+        output = _collect_output(logs, silent)
+
+        exit_code = _wait_for_exec(api, exec_id)
+        if exit_code != 0:
+            logger.error(f"Command exited with non-zero exit code {exit_code}")
+        logger.info("Command finished")
+        return output
+
+    def _stop_container(self) -> None:
+        for process in self._processes.values():
+            process.close()
+        self._processes = {}
+
+        if self._container is not None:
+            logger.info(f"Stopping persistent container for Docker image {self.image}")
+            try:
+                self._container.remove(force=True)
+            except docker.errors.APIError as e:
+                logger.exception(e)
+            self._container = None
+            self._container_settings = None
+
+    def _start_idle_timer(self) -> None:
+        if self.idle_timeout is not None and self._container is not None:
+            self._idle_timer = threading.Timer(self.idle_timeout, self._on_idle)
+            self._idle_timer.daemon = True
+            self._idle_timer.start()
+
+    def _cancel_idle_timer(self) -> None:
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+
+    def _on_idle(self) -> None:
+        # Do not stop the container if it is currently being used
+        if self._lock.acquire(blocking=False):
+            try:
+                logger.info(f"Persistent container for {self.image} is idle")
+                self._idle_timer = None
+                self._stop_container()
+            finally:
+                self._lock.release()
+
+    def close(self) -> None:
+        """
+        Stops the persistent container (if it is running) and deletes the
+        host directory. This is a no-op for non-persistent containers.
+        """
+        if not self.persistent:
+            return
+        with self._lock:
+            self._cancel_idle_timer()
+            self._stop_container()
+            if self.host_dir is not None:
+                shutil.rmtree(self.host_dir, ignore_errors=True)
+                self.host_dir = None
+            _live_containers.discard(self)
+
+
+class ContainerPool(object):
+    """
+    A :code:`ContainerPool` hands out persistent :code:`DockerContainer` objects to
+    any caller which asks for one and keeps them running after they are released so
+    that the next caller receives a warm container. Containers are keyed by the image,
+    the device they use, the corresponding runtime, and their additional mounts, so a
+    container is only reused for the same configuration.
+
+    The pool limits the number of live containers per image and per GPU. If a caller
+    requests a container when the limit has been reached, an idle container which is
+    blocking the request is stopped to make room. If there are no idle containers which
+    can be stopped, the caller waits until another caller releases its container.
+
+    Callers may pass an :code:`owner` (e.g., the model which uses the container) when
+    they acquire a container. :code:`close(owner=...)` then only stops the idle
+    containers which were not acquired by any other live owner, so closing one model
+    does not stop the warm containers of other models which use the same image.
+
+    The pool is thread-safe, but it only coordinates the callers within one process.
+    Use :py:meth:`get_container_pool` to access the process-wide pool.
+
+    Parameters
+    ----------
+    max_containers_per_image : int, default=None
+        The maximum number of live containers for any one image. If :code:`None`,
+        there is no limit.
+    max_containers_per_device : int, default=None
+        The maximum number of live containers which use any one GPU. If :code:`None`,
+        there is no limit. CPU containers are not limited.
+    idle_timeout : float, default=None
+        The default number of seconds a container may be idle before it is stopped
+    """
+
+    def __init__(
+        self,
+        max_containers_per_image: int = None,
+        max_containers_per_device: int = None,
+        idle_timeout: float = None,
+    ) -> None:
+        for name, value in [
+            ("max_containers_per_image", max_containers_per_image),
+            ("max_containers_per_device", max_containers_per_device),
+        ]:
+            if value is not None and value <= 0:
+                raise ValueError(f"`{name}` must be positive")
+
+        self.max_containers_per_image = max_containers_per_image
+        self.max_containers_per_device = max_containers_per_device
+        self.idle_timeout = idle_timeout
+
+        self._condition = threading.Condition()
+        # The key for every live container and the live containers not being used
+        self._keys = {}
+        self._idle = []
+        # The owners which acquired each live container
+        self._owners = {}
+
+    @staticmethod
+    def _get_key(image: str, device: int, mounts: Optional[Dict[str, str]]) -> Tuple:
+        runtime = "nvidia" if device != -1 else None
+        mounts = tuple(sorted((mounts or {}).items()))
+        return image, device, runtime, mounts
+
+    def _get_full_limits(self, key: Tuple) -> Tuple[bool, bool]:
+        # Whether the image and device limits for `key` have been reached
+        image, device = key[:2]
+        keys = list(self._keys.values())
+        image_full, device_full = False, False
+        if self.max_containers_per_image is not None:
+            num_image = sum(1 for other in keys if other[0] == image)
+            image_full = num_image >= self.max_containers_per_image
+        if self.max_containers_per_device is not None and device != -1:
+            num_device = sum(1 for other in keys if other[1] == device)
+            device_full = num_device >= self.max_containers_per_device
+        return image_full, device_full
+
+    def _has_room(self, key: Tuple) -> bool:
+        return not any(self._get_full_limits(key))
+
+    def _is_blocking(self, key: Tuple, other_key: Tuple) -> bool:
+        # Whether stopping the container with `other_key` frees up a full limit for `key`
+        image_full, device_full = self._get_full_limits(key)
+        if image_full and other_key[0] == key[0]:
+            return True
+        if device_full and other_key[1] == key[1]:
+            return True
+        return False
+
+    def _remove(self, container: DockerContainer) -> None:
+        self._idle.remove(container)
+        del self._keys[container]
+        self._owners.pop(container, None)
+        container.close()
+
+    def _add_owner(self, container: DockerContainer, owner: Any) -> DockerContainer:
+        if owner is not None:
+            self._owners.setdefault(container, weakref.WeakSet()).add(owner)
+        return container
+
+    def acquire(
+        self,
+        image: str,
+        device: int = -1,
+        idle_timeout: float = None,
+        timeout: float = None,
+        mounts: Dict[str, str] = None,
+        owner: Any = None,
+    ) -> DockerContainer:
+        """
+        Acquires a persistent container for :code:`image` and :code:`device`. The
+        container must be returned with :code:`release()` when the caller is finished.
+
+        Parameters
+        ----------
+        image : str
+            The name of the Docker image
+        device : int, default=-1
+            The ID of the GPU the container will use, -1 if CPU
+        idle_timeout : float, default=None
+            The idle timeout for the container if a new one is created. If :code:`None`,
+            the pool's :code:`idle_timeout` is used.
+        timeout : float, default=None
+            The maximum number of seconds to wait for a container. If :code:`None`,
+            the caller waits until one is available.
+        mounts : Dict[str, str], default=None
+            Additional host directories to mount into the container. See
+            :py:class:`DockerContainer`.
+        owner : Any, default=None
+            The object which uses the container, such as a model. It is referenced
+            weakly and is used by :code:`close()` to stop only the owner's containers.
+
+        Returns
+        -------
+        DockerContainer
+            The persistent container
+        """
+        key = self._get_key(image, device, mounts)
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._condition:
+            while True:
+                # Reuse an idle container with the same configuration
+                for container in self._idle:
+                    if self._keys[container] == key:
+                        self._idle.remove(container)
+                        return self._add_owner(container, owner)
+
+                # Stop idle containers which count towards the same limits
+                # until there is room for a new one
+                for container in list(self._idle):
+                    if self._has_room(key):
+                        break
+                    if self._is_blocking(key, self._keys[container]):
+                        self._remove(container)
+
+                if self._has_room(key):
+                    if idle_timeout is None:
+                        idle_timeout = self.idle_timeout
+                    container = DockerContainer(
+                        image,
+                        persistent=True,
+                        idle_timeout=idle_timeout,
+                        mounts=mounts,
+                    )
+                    self._keys[container] = key
+                    return self._add_owner(container, owner)
+
+                logger.info(f"Waiting for an available container for image {image}")
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise Exception(
+                            f"Timed out waiting for a container for image {image}"
+                        )
+                self._condition.wait(remaining)
+
+    def release(self, container: DockerContainer) -> None:
+        """
+        Returns a container acquired with :code:`acquire()` to the pool so it can be reused.
+        """
+        with self._condition:
+            if container not in self._keys:
+                raise Exception(f"The container does not belong to this pool")
+            self._idle.append(container)
+            self._condition.notify_all()
+
+    @contextmanager
+    def container(
+        self,
+        image: str,
+        device: int = -1,
+        idle_timeout: float = None,
+        timeout: float = None,
+        mounts: Dict[str, str] = None,
+        owner: Any = None,
+    ) -> Iterator[DockerContainer]:
+        """
+        Acquires a container, enters its :code:`with` block, and releases it to
+        the pool at the end. See :code:`acquire()` for a description of the parameters.
+
+        Examples
+        --------
+        .. code-block:: python
+
+            with get_container_pool().container(image, device=0) as backend:
+                backend.run_command(command=command, cuda=True)
+        """
+        container = self.acquire(
+            image,
+            device=device,
+            idle_timeout=idle_timeout,
+            timeout=timeout,
+            mounts=mounts,
+            owner=owner,
+        )
+        try:
+            with container as backend:
+                yield backend
+        finally:
+            self.release(container)
+
+    def close(self, image: str = None, device: int = None, owner: Any = None) -> None:
+        """
+        Stops the idle containers in the pool. If :code:`image` or :code:`device`
+        are not :code:`None`, only the containers which match them are stopped.
+
+        If :code:`owner` is not :code:`None`, it is removed from the owners of the
+        containers it acquired, and only those containers which no longer have any
+        owner are stopped. Containers which are shared with other owners stay warm.
+        """
+        with self._condition:
+            released = set()
+            if owner is not None:
+                for container, owners in self._owners.items():
+                    if owner in owners:
+                        owners.discard(owner)
+                        if len(owners) == 0:
+                            released.add(container)
+
+            for container in list(self._idle):
+                if owner is not None and container not in released:
+                    continue
+                other_image, other_device = self._keys[container][:2]
+                if image is not None and image != other_image:
+                    continue
+                if device is not None and device != other_device:
+                    continue
+                self._remove(container)
+            self._condition.notify_all()
+
+
+_container_pool = None
+_container_pool_lock = threading.Lock()
+
+
+def get_container_pool() -> ContainerPool:
+    """
+    Gets the process-wide :code:`ContainerPool`. It is created the first time this is
+    called with the limits set by the :code:`"max_containers_per_image"` and
+    :code:`"max_containers_per_device"` entries of the Repro config file. The limits can
+    be changed by setting the corresponding attributes of the returned pool.
+    """
+    global _container_pool
+    with _container_pool_lock:
+        if _container_pool is None:
+            _container_pool = ContainerPool(
+                max_containers_per_image=REPRO_CONFIG["max_containers_per_image"],
+                max_containers_per_device=REPRO_CONFIG["max_containers_per_device"],
+            )
+        return _container_pool
+
+
+# Keeps track of the persistent containers which have not been closed
+# so that they can be stopped when the Python process exits
+_live_containers = set()
+
+
+@atexit.register
+def _close_live_containers() -> None:
+    for container in list(_live_containers):
+        container.close()
@@ -0,0 +1,161 @@
+import logging
+from typing import Callable, List, Optional
+
+from repro.common import REPRO_CONFIG
+from repro.common.cache import ResultCache, hash_object
+from repro.common.docker import get_container_pool, get_image_digest
+
+logger = logging.getLogger(__name__)
+
+
+class SentenceSplitter(object):
+    """
+    A :code:`SentenceSplitter` runs a sentence splitter which is installed in a Docker
+    image and saves the sentences for every text to an on-disk
+    :py:class:`repro.common.cache.ResultCache`, so texts which are repeated within a
+    batch or across runs (e.g., the reference summaries of a dataset) are only split
+    once. All of the texts which are not in the cache are split by one call to the
+    splitter.
+
+    The cache key combines the ID of the Docker image, the :code:`name` of the
+    splitter and the text, so rebuilding or pulling a new version of the image
+    invalidates the cached sentences. Nothing is cached if the image does not exist
+    locally.
+
+    Parameters
+    ----------
+    image : str
+        The name of the Docker image
+    split_function : Callable[[str, List[str]], List[List[str]]]
+        The function which runs the sentence splitter in a new container of
+        :code:`image` and returns the sentences for each of the texts
+    name : str
+        The name of the splitter, which is part of the cache key to separate
+        different splitters which are installed in the same image
+    server_command : str, default=None
+        The command which starts a sentence splitting server in the image. The server
+        should answer :code:`{"texts": [...]}` requests with :code:`{"sentences": [...]}`
+        using the JSON-lines protocol of :py:class:`repro.common.docker.ContainerProcess`.
+        It is required if :code:`persistent` is :code:`True`.
+    persistent : bool, default=False
+        Indicates whether the splitter should run as a server in a warm container from
+        the process-wide container pool instead of in a new container for every call
+    idle_timeout : float, default=None
+        The number of seconds the persistent container may be idle before it is stopped
+    cache : bool, default=True
+        Indicates whether the sentences should be cached
+    cache_file : str, default=None
+        The path to the cache's database. Defaults to :code:`sentences.sqlite` in the
+        :code:`"cache_dir"` of the repro config. Different splitters may share one file.
+    """
+
+    def __init__(
+        self,
+        image: str,
+        split_function: Callable[[str, List[str]], List[List[str]]],
+        name: str,
+        server_command: str = None,
+        persistent: bool = False,
+        idle_timeout: float = None,
+        cache: bool = True,
+        cache_file: str = None,
+    ) -> None:
+        if persistent and server_command is None:
+            raise ValueError(f"`server_command` is required if `persistent` is `True`")
+        self.image = image
+        self.split_function = split_function
+        self.name = name
+        self.server_command = server_command
+        self.persistent = persistent
+        self.idle_timeout = idle_timeout
+
+        self.cache = None
+        if cache:
+            cache_file = cache_file or f"{REPRO_CONFIG['cache_dir']}/sentences.sqlite"
+            self.cache = ResultCache(cache_file)
+
+    def _get_config_key(self) -> Optional[str]:
+        # Returns `None` if the sentences cannot be cached because the
+        # image does not exist locally yet
+        image_digest = get_image_digest(self.image)
+        if image_digest is None:
+            return None
+        return hash_object({"name": self.name, "image_digest": image_digest})
+
+    def _run_splitter(self, texts: List[str]) -> List[List[str]]:
+        if not self.persistent:
+            return self.split_function(self.image, texts)
+
+        with get_container_pool().container(
+            self.image, idle_timeout=self.idle_timeout, owner=self
+        ) as backend:
+            server = backend.get_process(self.server_command, network_disabled=True)
+            return server.request({"texts": texts})["sentences"]
+
+    def split(self, texts: List[str]) -> List[List[str]]:
+        """
+        Splits each of the texts into sentences.
+
+        Parameters
+        ----------
+        texts : List[str]
+            The texts to split
+
+        Returns
+        -------
+        List[List[str]]
+            The sentences of each text
+        """
+        if len(texts) == 0:
+            return []
+
+        config_key = None
+        if self.cache is not None:
+            config_key = self._get_config_key()
+
+        # Identical texts only need to be split once
+        keys = [hash_object([config_key, text]) for text in texts]
+        sentences = {}
+        if config_key is not None:
+            sentences = self.cache.get_many(keys)
+
+        to_split = {}
+        for key, text in zip(keys, texts):
+            if key not in sentences and key not in to_split:
+                to_split[key] = text
+        logger.info(
+            f"Sentence splitting {len(to_split)} texts, {len(texts) - len(to_split)} "
+            f"were cached or duplicates"
+        )
+
+        if len(to_split) > 0:
+            outputs = self._run_splitter(list(to_split.values()))
+            if len(outputs) != len(to_split):
+                raise Exception(
+                    f"Sentence splitting returned {len(outputs)} instances but expected {len(to_split)}"
+                )
+            computed = dict(zip(to_split.keys(), outputs))
+            sentences.update(computed)
+
+            # The image may have been pulled by the splitter
+            if self.cache is not None:
+                if config_key is None:
+                    config_key = self._get_config_key()
+                    if config_key is not None:
+                        computed = {
+                            hash_object([config_key, to_split[key]]): output
+                            for key, output in computed.items()
+                        }
+                if config_key is not None:
+                    self.cache.put_many(computed)
+
+        return [sentences[key] for key in keys]
+
+    def close(self) -> None:
+        """
+        Stops the idle persistent containers which were used by this splitter and are
+        not shared with another live user of the container pool. This is a no-op if
+        the splitter is not persistent.
+        """
+        if self.persistent:
+            get_container_pool().close(owner=self)
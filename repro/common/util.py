@@ -1,6 +1,8 @@
+import copy
 from collections import defaultdict
 from typing import Any, Dict, List, Set, T, Tuple, Union
 
+from repro.common.cache import hash_object
 from repro.data.types import MetricsType, TextType
 
 # `Indexable` is something which maps from an int to a value.
@@ -33,30 +35,51 @@ def flatten(text: Union[str, List[str]], separator: str = None) -> str:
     return text
 
 
-def _hash_texts(texts: List[TextType]) -> int:
-    hashes = []
-    for text in texts:
-        if isinstance(text, str):
-            hashes.append(hash(text))
-        else:
-            hashes.append(hash(tuple(text)))
-    return hash(tuple(hashes))
+def hash_texts(texts: List[TextType]) -> str:
+    """
+    Computes a stable digest of a list of texts, such as a set of references. The
+    digest is the same across processes and runs (unlike Python's :code:`hash()`),
+    so it can be used to share or persist data about the texts. A text which is a
+    string and the same text as a list of sentences have different digests.
+
+    Parameters
+    ----------
+    texts : List[TextType]
+        The texts to hash
+
+    Returns
+    -------
+    str
+        The hexadecimal BLAKE2 digest of the texts
+    """
+    return hash_object(texts)
 
 
 def group_by_references(
-    candidates: List[TextType], references_list: List[List[TextType]]
-) -> Tuple[List[List[TextType]], List[List[TextType]], List[Tuple[int, int]]]:
+    candidates: List[TextType],
+    references_list: List[List[TextType]],
+    return_keys: bool = False,
+) -> Union[
+    Tuple[List[List[TextType]], List[List[TextType]], List[Tuple[int, int]]],
+    Tuple[List[List[TextType]], List[List[TextType]], List[Tuple[int, int]], List[str]],
+]:
     """
     Groups the `candidates` by identical references in `references_list`. This is
     enables evaluation metrics which need to do a lot of preprocessing of the
     references to reducing the amount of duplicate effort required.
 
+    The references are grouped by their :code:`hash_texts` digest, which is stable
+    across processes and runs, so the keys can be used to cache or share the
+    preprocessing of the references.
+
     Parameters
     ----------
     candidates : List[TextType]
         The candidate texts
     references_list : List[List[TextType]]
         The reference texts.
+    return_keys : bool, default=False
+        If `True`, the keys of the groups are also returned.
 
     Returns
     -------
@@ -68,26 +91,33 @@ def group_by_references(
     List[Tuple[int, int]]
         A mapping from the input `candidates` to the `(i, j)` position
         in the grouped candidates that it corresponds to.
+    List[str]
+        The :code:`hash_texts` digest of each of the grouped references. Only
+        returned if `return_keys` is `True`.
     """
     mapping = []
     references_to_index = {}
     grouped_candidates_list = []
     grouped_references_list = []
+    keys = []
 
     for candidate, references in zip(candidates, references_list):
-        references_key = _hash_texts(references)
+        references_key = hash_texts(references)
         if references_key not in references_to_index:
             # This is a new set of references. Update the data structures
             group_index = len(grouped_references_list)
             references_to_index[references_key] = group_index
             grouped_candidates_list.append([])
             grouped_references_list.append(references)
+            keys.append(references_key)
 
         group_index = references_to_index[references_key]
         candidate_index = len(grouped_candidates_list[group_index])
         grouped_candidates_list[group_index].append(candidate)
         mapping.append((group_index, candidate_index))
 
+    if return_keys:
+        return grouped_candidates_list, grouped_references_list, mapping, keys
     return grouped_candidates_list, grouped_references_list, mapping
 
 
@@ -118,6 +148,59 @@ def ungroup_values(
     return ungrouped_values
 
 
+def deduplicate(items: List[T]) -> Tuple[List[T], List[int]]:
+    """
+    Removes the duplicates from `items`, for instance identical (candidate, reference)
+    pairs, so that metrics which score every item independently only have to score
+    each distinct item once. The items are compared by their :code:`hash_object` digest,
+    so they must be json-serializable.
+
+    Parameters
+    ----------
+    items : List[T]
+        The items to deduplicate
+
+    Returns
+    -------
+    List[T]
+        The distinct items in the order they first appear
+    List[int]
+        A mapping from each item in `items` to the index of the
+        identical item in the distinct items
+    """
+    key_to_index = {}
+    distinct_items = []
+    mapping = []
+    for item in items:
+        key = hash_object(item)
+        if key not in key_to_index:
+            key_to_index[key] = len(distinct_items)
+            distinct_items.append(item)
+        mapping.append(key_to_index[key])
+    return distinct_items, mapping
+
+
+def expand_deduplicated(values: Indexable[T], mapping: List[int]) -> List[T]:
+    """
+    Reverses :code:`deduplicate` by copying the value for each distinct item to
+    every position in the original items it corresponds to. Every position gets its
+    own copy in case any downstream processing modifies the values.
+
+    Parameters
+    ----------
+    values : Indexable[T]
+        The values for the distinct items
+    mapping : List[int]
+        The mapping returned by :code:`deduplicate`
+
+    Returns
+    -------
+    List[T]
+        The values parallel to the original items
+    """
+    return [copy.deepcopy(values[index]) for index in mapping]
+
+
 def flatten_nested_dict(nested_dict: NestedDict) -> Dict[Tuple[str, ...], float]:
     def _recursively_flatten(
         target: Dict[Tuple[str, ...], float], d: NestedDict, prefix: List[str]
@@ -25,6 +25,7 @@ class DefaultOutputWriter(OutputWriter):
         output_file_or_dir: str,
         model_name: str,
         *args,
+        append: bool = False,
         **kwargs
     ) -> None:
         output_file = output_file_or_dir
@@ -32,7 +33,7 @@ class DefaultOutputWriter(OutputWriter):
         if dirname:
             os.makedirs(dirname, exist_ok=True)
 
-        with open(output_file, "w") as out:
+        with open(output_file, "a" if append else "w") as out:
             for instance, prediction in zip(instances, predictions):
                 data = {
                     "instance_id": instance["instance_id"],
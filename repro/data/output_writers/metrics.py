@@ -25,8 +25,14 @@ class MetricsOutputWriter(OutputWriter):
         output_file_or_dir: str,
         model_name: str,
         *args,
-        **kwargs
+        append: bool = False,
+        **kwargs,
     ) -> None:
+        if append:
+            raise ValueError(
+                f"{self.__class__.__name__} does not support appending to the output"
+            )
+
         output_file = output_file_or_dir
         dirname = os.path.dirname(output_file)
         if dirname:
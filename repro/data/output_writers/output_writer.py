@@ -55,5 +55,9 @@ class OutputWriter(Registrable):
             The predictions to save
         output_file_or_dir : str
             The output file or directory
+        append : bool, default=False
+            If `True`, the predictions should be appended to the existing output instead of
+            overwriting it. This is used to write the output in chunks and is only supported
+            by writers with one prediction per instance.
         """
         raise NotImplementedError
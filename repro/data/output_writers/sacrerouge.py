@@ -27,6 +27,7 @@ class SacreROUGEOutputWriter(OutputWriter):
         output_file_or_dir: str,
         model_name: str,
         *args,
+        append: bool = False,
         **kwargs
     ) -> None:
         output_file = output_file_or_dir
@@ -34,7 +35,7 @@ class SacreROUGEOutputWriter(OutputWriter):
         if dirname:
             os.makedirs(dirname, exist_ok=True)
 
-        with open(output_file, "w") as out:
+        with open(output_file, "a" if append else "w") as out:
             for instance, prediction in zip(instances, predictions):
                 output_dict = {
                     "instance_id": instance["instance_id"],
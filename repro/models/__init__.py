@@ -1,4 +1,5 @@
 from repro.models.model import (
+    CachedModel,
     Model,
     ParallelModel,
     QuestionAnsweringModel,
@@ -25,6 +25,10 @@ class _Colombo2021Model(Model):
         """Returns the command line options for the metric"""
         raise NotImplementedError
 
+    def _uses_idf(self) -> bool:
+        """Returns whether the metric weights the tokens by IDF"""
+        return False
+
     def predict(self, candidate: TextType, references: List[TextType]) -> MetricsType:
         return self.predict_batch([{"candidate": candidate, "references": references}])[
             0
@@ -39,6 +43,22 @@ class _Colombo2021Model(Model):
         candidates = [inp["candidate"] for inp in inputs]
         references_list = [inp["references"] for inp in inputs]
 
+        # The candidate is scored once per reference
+        pairs = [
+            (candidate, reference)
+            for candidate, references in zip(candidates, references_list)
+            for reference in references
+        ]
+
+        # Identical pairs only need to be scored once. The IDF weights are calculated
+        # from all of the texts in the input files, so the pairs are not deduplicated
+        # if the IDF weights are used because that would change the weights
+        if self._uses_idf():
+            mapping = list(range(len(pairs)))
+        else:
+            pairs, mapping = util.deduplicate(pairs)
+        logger.info(f"Scoring {len(pairs)} candidate-reference pairs")
+
         with DockerContainer(self.image) as backend:
             host_ref_file = f"{backend.host_dir}/ref.txt"
             container_ref_file = f"{backend.container_dir}/ref.txt"
@@ -48,11 +68,9 @@ class _Colombo2021Model(Model):
 
             with open(host_ref_file, "w") as out_ref:
                 with open(host_cand_file, "w") as out_cand:
-                    for candidate, references in zip(candidates, references_list):
-                        # Write the candidate once per reference
-                        for reference in references:
-                            out_ref.write(reference + "\n")
-                            out_cand.write(candidate + "\n")
+                    for candidate, reference in pairs:
+                        out_ref.write(reference + "\n")
+                        out_cand.write(candidate + "\n")
 
             host_out_file = f"{backend.host_dir}/out.json"
             container_out_file = f"{backend.container_dir}/out.json"
@@ -87,7 +105,7 @@ class _Colombo2021Model(Model):
             )
 
             with open(host_out_file, "r") as f:
-                unrolled_micro_metrics = json.load(f)
+                unrolled_micro_metrics = util.expand_deduplicated(json.load(f), mapping)
 
             # Average over references
             micro_metrics = []
@@ -139,6 +157,10 @@ class InfoLM(_Colombo2021Model):
             options.append(f"--alpha {self.alpha}")
         return " ".join(options)
 
+    @overrides
+    def _uses_idf(self) -> bool:
+        return self.idf
+
 
 @Model.register(f"{MODEL_NAME}-baryscore")
 class BaryScore(_Colombo2021Model):
@@ -168,6 +190,10 @@ class BaryScore(_Colombo2021Model):
             options.append("--idf")
         return " ".join(options)
 
+    @overrides
+    def _uses_idf(self) -> bool:
+        return self.idf
+
 
 @Model.register(f"{MODEL_NAME}-depthscore")
 class DepthScore(_Colombo2021Model):
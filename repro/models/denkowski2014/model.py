@@ -1,8 +1,8 @@
 import logging
-from typing import Dict, List, Tuple, Union
+from typing import ContextManager, Dict, List, Tuple, Union
 
 from repro.common import util
-from repro.common.docker import DockerContainer
+from repro.common.docker import DockerContainer, get_container_pool
 from repro.data.types import MetricsType, TextType
 from repro.models import Model
 from repro.models.denkowski2014 import DEFAULT_IMAGE, MODEL_NAME
@@ -13,11 +13,58 @@ logger = logging.getLogger(__name__)
 @Model.register(f"{MODEL_NAME}-meteor")
 class METEOR(Model):
     def __init__(
-        self, language: str = "en", norm: bool = True, image: str = DEFAULT_IMAGE
+        self,
+        language: str = "en",
+        norm: bool = True,
+        image: str = DEFAULT_IMAGE,
+        persistent: bool = False,
+        idle_timeout: float = None,
+        server: bool = False,
     ):
+        """
+        Parameters
+        ----------
+        language : str, default="en"
+            The language of the texts
+        norm : bool, default=True
+            Indicates whether METEOR should normalize the texts
+        image : str, default=DEFAULT_IMAGE
+            The name of the Docker image
+        persistent : bool, default=False
+            Indicates whether a warm Docker container from the process-wide container pool
+            should be used for each call to `predict_batch` instead of starting a new one
+        idle_timeout : float, default=None
+            The number of seconds the persistent container may be idle before it is stopped
+        server : bool, default=False
+            Indicates METEOR should be kept running in its "-stdio" mode inside of a
+            persistent container so the JVM and the paraphrase tables are only loaded
+            once. The inputs are scored by sending one line per input to the running
+            process. The inputs do not need to have the same number of references in
+            this mode. This implies `persistent=True`
+        """
         self.language = language
         self.norm = norm
         self.image = image
+        self.persistent = persistent
+        self.idle_timeout = idle_timeout
+        self.server = server
+
+    def _get_container(self) -> ContextManager[DockerContainer]:
+        if self.persistent or self.server:
+            return get_container_pool().container(
+                self.image, idle_timeout=self.idle_timeout, owner=self
+            )
+        return DockerContainer(self.image)
+
+    def close(self) -> None:
+        if self.persistent or self.server:
+            get_container_pool().close(owner=self)
+
+    def _get_flags(self) -> str:
+        flags = f"-l {self.language}"
+        if self.norm:
+            flags += " -norm"
+        return flags
 
     @staticmethod
     def _parse_output_file(file_path: str) -> List[Dict[str, float]]:
@@ -44,20 +91,96 @@ class METEOR(Model):
             [{"candidate": candidate, "references": references}], **kwargs
         )[0]
 
-    def predict_batch(
-        self, inputs: List[Dict[str, Union[TextType, List[TextType]]]], **kwargs
-    ) -> Tuple[MetricsType, List[MetricsType]]:
-        logger.info(f"Calculating METEOR for {len(inputs)} inputs")
+    @staticmethod
+    def _clean_stdio_text(text: str) -> str:
+        # "|||" separates the fields of the "-stdio" protocol and each
+        # request must be on one line
+        return " ".join(text.replace("|||", "").split())
 
-        references_list = [inp["references"] for inp in inputs]
-        candidates = [inp["candidate"] for inp in inputs]
+    def _score_with_server(
+        self,
+        backend: DockerContainer,
+        candidates: List[str],
+        references_list: List[List[str]],
+    ) -> List[Dict[str, float]]:
+        command = (
+            f"cd meteor-1.5 && java -jar meteor-1.5.jar - - -stdio {self._get_flags()}"
+        )
+        if len(candidates) == 0:
+            return []
+        process = backend.get_process(command, network_disabled=True)
+
+        # "SCORE" returns the sufficient statistics for a candidate against its
+        # references. One "EVAL" request for all of the statistics returns the
+        # score for each one followed by the aggregate score, which is not used
+        stats = []
+        for candidate, references in zip(candidates, references_list):
+            fields = [self._clean_stdio_text(text) for text in references + [candidate]]
+            process.write_line("SCORE ||| " + " ||| ".join(fields))
+            stats.append(process.read_line().strip())
+
+        process.write_line("EVAL ||| " + " ||| ".join(stats))
+        scores = [{"meteor": float(process.read_line())} for _ in stats]
+        process.read_line()
+        return scores
 
+    def _score_with_command(
+        self,
+        backend: DockerContainer,
+        candidates: List[str],
+        references_list: List[List[str]],
+    ) -> List[Dict[str, float]]:
         # Ensure all have the same number of references
         num_references = len(references_list[0])
         for references in references_list:
             if len(references) != num_references:
                 raise Exception(f"All inputs must have the same number of references")
 
+        host_references_file = f"{backend.host_dir}/references.txt"
+        container_references_file = f"{backend.container_dir}/references.txt"
+
+        host_candidates_file = f"{backend.host_dir}/candidates.txt"
+        container_candidates_file = f"{backend.container_dir}/candidates.txt"
+
+        with open(host_references_file, "w") as out_references:
+            with open(host_candidates_file, "w") as out_candidates:
+                # Each candidate is written once for the whole reference set. If there
+                # are N references, the reference file will be N times longer
+                for candidate, references in zip(candidates, references_list):
+                    out_candidates.write(candidate + "\n")
+                    for reference in references:
+                        out_references.write(reference + "\n")
+
+        host_output_file = f"{backend.host_dir}/output.txt"
+        container_output_file = f"{backend.container_dir}/output.txt"
+
+        commands = ["cd meteor-1.5"]
+        score_command = (
+            f"java -jar meteor-1.5.jar {container_candidates_file} {container_references_file}"
+            f"  -r {num_references}"
+            f"  {self._get_flags()}"
+        )
+        score_command += f" > {container_output_file}"
+        commands.append(score_command)
+
+        command = " && ".join(commands)
+        backend.run_command(
+            command=command,
+            cuda=False,
+            network_disabled=True,
+        )
+
+        # Load the scores
+        return self._parse_output_file(host_output_file)
+
+    def predict_batch(
+        self, inputs: List[Dict[str, Union[TextType, List[TextType]]]], **kwargs
+    ) -> Tuple[MetricsType, List[MetricsType]]:
+        logger.info(f"Calculating METEOR for {len(inputs)} inputs")
+
+        references_list = [inp["references"] for inp in inputs]
+        candidates = [inp["candidate"] for inp in inputs]
+
         # Flatten the inputs
         references_list = [
             [util.flatten(reference) for reference in references]
@@ -65,44 +188,15 @@ class METEOR(Model):
         ]
         candidates = [util.flatten(candidate) for candidate in candidates]
 
-        with DockerContainer(self.image) as backend:
-            host_references_file = f"{backend.host_dir}/references.txt"
-            container_references_file = f"{backend.container_dir}/references.txt"
-
-            host_candidates_file = f"{backend.host_dir}/candidates.txt"
-            container_candidates_file = f"{backend.container_dir}/candidates.txt"
-
-            with open(host_references_file, "w") as out_references:
-                with open(host_candidates_file, "w") as out_candidates:
-                    # Each candidate is written once for the whole reference set. If there
-                    # are N references, the reference file will be N times longer
-                    for candidate, references in zip(candidates, references_list):
-                        out_candidates.write(candidate + "\n")
-                        for reference in references:
-                            out_references.write(reference + "\n")
-
-            host_output_file = f"{backend.host_dir}/output.txt"
-            container_output_file = f"{backend.container_dir}/output.txt"
-
-            commands = ["cd meteor-1.5"]
-            score_command = (
-                f"java -jar meteor-1.5.jar {container_candidates_file} {container_references_file}"
-                f"  -r {num_references}"
-                f"  -l {self.language}"
-            )
-            if self.norm:
-                score_command += " -norm"
-            score_command += f" > {container_output_file}"
-            commands.append(score_command)
-
-            command = " && ".join(commands)
-            backend.run_command(
-                command=command,
-                cuda=False,
-                network_disabled=True,
-            )
-
-            # Load the scores
-            micro_metrics = self._parse_output_file(host_output_file)
-            macro_metrics = util.average_dicts(micro_metrics)
-            return macro_metrics, micro_metrics
+        with self._get_container() as backend:
+            if self.server:
+                micro_metrics = self._score_with_server(
+                    backend, candidates, references_list
+                )
+            else:
+                micro_metrics = self._score_with_command(
+                    backend, candidates, references_list
+                )
+
+        macro_metrics = util.average_dicts(micro_metrics)
+        return macro_metrics, micro_metrics
@@ -1,11 +1,12 @@
 import json
 import logging
-from typing import Any, Dict, List, Tuple, Union
+from typing import Any, ContextManager, Dict, List, Optional, Tuple, Union
 
 from overrides import overrides
 
-from repro.common import util
-from repro.common.docker import DockerContainer
+from repro.common import REPRO_CONFIG, util
+from repro.common.cache import ResultCache, hash_object
+from repro.common.docker import DockerContainer, get_container_pool, get_image_digest
 from repro.common.io import read_jsonl_file
 from repro.data.types import MetricsType, TextType
 from repro.models import Model, QuestionAnsweringModel, QuestionGenerationModel
@@ -25,12 +26,215 @@ class QAEval(Model):
         generation_batch_size: int = 8,
         answering_batch_size: int = 8,
         lerc_batch_size: int = 8,
+        persistent: bool = False,
+        idle_timeout: float = None,
+        server: bool = False,
+        cache_qa_pairs: bool = True,
     ):
+        """
+        Parameters
+        ----------
+        image : str, default=DEFAULT_IMAGE
+            The name of the Docker image
+        device : int, default=0
+            The ID of the GPU to use, -1 if CPU
+        generation_batch_size : int, default=8
+            The batch size for question generation
+        answering_batch_size : int, default=8
+            The batch size for question answering
+        lerc_batch_size : int, default=8
+            The batch size for LERC
+        persistent : bool, default=False
+            Indicates whether a warm Docker container from the process-wide container pool
+            should be used for each call to `predict_batch` instead of starting a new one
+        idle_timeout : float, default=None
+            The number of seconds the persistent container may be idle before it is stopped
+        server : bool, default=False
+            Indicates the generation, answering, and LERC models should be loaded once by a
+            server process inside of a persistent container and reused across calls to
+            `predict_batch`. This implies `persistent=True`
+        cache_qa_pairs : bool, default=True
+            Indicates whether the QA pairs which are generated from the references should be
+            saved to `qa_pairs.sqlite` in the repro `cache_dir`, keyed by the Docker image ID
+            and the reference, so the answer selection and question generation for references
+            which were already seen, for instance when scoring different systems against the
+            same references, is skipped
+        """
         self.image = image
         self.device = device
         self.generation_batch_size = generation_batch_size
         self.answering_batch_size = answering_batch_size
         self.lerc_batch_size = lerc_batch_size
+        self.persistent = persistent
+        self.idle_timeout = idle_timeout
+        self.server = server
+        self.cache_qa_pairs = cache_qa_pairs
+        self.cache = None
+        if cache_qa_pairs:
+            self.cache = ResultCache(f"{REPRO_CONFIG['cache_dir']}/qa_pairs.sqlite")
+
+    def _get_container(self) -> ContextManager[DockerContainer]:
+        if self.persistent or self.server:
+            return get_container_pool().container(
+                self.image,
+                device=self.device,
+                idle_timeout=self.idle_timeout,
+                owner=self,
+            )
+        return DockerContainer(self.image)
+
+    def close(self) -> None:
+        if self.persistent or self.server:
+            get_container_pool().close(owner=self)
+
+    def _get_score_command(self, *args: str) -> Tuple[str, bool]:
+        commands = []
+        cuda = self.device != -1
+        if cuda:
+            predict_device = 0
+            commands.append(f"export CUDA_VISIBLE_DEVICES={self.device}")
+        else:
+            predict_device = -1
+
+        kwargs = {
+            "cuda_device": predict_device,
+            "generation_batch_size": self.generation_batch_size,
+            "answering_batch_size": self.answering_batch_size,
+            "use_lerc": True,
+            "lerc_batch_size": self.lerc_batch_size,
+        }
+        kwargs_str = json.dumps(kwargs)
+        score_command = f"python score.py  --kwargs '{kwargs_str}'"
+        for arg in args:
+            score_command += f"  {arg}"
+        commands.append(score_command)
+
+        command = " && ".join(commands)
+        return command, cuda
+
+    def _score_with_command(
+        self,
+        backend: DockerContainer,
+        candidates: List[TextType],
+        references_list: List[List[TextType]],
+        reference_qa_pairs: Dict[str, List[Dict[str, Any]]],
+    ) -> List[Dict[str, Any]]:
+        host_input_file = f"{backend.host_dir}/input.jsonl"
+        container_input_file = f"{backend.container_dir}/input.jsonl"
+        with open(host_input_file, "w") as out:
+            for candidate, references in zip(candidates, references_list):
+                out.write(
+                    json.dumps(
+                        {
+                            "candidate": candidate,
+                            "references": references,
+                        }
+                    )
+                    + "\n"
+                )
+
+        host_output_file = f"{backend.host_dir}/output.jsonl"
+        container_output_file = f"{backend.container_dir}/output.jsonl"
+
+        args = [
+            f"--input-file {container_input_file}",
+            f"--output-file {container_output_file}",
+        ]
+        if len(reference_qa_pairs) > 0:
+            host_qa_pairs_file = f"{backend.host_dir}/qa_pairs.json"
+            container_qa_pairs_file = f"{backend.container_dir}/qa_pairs.json"
+            with open(host_qa_pairs_file, "w") as out:
+                json.dump(reference_qa_pairs, out)
+            args.append(f"--qa-pairs-file {container_qa_pairs_file}")
+
+        command, cuda = self._get_score_command(*args)
+        backend.run_command(
+            command=command,
+            cuda=cuda,
+            network_disabled=True,
+        )
+        return read_jsonl_file(host_output_file)
+
+    def _score_with_server(
+        self,
+        backend: DockerContainer,
+        candidates: List[TextType],
+        references_list: List[List[TextType]],
+        reference_qa_pairs: Dict[str, List[Dict[str, Any]]],
+    ) -> List[Dict[str, Any]]:
+        command, cuda = self._get_score_command("--server")
+        server = backend.get_process(command, cuda=cuda, network_disabled=True)
+        response = server.request(
+            {
+                "candidates": candidates,
+                "references_list": references_list,
+                "reference_qa_pairs": reference_qa_pairs,
+            }
+        )
+        return response["outputs"]
+
+    def _get_config_key(self) -> Optional[str]:
+        # Returns `None` if the QA pairs cannot be cached because the
+        # image does not exist locally yet
+        image_digest = get_image_digest(self.image)
+        if image_digest is None:
+            return None
+        return hash_object(
+            {"model": f"{MODEL_NAME}-qaeval", "image_digest": image_digest}
+        )
+
+    def _load_qa_pairs(
+        self, references_list: List[List[TextType]]
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        # Loads the QA pairs for the references which are in the cache. The references
+        # are flattened the same way as by the "qaeval" library
+        if self.cache is None:
+            return {}
+        config_key = self._get_config_key()
+        if config_key is None:
+            return {}
+        keys = {}
+        for references in references_list:
+            for reference in references:
+                reference = util.flatten(reference)
+                keys[hash_object([config_key, reference])] = reference
+        cached = self.cache.get_many(keys.keys())
+        logger.info(f"Loaded the QA pairs for {len(cached)} of {len(keys)} references")
+        return {keys[key]: qa_pairs for key, qa_pairs in cached.items()}
+
+    def _save_qa_pairs(
+        self,
+        candidates: List[TextType],
+        references_list: List[List[TextType]],
+        results: List[Dict[str, Any]],
+        reference_qa_pairs: Dict[str, List[Dict[str, Any]]],
+    ) -> None:
+        # The QA pairs for every reference are part of the output for any of its
+        # candidates except for empty candidates, which are not scored
+        if self.cache is None:
+            return
+        # The image may have been pulled by running the metric
+        config_key = self._get_config_key()
+        if config_key is None:
+            return
+        items = {}
+        for candidate, references, result in zip(candidates, references_list, results):
+            if len(util.flatten(candidate).strip()) == 0:
+                continue
+            for reference, qa_pairs in zip(references, result["qa_pairs"]):
+                reference = util.flatten(reference)
+                if reference in reference_qa_pairs:
+                    continue
+                # The question ID depends on the position of the reference in the input
+                items[hash_object([config_key, reference])] = [
+                    {
+                        name: value
+                        for name, value in qa["question"].items()
+                        if name != "question_id"
+                    }
+                    for qa in qa_pairs
+                ]
+        self.cache.put_many(items)
 
     def predict(
         self, candidate: TextType, references: List[TextType], **kwargs
@@ -53,63 +257,26 @@ class QAEval(Model):
         candidates = [inp["candidate"] for inp in inputs]
         references_list = [inp["references"] for inp in inputs]
 
-        with DockerContainer(self.image) as backend:
-            host_input_file = f"{backend.host_dir}/input.jsonl"
-            container_input_file = f"{backend.container_dir}/input.jsonl"
-            with open(host_input_file, "w") as out:
-                for candidate, references in zip(candidates, references_list):
-                    out.write(
-                        json.dumps(
-                            {
-                                "candidate": candidate,
-                                "references": references,
-                            }
-                        )
-                        + "\n"
-                    )
-
-            host_output_file = f"{backend.host_dir}/output.jsonl"
-            container_output_file = f"{backend.container_dir}/output.jsonl"
-
-            commands = []
-            cuda = self.device != -1
-            if cuda:
-                predict_device = 0
-                commands.append(f"export CUDA_VISIBLE_DEVICES={self.device}")
+        reference_qa_pairs = self._load_qa_pairs(references_list)
+        with self._get_container() as backend:
+            if self.server:
+                results = self._score_with_server(
+                    backend, candidates, references_list, reference_qa_pairs
+                )
             else:
-                predict_device = -1
-
-            kwargs = {
-                "cuda_device": predict_device,
-                "generation_batch_size": self.generation_batch_size,
-                "answering_batch_size": self.answering_batch_size,
-                "use_lerc": True,
-                "lerc_batch_size": self.lerc_batch_size,
-            }
-            kwargs_str = json.dumps(kwargs)
-            commands.append(
-                f"python score.py"
-                f"  --input-file {container_input_file}"
-                f"  --kwargs '{kwargs_str}'"
-                f"  --output-file {container_output_file}"
-            )
-
-            command = " && ".join(commands)
-            backend.run_command(
-                command=command,
-                cuda=cuda,
-                network_disabled=True,
-            )
+                results = self._score_with_command(
+                    backend, candidates, references_list, reference_qa_pairs
+                )
+        self._save_qa_pairs(candidates, references_list, results, reference_qa_pairs)
 
-            results = read_jsonl_file(host_output_file)
-            micro_metrics = [result["metrics"] for result in results]
-            macro_metrics = util.average_dicts(micro_metrics)
+        micro_metrics = [result["metrics"] for result in results]
+        macro_metrics = util.average_dicts(micro_metrics)
 
-            if return_qa_pairs:
-                qa_pairs = [result["qa_pairs"] for result in results]
-                return macro_metrics, micro_metrics, qa_pairs
-            else:
-                return macro_metrics, micro_metrics
+        if return_qa_pairs:
+            qa_pairs = [result["qa_pairs"] for result in results]
+            return macro_metrics, micro_metrics, qa_pairs
+        else:
+            return macro_metrics, micro_metrics
 
 
 @Model.register(f"{MODEL_NAME}-question-generation")
@@ -4,6 +4,7 @@ from typing import List
 from repro.common import TemporaryDirectory
 from repro.common.docker import make_volume_map, run_command
 from repro.common.io import write_to_text_file
+from repro.common.sentence_split import SentenceSplitter
 from repro.data.types import DocumentType, SummaryType
 
 
@@ -51,6 +52,15 @@ def sentence_split(image: str, inputs: List[str]) -> List[List[str]]:
         return split
 
 
+def get_sentence_splitter(image: str, **kwargs) -> SentenceSplitter:
+    """
+    Gets a :py:class:`repro.common.sentence_split.SentenceSplitter` which runs
+    :code:`sentence_split()` and caches its output. The kwargs are passed to
+    the splitter's constructor.
+    """
+    return SentenceSplitter(image, sentence_split, "dou2021", **kwargs)
+
+
 def get_oracle_sentences(
     image: str, documents: List[List[str]], references: List[List[str]]
 ) -> List[List[str]]:
@@ -7,8 +7,8 @@ from repro.models.liu2019 import BertSumExt
 from repro.models.dou2021 import DEFAULT_IMAGE, MODEL_NAME
 from repro.models.dou2021.commands import (
     get_oracle_sentences,
+    get_sentence_splitter,
     generate_summaries,
-    sentence_split,
 )
 
 logger = logging.getLogger(__name__)
@@ -17,12 +17,18 @@ logger = logging.getLogger(__name__)
 @Model.register(f"{MODEL_NAME}-oracle-sentence-gsum")
 class OracleSentenceGSumModel(Model):
     def __init__(
-        self, image: str = DEFAULT_IMAGE, device: int = 0, batch_size: int = 16
+        self,
+        image: str = DEFAULT_IMAGE,
+        device: int = 0,
+        batch_size: int = 16,
+        cache_sentences: bool = True,
     ) -> None:
         self.model = "bart_sentence"
         self.image = image
         self.device = device
         self.batch_size = batch_size
+        self.cache_sentences = cache_sentences
+        self.sentence_splitter = get_sentence_splitter(image, cache=cache_sentences)
 
     def predict(
         self,
@@ -63,28 +69,47 @@ class OracleSentenceGSumModel(Model):
         # If the documents and references are pre-sentence split, we will maintain
         # that split. Otherwise, we run sentence splitting
         documents = [inp["document"] for inp in inputs]
-        if any(isinstance(document, str) for document in documents):
-            if any(isinstance(document, list) for document in documents):
+        split_documents = any(isinstance(document, str) for document in documents)
+        if split_documents and any(
+            isinstance(document, list) for document in documents
+        ):
+            logger.warning(
+                "`documents` contains both sentence-split and un-sentence-split documents. "
+                "The sentence-split boundaries will be ignored and sentence splitting will "
+                "be run again."
+            )
+
+        references = []
+        split_references = False
+        if compute_guidance:
+            references = [inp["reference"] for inp in inputs]
+            split_references = any(
+                isinstance(reference, str) for reference in references
+            )
+            if split_references and any(
+                isinstance(reference, list) for reference in references
+            ):
                 logger.warning(
-                    "`documents` contains both sentence-split and un-sentence-split documents. "
+                    "`references` contains both sentence-split and un-sentence-split references. "
                     "The sentence-split boundaries will be ignored and sentence splitting will "
                     "be run again."
                 )
-            tokenized_documents = sentence_split(self.image, documents)
-        else:
-            tokenized_documents = documents
+
+        # The documents and references are split with one call to the sentence splitter
+        to_split = []
+        if split_documents:
+            to_split.extend(documents)
+        if split_references:
+            to_split.extend(references)
+        sentences = self.sentence_splitter.split(to_split)
+
+        tokenized_documents = documents
+        if split_documents:
+            tokenized_documents = sentences[: len(documents)]
+        if split_references:
+            references = sentences[len(sentences) - len(references) :]
 
         if compute_guidance:
-            references = [inp["reference"] for inp in inputs]
-            if any(isinstance(reference, str) for reference in references):
-                # Sentence splitting needs to be run
-                if any(isinstance(reference, list) for reference in references):
-                    logger.warning(
-                        "`references` contains both sentence-split and un-sentence-split references. "
-                        "The sentence-split boundaries will be ignored and sentence splitting will "
-                        "be run again."
-                    )
-                references = sentence_split(self.image, references)
             guidance = get_oracle_sentences(self.image, tokenized_documents, references)
         else:
             guidance = [inp["guidance"] for inp in inputs]
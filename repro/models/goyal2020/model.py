@@ -1,9 +1,9 @@
 import json
 import logging
-from typing import Any, Dict, List, Tuple, Union
+from typing import Any, ContextManager, Dict, List, Tuple, Union
 
 from repro.common import util
-from repro.common.docker import DockerContainer
+from repro.common.docker import DockerContainer, get_container_pool
 from repro.common.io import read_jsonl_file
 from repro.data.types import MetricsType, TextType
 from repro.models import Model
@@ -21,7 +21,10 @@ class DAE(Model):
         image: str = DEFAULT_IMAGE,
         model: str = "dae_w_syn",
         device: int = 0,
-        sleep: int = 1,
+        sleep: int = None,
+        persistent: bool = False,
+        idle_timeout: float = None,
+        server: bool = False,
     ):
         """
         Parameters
@@ -32,13 +35,55 @@ class DAE(Model):
             The name of the pre-trained DAE model to use
         device : int, default=0
             The ID of the GPU to use, -1 if CPU
-        sleep : int, default=1
-            The number of seconds to sleep while the Stanford CoreNLP server initializes
+        sleep : int, default=None
+            Deprecated and ignored. The scoring script now waits until the Stanford
+            CoreNLP server is ready instead of sleeping for a fixed number of seconds
+        persistent : bool, default=False
+            Indicates whether a warm Docker container from the process-wide container pool
+            should be used for each call to `predict_batch` instead of starting a new one
+        idle_timeout : float, default=None
+            The number of seconds the persistent container may be idle before it is stopped
+        server : bool, default=False
+            Indicates the DAE model and the Stanford CoreNLP server should be loaded once
+            by a server process inside of a persistent container and reused across calls
+            to `predict_batch`. This implies `persistent=True`
         """
+        if sleep is not None:
+            logger.warning(
+                f"`sleep` is deprecated and ignored because DAE waits until "
+                f"the CoreNLP server is ready"
+            )
         self.image = image
         self.model = model
         self.device = device
         self.sleep = sleep
+        self.persistent = persistent
+        self.idle_timeout = idle_timeout
+        self.server = server
+
+    def _get_container(self) -> ContextManager[DockerContainer]:
+        if self.persistent or self.server:
+            return get_container_pool().container(
+                self.image,
+                device=self.device,
+                idle_timeout=self.idle_timeout,
+                owner=self,
+            )
+        return DockerContainer(self.image)
+
+    def close(self) -> None:
+        if self.persistent or self.server:
+            get_container_pool().close(owner=self)
+
+    def _get_device_commands(self) -> Tuple[List[str], int, bool]:
+        commands = []
+        cuda = self.device != -1
+        if cuda:
+            score_device = 0
+            commands.append(f"export CUDA_VISIBLE_DEVICES={self.device}")
+        else:
+            score_device = -1
+        return commands, score_device, cuda
 
     def predict(
         self, candidate: TextType, sources: List[TextType], **kwargs
@@ -64,48 +109,65 @@ class DAE(Model):
         candidates = [util.flatten(candidate) for candidate in candidates]
         sources = [util.flatten(source) for source in sources]
 
-        with DockerContainer(self.image) as backend:
-            host_input_file = f"{backend.host_dir}/input.jsonl"
-            container_input_file = f"{backend.container_dir}/input.jsonl"
-            with open(host_input_file, "w") as out:
-                for candidate, source in zip(candidates, sources):
-                    out.write(
-                        json.dumps(
-                            {
-                                "candidate": candidate,
-                                "source": source,
-                            }
-                        )
-                        + "\n"
-                    )
-
-            host_output_file = f"{backend.host_dir}/output.jsonl"
-            container_output_file = f"{backend.container_dir}/output.jsonl"
-
-            commands = []
-            cuda = self.device != -1
-            if cuda:
-                score_device = 0
-                commands.append(f"export CUDA_VISIBLE_DEVICES={self.device}")
+        with self._get_container() as backend:
+            if self.server:
+                micro_metrics = self._score_with_server(backend, candidates, sources)
             else:
-                score_device = -1
-
-            commands.append(
-                f"sh run.sh"
-                f"  {container_input_file}"
-                f"  {container_output_file}"
-                f"  {self.model}"
-                f"  {score_device}"
-                f"  {self.sleep}"
-            )
-
-            command = " && ".join(commands)
-            backend.run_command(
-                command=command,
-                cuda=cuda,
-                network_disabled=False,
-            )
-
-            micro_metrics = read_jsonl_file(host_output_file)
-            macro_metrics = util.average_dicts(micro_metrics)
-            return macro_metrics, micro_metrics
+                micro_metrics = self._score_with_command(backend, candidates, sources)
+
+        macro_metrics = util.average_dicts(micro_metrics)
+        return macro_metrics, micro_metrics
+
+    def _score_with_server(
+        self, backend: DockerContainer, candidates: List[str], sources: List[str]
+    ) -> List[MetricsType]:
+        commands, score_device, cuda = self._get_device_commands()
+        commands.append(
+            f"cd dae-factuality"
+            f" && python score.py"
+            f"  --server"
+            f"  --model_type electra_dae"
+            f"  --input_dir {self.model}"
+            f"  --gpu_device {score_device}"
+        )
+        command = " && ".join(commands)
+        server = backend.get_process(command, cuda=cuda)
+        response = server.request({"candidates": candidates, "sources": sources})
+        return response["outputs"]
+
+    def _score_with_command(
+        self, backend: DockerContainer, candidates: List[str], sources: List[str]
+    ) -> List[MetricsType]:
+        host_input_file = f"{backend.host_dir}/input.jsonl"
+        container_input_file = f"{backend.container_dir}/input.jsonl"
+        with open(host_input_file, "w") as out:
+            for candidate, source in zip(candidates, sources):
+                out.write(
+                    json.dumps(
+                        {
+                            "candidate": candidate,
+                            "source": source,
+                        }
+                    )
+                    + "\n"
+                )
+
+        host_output_file = f"{backend.host_dir}/output.jsonl"
+        container_output_file = f"{backend.container_dir}/output.jsonl"
+
+        commands, score_device, cuda = self._get_device_commands()
+        commands.append(
+            f"sh run.sh"
+            f"  {container_input_file}"
+            f"  {container_output_file}"
+            f"  {self.model}"
+            f"  {score_device}"
+        )
+
+        command = " && ".join(commands)
+        backend.run_command(
+            command=command,
+            cuda=cuda,
+            network_disabled=False,
+        )
+        return read_jsonl_file(host_output_file)
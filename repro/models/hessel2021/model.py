@@ -1,10 +1,9 @@
 import json
 import logging
 import os
-import shutil
 from typing import Dict, List, Optional, Tuple, Union
 
-from repro.common import util
+from repro.common import REPRO_CONFIG, util
 from repro.common.docker import DockerContainer
 from repro.data.types import MetricsType
 from repro.models import Model
@@ -12,12 +11,56 @@ from repro.models.hessel2021 import DEFAULT_IMAGE, MODEL_NAME
 
 logger = logging.getLogger(__name__)
 
+# The path where the embedding store is mounted in the container
+EMBEDDING_STORE_DIR = "/embeddings"
+
 
 @Model.register(f"{MODEL_NAME}-clipscore")
 class CLIPScore(Model):
-    def __init__(self, image: str = DEFAULT_IMAGE, device: int = 0) -> None:
+    def __init__(
+        self,
+        image: str = DEFAULT_IMAGE,
+        device: int = 0,
+        cache_embeddings: bool = False,
+        embeddings_dir: str = None,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        image : str, default=DEFAULT_IMAGE
+            The name of the Docker image
+        device : int, default=0
+            The ID of the GPU to use, -1 if CPU
+        cache_embeddings : bool, default=False
+            Indicates whether the CLIP features of the images and texts should be saved
+            to an on-disk store so that images and references which were already scored
+            (e.g., when scoring many systems' captions for the same images) are not
+            encoded again. The images are keyed by the digest of their contents. The
+            features are stored as float16, which rounds the CPU features slightly.
+        embeddings_dir : str, default=None
+            The directory of the embedding store. Defaults to "embeddings/hessel2021"
+            in the "cache_dir" of the repro config
+        """
         self.image = image
         self.device = device
+        self.cache_embeddings = cache_embeddings
+        self.embeddings_dir = (
+            embeddings_dir or f"{REPRO_CONFIG['cache_dir']}/embeddings/{MODEL_NAME}"
+        )
+
+    @staticmethod
+    def _get_image_mounts(image_files: List[str]) -> Tuple[Dict[str, str], List[str]]:
+        # Each directory which contains an image is mounted read-only instead of
+        # copying the images. Returns the mounts and the images' container paths
+        mounts = {}
+        container_image_files = []
+        for image_file in image_files:
+            image_dir, filename = os.path.split(os.path.abspath(image_file))
+            if image_dir not in mounts:
+                mounts[image_dir] = f"/images/{len(mounts)}"
+            container_image_files.append(f"{mounts[image_dir]}/{filename}")
+        mounts = {host: f"{container}:ro" for host, container in mounts.items()}
+        return mounts, container_image_files
 
     @staticmethod
     def _verify_all_or_no_references(references_list: List[List[str]]) -> bool:
@@ -62,44 +105,25 @@ class CLIPScore(Model):
         # The references are optional. Make sure either all have references or none do
         has_references = self._verify_all_or_no_references(references_list)
 
-        with DockerContainer(self.image) as backend:
-            host_candidate_file = f"{backend.host_dir}/candidates.json"
-            container_candidate_file = f"{backend.container_dir}/candidates.json"
-
-            host_image_dir = f"{backend.host_dir}/images"
-            container_image_dir = f"{backend.container_dir}/images"
-
-            host_references_file = f"{backend.host_dir}/references.json"
-            container_references_file = f"{backend.container_dir}/references.json"
-
-            host_output_file = f"{backend.host_dir}/scores.json"
-            container_output_file = f"{backend.container_dir}/scores.json"
-
-            # Write all of the candidates
-            with open(host_candidate_file, "w") as out:
-                out.write(
-                    json.dumps(
-                        {str(i): candidate for i, candidate in enumerate(candidates)}
-                    )
-                )
-
-            # Copy over all of the images
-            os.makedirs(host_image_dir)
-            for i, image_file in enumerate(image_files):
-                # The extension already includes the "."
-                _, extension = os.path.splitext(image_file)
-                shutil.copy(image_file, f"{host_image_dir}/{i}{extension}")
-
-            if has_references:
-                with open(host_references_file, "w") as out:
-                    out.write(
-                        json.dumps(
-                            {
-                                str(i): references
-                                for i, references in enumerate(references_list)
-                            }
-                        )
-                    )
+        mounts, container_image_files = self._get_image_mounts(image_files)
+        if self.cache_embeddings:
+            mounts[self.embeddings_dir] = EMBEDDING_STORE_DIR
+
+        with DockerContainer(self.image, mounts=mounts) as backend:
+            host_input_file = f"{backend.host_dir}/input.jsonl"
+            container_input_file = f"{backend.container_dir}/input.jsonl"
+
+            host_output_file = f"{backend.host_dir}/output.jsonl"
+            container_output_file = f"{backend.container_dir}/output.jsonl"
+
+            with open(host_input_file, "w") as out:
+                for candidate, image_file, references in zip(
+                    candidates, container_image_files, references_list
+                ):
+                    data = {"candidate": candidate, "image_file": image_file}
+                    if has_references:
+                        data["references"] = references
+                    out.write(json.dumps(data) + "\n")
 
             commands = []
             cuda = self.device != -1
@@ -109,14 +133,12 @@ class CLIPScore(Model):
             commands.append("cd clipscore")
 
             score_command = (
-                f"python clipscore.py "
-                f"  {container_candidate_file} "
-                f"  {container_image_dir} "
-                f"  --save_per_instance {container_output_file}"
-                f"  --compute_other_ref_metrics 0"
+                f"python score.py "
+                f"  --input-file {container_input_file} "
+                f"  --output-file {container_output_file}"
             )
-            if has_references:
-                score_command += f" --references_json {container_references_file}"
+            if self.cache_embeddings:
+                score_command += f" --embedding-store {EMBEDDING_STORE_DIR}"
             commands.append(score_command)
 
             command = " && ".join(commands)
@@ -126,7 +148,9 @@ class CLIPScore(Model):
                 network_disabled=True,
             )
 
-            micro_dict = json.load(open(host_output_file, "r"))
-            micro_metrics = [micro_dict[str(i)] for i in range(len(candidates))]
+            micro_metrics = []
+            with open(host_output_file, "r") as f:
+                for line in f:
+                    micro_metrics.append(json.loads(line))
             macro_metrics = util.average_dicts(micro_metrics)
             return macro_metrics, micro_metrics
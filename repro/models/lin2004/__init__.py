@@ -1,6 +1,6 @@
 import os
 
-VERSION = "1.0"
+VERSION = "1.1"
 MODEL_NAME = os.path.basename(os.path.dirname(__file__))
 DOCKERHUB_REPO = f"danieldeutsch/{MODEL_NAME}"
 DEFAULT_IMAGE = f"{DOCKERHUB_REPO}:{VERSION}"
@@ -5,6 +5,7 @@ from typing import List
 from repro.common import TemporaryDirectory
 from repro.common.docker import make_volume_map, run_command
 from repro.common.io import read_jsonl_file, write_to_jsonl_file
+from repro.common.sentence_split import SentenceSplitter
 
 logger = logging.getLogger(__name__)
 
@@ -46,3 +47,18 @@ def sentence_split(image: str, inputs: List[str]) -> List[List[str]]:
         outputs = read_jsonl_file(host_output_file)
         sentences = [output["sentences"] for output in outputs]
         return sentences
+
+
+def get_sentence_splitter(image: str, **kwargs) -> SentenceSplitter:
+    """
+    Gets a :py:class:`repro.common.sentence_split.SentenceSplitter` which runs
+    :code:`sentence_split()` and caches its output. The kwargs are passed to
+    the splitter's constructor.
+    """
+    return SentenceSplitter(
+        image,
+        sentence_split,
+        "lin2004",
+        server_command="python sentence_split.py --server",
+        **kwargs,
+    )
@@ -1,20 +1,78 @@
 import logging
+import os
 from collections import defaultdict
 from typing import Any, Dict, List, Tuple, Union
 
+import numpy as np
+
 from repro.common import TemporaryDirectory, util
 from repro.common.docker import make_volume_map, run_command
 from repro.common.io import write_to_text_file
 from repro.data.types import MetricsType, TextType
 from repro.models import Model
 from repro.models.lin2004 import DEFAULT_IMAGE, MODEL_NAME
-from repro.models.lin2004.commands import sentence_split
+from repro.models.lin2004.commands import get_sentence_splitter
+from repro.models.lin2004.python_rouge import (
+    PythonRouge,
+    compute_scores,
+    load_resources,
+)
 
 logger = logging.getLogger(__name__)
 
 
 @Model.register(f"{MODEL_NAME}-rouge")
 class ROUGE(Model):
+    """
+    Parameters
+    ----------
+    image : str, default=DEFAULT_IMAGE
+        The name of the Docker image
+    ngram_order : int, default=4
+        The maximum n-gram length
+    porter_stemmer : bool, default=True
+        Whether or not to stem the tokens
+    remove_stopwords : bool, default=False
+        Whether or not to remove the stopwords
+    sentence_split : bool, default=True
+        Whether or not to sentence split texts which are strings
+    calculate_su4 : bool, default=True
+        Whether or not to calculate ROUGE-SU4
+    backend : str, default="perl"
+        Either "perl" to run the original ROUGE-1.5.5 script in Docker or "python"
+        to compute the same scores in-process with
+        :class:`~repro.models.lin2004.python_rouge.PythonRouge`, which is much faster
+        because it avoids writing every text to disk and starting a container.
+        The "python" backend still uses the Docker image once to load ROUGE's
+        stopwords and stemming exceptions (and to sentence split, if necessary).
+    confidence_intervals : bool, default=False
+        Whether or not to compute bootstrap confidence intervals for the macro
+        scores. If :code:`True`, every metric in the macro results will additionally
+        have "recall_ci", "precision_ci", and "f1_ci" entries with the "lower" and
+        "upper" bounds of the interval. The intervals are computed over the inputs
+        to :code:`predict_batch` by resampling the per-input scores like ROUGE-1.5.5
+        does. (ROUGE-1.5.5's own intervals are not used because it computes them per
+        peer ID, which does not correspond to the inputs after they are grouped by
+        their references.)
+    num_bootstrap_samples : int, default=1000
+        The number of bootstrap samples used to compute the confidence intervals
+    confidence_level : float, default=95
+        The confidence level of the intervals, in percent
+    num_shards : int, default=1
+        The number of ROUGE-1.5.5 processes which are run in parallel (in one
+        container) by the "perl" backend. The inputs are divided evenly among them.
+    cache_sentences : bool, default=True
+        Whether or not to cache the output of sentence splitting on disk so texts
+        which were already split, for instance in a previous run, are not split again
+    persistent : bool, default=False
+        Indicates whether the sentence splitter should run as a server in a warm Docker
+        container from the process-wide container pool instead of in a new container
+        for every call to `predict_batch`
+    idle_timeout : float, default=None
+        The number of seconds the sentence splitter's persistent container may be
+        idle before it is stopped
+    """
+
     def __init__(
         self,
         image: str = DEFAULT_IMAGE,
@@ -23,43 +81,79 @@ class ROUGE(Model):
         remove_stopwords: bool = False,
         sentence_split: bool = True,
         calculate_su4: bool = True,
+        backend: str = "perl",
+        confidence_intervals: bool = False,
+        num_bootstrap_samples: int = 1000,
+        confidence_level: float = 95,
+        num_shards: int = 1,
+        cache_sentences: bool = True,
+        persistent: bool = False,
+        idle_timeout: float = None,
     ):
+        if backend not in ["perl", "python"]:
+            raise ValueError(f"Unknown ROUGE backend: {backend}")
+        if num_bootstrap_samples <= 0:
+            raise ValueError(f"`num_bootstrap_samples` must be positive")
+        if not 0 < confidence_level < 100:
+            raise ValueError(f"`confidence_level` must be between 0 and 100")
+        if num_shards <= 0:
+            raise ValueError(f"`num_shards` must be positive")
         self.image = image
         self.ngram_order = ngram_order
         self.porter_stemmer = porter_stemmer
         self.remove_stopwords = remove_stopwords
         self.sentence_split = sentence_split
         self.calculate_su4 = calculate_su4
+        self.backend = backend
+        self.confidence_intervals = confidence_intervals
+        self.num_bootstrap_samples = num_bootstrap_samples
+        self.confidence_level = confidence_level
+        self.num_shards = num_shards
+        self.cache_sentences = cache_sentences
+        self.persistent = persistent
+        self.idle_timeout = idle_timeout
+        self.sentence_splitter = get_sentence_splitter(
+            image,
+            persistent=persistent,
+            idle_timeout=idle_timeout,
+            cache=cache_sentences,
+        )
+        self._scorer = None
+
+    def close(self) -> None:
+        self.sentence_splitter.close()
 
-    def _maybe_sentence_split(self, texts: List[TextType]) -> List[List[str]]:
+    @staticmethod
+    def _requires_sentence_split(texts: List[TextType]) -> bool:
         if any(isinstance(text, str) for text in texts):
             if not all(isinstance(text, str) for text in texts):
                 raise Exception(
                     f"Input texts are mixed types between strings and lists of strings. "
                     f"All must be of the same type"
                 )
-            return sentence_split(self.image, texts)
-        else:
-            return texts
-
-    def _maybe_sentence_split_texts_list(
-        self, texts_list: List[List[TextType]]
-    ) -> List[List[List[str]]]:
-        # Flatten the texts into a single list so we can call `_maybe_sentence_split`, then
-        # rearrange the output to be parallel to `texts_list`
-        flat_texts = []
-        for texts in texts_list:
-            flat_texts.extend(texts)
-
-        split_texts = self._maybe_sentence_split(flat_texts)
-        split_texts_list = []
-        index = 0
-        for texts in texts_list:
-            split_texts_list.append([])
-            for _ in texts:
-                split_texts_list[-1].append(split_texts[index])
-                index += 1
-        return split_texts_list
+            return True
+        return False
+
+    def _maybe_sentence_split_texts_lists(
+        self, *texts_lists: List[List[TextType]]
+    ) -> Tuple[List[List[List[str]]], ...]:
+        # The texts from all of the lists which are not already sentence split are
+        # split with one call to the sentence splitter. Then the output is rearranged
+        # to be parallel to each of the `texts_lists`
+        to_split = []
+        for texts_list in texts_lists:
+            flat_texts = [text for texts in texts_list for text in texts]
+            if self._requires_sentence_split(flat_texts):
+                to_split.extend(flat_texts)
+
+        sentences = dict(zip(to_split, self.sentence_splitter.split(to_split)))
+        return tuple(
+            [
+                [sentences[text] if isinstance(text, str) else text for text in texts]
+                for texts in texts_list
+            ]
+            for texts_list in texts_lists
+        )
 
     @staticmethod
     def _write_to_text_file(text: Union[str, List[str]], file_path: str) -> None:
@@ -73,12 +167,17 @@ class ROUGE(Model):
         candidate_filenames_list: List[List[str]],
         reference_filenames_list: List[List[str]],
         file_path: str,
+        group_indices: List[int] = None,
     ) -> None:
+        # Only the groups in `group_indices` are written to the file, if provided
+        if group_indices is None:
+            group_indices = list(range(len(candidate_filenames_list)))
+
         with open(file_path, "w") as out:
             out.write(f'<ROUGE_EVAL version="1.0">\n')
-            for i, (candidate_filenames, reference_filenames) in enumerate(
-                zip(candidate_filenames_list, reference_filenames_list)
-            ):
+            for i in group_indices:
+                candidate_filenames = candidate_filenames_list[i]
+                reference_filenames = reference_filenames_list[i]
                 out.write(f'<EVAL ID="{i + 1}">\n')
                 out.write(f'<INPUT-FORMAT TYPE="SPL"></INPUT-FORMAT>\n')
                 out.write(f"<PEER-ROOT>/</PEER-ROOT>\n")
@@ -101,15 +200,17 @@ class ROUGE(Model):
     @staticmethod
     def _parse_individual_line(
         columns: List[str],
-    ) -> Tuple[int, int, float, float, float]:
+    ) -> Tuple[int, int, int, int, int]:
+        # With "-t 2", ROUGE outputs the total number of units in the references
+        # and the candidate and the number of hits instead of the scores
         assert len(columns) == 7
         period = columns[3].index(".")
         group_index = int(columns[3][:period]) - 1
         candidate_index = int(columns[3][period + 1 :]) - 1
-        recall = float(columns[4][2:]) * 100
-        precision = float(columns[5][2:]) * 100
-        f1 = float(columns[6][2:]) * 100
-        return group_index, candidate_index, recall, precision, f1
+        reference_count = int(columns[4][2:])
+        candidate_count = int(columns[5][2:])
+        hit = int(columns[6][2:])
+        return group_index, candidate_index, reference_count, candidate_count, hit
 
     @staticmethod
     def _parse_stdout(stdout: str) -> Dict[int, Dict[int, Dict]]:
@@ -128,53 +229,87 @@ class ROUGE(Model):
                 (
                     group_index,
                     candidate_index,
-                    recall,
-                    precision,
-                    f1,
+                    reference_count,
+                    candidate_count,
+                    hit,
                 ) = ROUGE._parse_individual_line(columns)
-                metrics_dict[group_index][candidate_index][rouge_metric] = {
-                    "recall": recall,
-                    "precision": precision,
-                    "f1": f1,
-                }
+                metrics_dict[group_index][candidate_index][
+                    rouge_metric
+                ] = compute_scores(hit, reference_count, candidate_count)
         return metrics_dict
 
-    def predict(
-        self,
-        candidate: TextType,
-        references: List[TextType],
-        **kwargs,
-    ) -> MetricsType:
-        return self.predict_batch(
-            [{"candidate": candidate, "references": references}], **kwargs
-        )[0]
+    def _compute_confidence_intervals(
+        self, micro_metrics: List[MetricsType]
+    ) -> Dict[str, Dict[str, Dict[str, float]]]:
+        # Like ROUGE-1.5.5, each sample is drawn with its own seed so the intervals are
+        # deterministic, and the bounds are interpolated between the sorted sample means
+        keys = list(util.flatten_nested_dict(micro_metrics[0]).keys())
+        values = np.array(
+            [
+                [util.flatten_nested_dict(metrics)[key] for key in keys]
+                for metrics in micro_metrics
+            ]
+        )
+        num_inputs = len(micro_metrics)
+        num_samples = self.num_bootstrap_samples
 
-    def predict_batch(
-        self, inputs: List[Dict[str, Union[TextType, List[TextType]]]], **kwargs
-    ) -> Tuple[MetricsType, List[MetricsType]]:
-        logger.info(f"Calculating ROUGE for {len(inputs)} inputs")
+        means = np.empty((num_samples, len(keys)))
+        for i in range(num_samples):
+            indices = np.random.RandomState(i).randint(0, num_inputs, num_inputs)
+            counts = np.bincount(indices, minlength=num_inputs)
+            means[i] = counts @ values / num_inputs
+        means.sort(axis=0)
 
-        candidates = [inp["candidate"] for inp in inputs]
-        references_list = [inp["references"] for inp in inputs]
+        def _get_percentile(position: float) -> np.ndarray:
+            index = int(position)
+            next_index = min(index + 1, num_samples - 1)
+            ratio = position - index
+            return means[index] + (means[next_index] - means[index]) * ratio
 
-        # ROUGE can be quite slow, so we deduplicate processing by grouping all of
-        # the sources by identical targets. There could be duplicate references if you are scoring multiple
-        # systems outputs at once. We then process the data grouped, and ungroup it at the end
-        # so the output scores are parallel to the inputs.
-        (
-            grouped_candidates_list,
-            grouped_references_list,
-            group_mapping,
-        ) = util.group_by_references(candidates, references_list)
+        delta = num_samples * ((100 - self.confidence_level) / 2) / 100
+        lower = _get_percentile(delta)
+        upper = _get_percentile(max(num_samples - delta - 1, 0))
 
-        if self.sentence_split:
-            grouped_candidates_list = self._maybe_sentence_split_texts_list(
-                grouped_candidates_list
-            )
-            grouped_references_list = self._maybe_sentence_split_texts_list(
-                grouped_references_list
+        intervals = defaultdict(dict)
+        for (metric, stat), low, high in zip(keys, lower, upper):
+            intervals[metric][f"{stat}_ci"] = {
+                "lower": low.item(),
+                "upper": high.item(),
+            }
+        return intervals
+
+    def _get_scorer(self) -> PythonRouge:
+        if self._scorer is None:
+            stopwords, exceptions = load_resources(self.image)
+            self._scorer = PythonRouge(
+                stopwords,
+                exceptions,
+                ngram_order=self.ngram_order,
+                porter_stemmer=self.porter_stemmer,
+                remove_stopwords=self.remove_stopwords,
+                calculate_su4=self.calculate_su4,
             )
+        return self._scorer
+
+    def _run_python(
+        self,
+        grouped_candidates_list: List[List[TextType]],
+        grouped_references_list: List[List[TextType]],
+    ) -> Dict[int, Dict[int, Dict]]:
+        scorer = self._get_scorer()
+        metrics_dict = defaultdict(dict)
+        for i, (candidates, references) in enumerate(
+            zip(grouped_candidates_list, grouped_references_list)
+        ):
+            for j, candidate in enumerate(candidates):
+                metrics_dict[i][j] = scorer.score(candidate, references)
+        return metrics_dict
 
+    def _run_perl(
+        self,
+        grouped_candidates_list: List[List[TextType]],
+        grouped_references_list: List[List[TextType]],
+    ) -> Dict[int, Dict[int, Dict]]:
         # The ROUGE config file requires pointing to the candidate and reference filenames
         candidate_filenames_list = []
         reference_filenames_list = []
@@ -184,6 +319,7 @@ class ROUGE(Model):
             host_output_dir = f"{temp}/output"
             volume_map = make_volume_map(host_input_dir, host_output_dir)
             container_input_dir = volume_map[host_input_dir]
+            container_output_dir = volume_map[host_output_dir]
 
             # Serialize all of the texts to disk
             for i, (candidates, references) in enumerate(
@@ -212,34 +348,50 @@ class ROUGE(Model):
                     )
                 reference_filenames_list.append(reference_filenames)
 
-            # Save the config file
-            host_config_file = f"{host_input_dir}/config.xml"
-            container_config_file = f"{container_input_dir}/config.xml"
-            self._write_config_file(
-                candidate_filenames_list, reference_filenames_list, host_config_file
-            )
+            # ROUGE is single-threaded, so the groups are divided into shards which
+            # are scored by separate ROUGE processes in parallel. Each shard keeps the
+            # original EVAL IDs so the outputs can be concatenated
+            num_groups = len(grouped_candidates_list)
+            num_shards = max(min(self.num_shards, num_groups), 1)
 
-            # Run the command
-            command = (
+            # "-t 2" outputs the raw counts, which we convert to the same scores
+            # that "-t 0" outputs. Unlike "-t 0", it does not run ROUGE's bootstrap
+            # resampling, which we do not use and is slow
+            base_command = (
                 f"perl ROUGE-1.5.5/ROUGE-1.5.5.pl"
                 f"  -e ROUGE-1.5.5/data"
                 f"  -n {self.ngram_order}"
                 f"  -a"
-                f"  -c 95"
-                f"  -r 1000"
                 f"  -p 0.5"
-                f"  -t 0"
+                f"  -t 2"
                 f"  -d"
             )
             if self.porter_stemmer:
-                command += " -m"
+                base_command += " -m"
             if self.remove_stopwords:
-                command += " -s"
+                base_command += " -s"
             if self.calculate_su4:
-                command += " -2 4 -u"
-            command += f" {container_config_file}"
+                base_command += " -2 4 -u"
 
-            stdout = run_command(
+            commands = []
+            for shard in range(num_shards):
+                host_config_file = f"{host_input_dir}/config.{shard}.xml"
+                container_config_file = f"{container_input_dir}/config.{shard}.xml"
+                self._write_config_file(
+                    candidate_filenames_list,
+                    reference_filenames_list,
+                    host_config_file,
+                    group_indices=list(range(shard, num_groups, num_shards)),
+                )
+                commands.append(
+                    f"{base_command} {container_config_file}"
+                    f" > {container_output_dir}/output.{shard}.txt"
+                )
+
+            # Run all of the shards in the background and wait for them to finish
+            command = " & ".join(commands) + " & wait"
+            os.makedirs(host_output_dir)
+            run_command(
                 self.image,
                 command,
                 volume_map=volume_map,
@@ -248,7 +400,67 @@ class ROUGE(Model):
                 silent=True,
             )
 
+            stdout = ""
+            for shard in range(num_shards):
+                with open(f"{host_output_dir}/output.{shard}.txt", "r") as f:
+                    stdout += f.read()
+
             metrics_dict = self._parse_stdout(stdout)
-            micro_metrics = util.ungroup_values(metrics_dict, group_mapping)
-            macro_metrics = util.average_dicts(micro_metrics)
-            return macro_metrics, micro_metrics
+            if len(metrics_dict) != num_groups:
+                raise Exception(
+                    f"ROUGE only output scores for {len(metrics_dict)} of {num_groups} groups"
+                )
+            return metrics_dict
+
+    def predict(
+        self,
+        candidate: TextType,
+        references: List[TextType],
+        **kwargs,
+    ) -> MetricsType:
+        return self.predict_batch(
+            [{"candidate": candidate, "references": references}], **kwargs
+        )[0]
+
+    def predict_batch(
+        self, inputs: List[Dict[str, Union[TextType, List[TextType]]]], **kwargs
+    ) -> Tuple[MetricsType, List[MetricsType]]:
+        logger.info(f"Calculating ROUGE for {len(inputs)} inputs")
+
+        candidates = [inp["candidate"] for inp in inputs]
+        references_list = [inp["references"] for inp in inputs]
+
+        # ROUGE can be quite slow, so we deduplicate processing by grouping all of
+        # the sources by identical targets. There could be duplicate references if you are scoring multiple
+        # systems outputs at once. We then process the data grouped, and ungroup it at the end
+        # so the output scores are parallel to the inputs.
+        (
+            grouped_candidates_list,
+            grouped_references_list,
+            group_mapping,
+        ) = util.group_by_references(candidates, references_list)
+
+        if self.sentence_split:
+            (
+                grouped_candidates_list,
+                grouped_references_list,
+            ) = self._maybe_sentence_split_texts_lists(
+                grouped_candidates_list, grouped_references_list
+            )
+
+        if self.backend == "python":
+            metrics_dict = self._run_python(
+                grouped_candidates_list, grouped_references_list
+            )
+        else:
+            metrics_dict = self._run_perl(
+                grouped_candidates_list, grouped_references_list
+            )
+
+        micro_metrics = util.ungroup_values(metrics_dict, group_mapping)
+        macro_metrics = util.average_dicts(micro_metrics)
+        if self.confidence_intervals and len(micro_metrics) > 0:
+            intervals = self._compute_confidence_intervals(micro_metrics)
+            for metric, stats in intervals.items():
+                macro_metrics[metric].update(stats)
+        return macro_metrics, micro_metrics
@@ -0,0 +1,439 @@
+"""
+A native Python reimplementation of the scoring in ROUGE-1.5.5.pl for the options which
+are used by :class:`~repro.models.lin2004.ROUGE`. The scores are computed exactly the
+same way as the Perl script, including its tokenization, its modified Porter stemmer,
+its WordNet-based exceptions to stemming, and its rounding of the intermediate
+scores, so the two backends produce identical output.
+
+The stopword list and the WordNet exceptions database are read once from the
+ROUGE Docker image and then cached on disk, keyed by the image's digest.
+"""
+import json
+import logging
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+from repro.common import REPRO_CONFIG, util
+from repro.common.docker import get_image_digest, run_command
+from repro.data.types import MetricsType, TextType
+
+logger = logging.getLogger(__name__)
+
+# The regular expressions used by the Porter stemmer. See the `stem` subroutine in
+# ROUGE-1.5.5.pl, which our implementation follows line-for-line
+_c = "[^aeiou]"  # consonant
+_v = "[aeiouy]"  # vowel
+_C = _c + "[^aeiouy]*"  # consonant sequence
+_V = _v + "[aeiou]*"  # vowel sequence
+
+_MGR0 = re.compile("^(" + _C + ")?" + _V + _C)  # [C]VC... is m>0
+_MEQ1 = re.compile("^(" + _C + ")?" + _V + _C + "(" + _V + ")?$")  # [C]VC[V] is m=1
+_MGR1 = re.compile("^(" + _C + ")?" + _V + _C + _V + _C)  # [C]VCVC... is m>1
+_S_V = re.compile("^(" + _C + ")?" + _v)  # vowel in stem
+_CVC = re.compile("^" + _C + _v + "[^aeiouwxy]$")
+
+_STEP2_SUFFIXES = {
+    "ational": "ate",
+    "tional": "tion",
+    "enci": "ence",
+    "anci": "ance",
+    "izer": "ize",
+    "bli": "ble",
+    "alli": "al",
+    "entli": "ent",
+    "eli": "e",
+    "ousli": "ous",
+    "ization": "ize",
+    "ation": "ate",
+    "ator": "ate",
+    "alism": "al",
+    "iveness": "ive",
+    "fulness": "ful",
+    "ousness": "ous",
+    "aliti": "al",
+    "iviti": "ive",
+    "biliti": "ble",
+    "logi": "log",
+}
+_STEP3_SUFFIXES = {
+    "icate": "ic",
+    "ative": "",
+    "alize": "al",
+    "iciti": "ic",
+    "ical": "ic",
+    "ful": "",
+    "ness": "",
+}
+_STEP2 = re.compile("(" + "|".join(_STEP2_SUFFIXES) + ")$")
+_STEP3 = re.compile("(" + "|".join(_STEP3_SUFFIXES) + ")$")
+_STEP4 = re.compile(
+    "(al|ance|ence|er|ic|able|ible|ant|ement|ou|ism|ate|iti|ous|ive|ize)$"
+)
+
+
+def stem(word: str) -> str:
+    """
+    Stems a lowercased word with the version of the Porter stemmer which is
+    included in ROUGE-1.5.5, which slightly differs from the original algorithm
+    in step 4.
+    """
+    if len(word) < 3:
+        return word
+
+    first = word[0]
+    if first == "y":
+        word = "Y" + word[1:]
+
+    # Step 1a
+    match = re.search("(ss|i)es$", word) or re.search("([^s])s$", word)
+    if match:
+        word = word[: match.start()] + match.group(1)
+
+    # Step 1b
+    match = re.search("eed$", word)
+    if match:
+        if _MGR0.search(word[: match.start()]):
+            word = word[:-1]
+    else:
+        match = re.search("(ed|ing)$", word)
+        if match and _S_V.search(word[: match.start()]):
+            word = word[: match.start()]
+            if re.search("(at|bl|iz)$", word):
+                word += "e"
+            elif re.search(r"([^aeiouylsz])\1$", word):
+                word = word[:-1]
+            elif _CVC.search(word):
+                word += "e"
+
+    # Step 1c
+    if word.endswith("y") and _S_V.search(word[:-1]):
+        word = word[:-1] + "i"
+
+    # Step 2
+    match = _STEP2.search(word)
+    if match and _MGR0.search(word[: match.start()]):
+        word = word[: match.start()] + _STEP2_SUFFIXES[match.group(1)]
+
+    # Step 3
+    match = _STEP3.search(word)
+    if match and _MGR0.search(word[: match.start()]):
+        word = word[: match.start()] + _STEP3_SUFFIXES[match.group(1)]
+
+    # Step 4. ROUGE checks each of these suffixes in turn instead of only
+    # the longest matching suffix
+    match = _STEP4.search(word)
+    if match and _MGR1.search(word[: match.start()]):
+        word = word[: match.start()]
+    if word.endswith("ment") and _MGR1.search(word[:-4]):
+        word = word[:-4]
+    if word.endswith("ent"):
+        if _MGR1.search(word[:-3]):
+            word = word[:-3]
+    else:
+        match = re.search("(s|t)(ion)$", word)
+        if match and _MGR1.search(word[: match.start()] + match.group(1)):
+            word = word[: match.start()] + match.group(1)
+
+    # Step 5
+    if word.endswith("e"):
+        prefix = word[:-1]
+        if _MGR1.search(prefix) or (_MEQ1.search(prefix) and not _CVC.search(prefix)):
+            word = prefix
+    if word.endswith("ll") and _MGR1.search(word):
+        word = word[:-1]
+
+    if first == "y":
+        word = "y" + word[1:]
+    return word
+
+
+def _clean(text: str) -> str:
+    # Only ASCII letters and digits are kept, so `lower()` is safe to use here
+    text = text.replace("-", " - ")
+    text = re.sub(r"[^A-Za-z0-9\-]", " ", text)
+    return " ".join(text.split()).lower()
+
+
+def compute_scores(hit: int, reference_count: int, candidate_count: int) -> Dict:
+    """
+    Computes the recall, precision, and F1 (multiplied by 100) from the number of
+    matching units and the total number of units in the references and the candidate.
+    Like ROUGE-1.5.5, the precision and recall are rounded to 5 decimal places before
+    the F1 is computed.
+    """
+    recall = float("%7.5f" % (hit / reference_count if reference_count else 0))
+    precision = float("%7.5f" % (hit / candidate_count if candidate_count else 0))
+    if 0.5 * precision + 0.5 * recall > 0:
+        f1 = float("%7.5f" % ((precision * recall) / (0.5 * precision + 0.5 * recall)))
+    else:
+        f1 = 0.0
+    return {"recall": recall * 100, "precision": precision * 100, "f1": f1 * 100}
+
+
+def _get_lines(text: TextType) -> List[str]:
+    # The text is written to a file with one sentence per line, and ROUGE
+    # ignores the empty lines
+    lines = util.flatten(text, separator="\n").split("\n")
+    return [line for line in lines if len(line) > 0]
+
+
+class PythonRouge(object):
+    """
+    Computes ROUGE with the same options as :code:`ROUGE-1.5.5.pl -a -p 0.5 -t 0`
+    ("-m", "-s", and "-2 4 -u" are controlled by the parameters).
+
+    Parameters
+    ----------
+    stopwords : Set[str]
+        The stopwords which are removed if :code:`remove_stopwords` is :code:`True`
+    exceptions : Dict[str, str]
+        The WordNet exceptions to stemming
+    ngram_order : int, default=4
+        The maximum n-gram length
+    porter_stemmer : bool, default=True
+        Whether or not to stem the tokens
+    remove_stopwords : bool, default=False
+        Whether or not to remove the stopwords
+    calculate_su4 : bool, default=True
+        Whether or not to calculate ROUGE-SU4
+    """
+
+    def __init__(
+        self,
+        stopwords: Set[str],
+        exceptions: Dict[str, str],
+        ngram_order: int = 4,
+        porter_stemmer: bool = True,
+        remove_stopwords: bool = False,
+        calculate_su4: bool = True,
+    ) -> None:
+        self.stopwords = stopwords
+        self.exceptions = exceptions
+        self.ngram_order = ngram_order
+        self.porter_stemmer = porter_stemmer
+        self.remove_stopwords = remove_stopwords
+        self.calculate_su4 = calculate_su4
+        self._stem_cache = {}
+
+    def _stem(self, token: str) -> str:
+        if token not in self._stem_cache:
+            if token in self.exceptions:
+                self._stem_cache[token] = self.exceptions[token]
+            else:
+                self._stem_cache[token] = stem(token)
+        return self._stem_cache[token]
+
+    def tokenize(self, text: str) -> List[str]:
+        tokens = []
+        for token in _clean(text).split():
+            if self.remove_stopwords and token in self.stopwords:
+                continue
+            if not re.match(r"[a-z0-9\$]", token):
+                continue
+            if self.porter_stemmer and len(token) > 3:
+                token = self._stem(token)
+            tokens.append(token)
+        return tokens
+
+    @staticmethod
+    def _get_ngrams(tokens: List[str], n: int) -> Counter:
+        return Counter(tuple(tokens[i : i + n]) for i in range(len(tokens) - n + 1))
+
+    @staticmethod
+    def _get_skip_bigrams(tokens: List[str], skip_distance: int = 4) -> Counter:
+        # Equivalent to "-2 4 -u". ROUGE does not count the unigram for the
+        # last token, so we do not either
+        counts = Counter()
+        for i in range(len(tokens) - 1):
+            counts[(tokens[i],)] += 1
+            for j in range(i + 1, min(len(tokens), i + skip_distance + 2)):
+                counts[(tokens[i], tokens[j])] += 1
+        return counts
+
+    @staticmethod
+    def _count_hits(reference_counts: Counter, candidate_counts: Counter) -> int:
+        return sum(
+            min(count, candidate_counts[key])
+            for key, count in reference_counts.items()
+            if key in candidate_counts
+        )
+
+    @staticmethod
+    def _mark_lcs(
+        reference: List[str],
+        candidate: List[str],
+        candidate_vocab: Set[str],
+        hit_mask: Set[int],
+    ) -> None:
+        # Marks the positions in `reference` which are part of the LCS, breaking
+        # ties the same way as ROUGE. The rows for reference tokens which are not in
+        # the candidate are identical to the previous row and are always skipped
+        # when tracing back the LCS, so they do not need to be computed
+        rows = [i for i, token in enumerate(reference) if token in candidate_vocab]
+        if len(rows) == 0:
+            return
+
+        n = len(candidate)
+        table = [[0] * (n + 1)]
+        for i in rows:
+            token = reference[i]
+            previous = table[-1]
+            current = [0] * (n + 1)
+            for j in range(n):
+                if candidate[j] == token:
+                    current[j + 1] = previous[j] + 1
+                else:
+                    up, left = previous[j + 1], current[j]
+                    current[j + 1] = up if up >= left else left
+            table.append(current)
+
+        k, j = len(rows), n
+        while k != 0 and j != 0:
+            i = rows[k - 1]
+            if reference[i] == candidate[j - 1]:
+                k -= 1
+                j -= 1
+                hit_mask.add(i)
+            elif table[k - 1][j] >= table[k][j - 1]:
+                k -= 1
+            else:
+                j -= 1
+
+    def score(self, candidate: TextType, references: List[TextType]) -> MetricsType:
+        candidate_sentences = [self.tokenize(line) for line in _get_lines(candidate)]
+        candidate_tokens = [token for tokens in candidate_sentences for token in tokens]
+        references_sentences = [
+            [self.tokenize(line) for line in _get_lines(reference)]
+            for reference in references
+        ]
+        references_tokens = [
+            [token for tokens in sentences for token in tokens]
+            for sentences in references_sentences
+        ]
+
+        metrics = {}
+        for n in range(1, self.ngram_order + 1):
+            candidate_counts = self._get_ngrams(candidate_tokens, n)
+            hit, reference_count, candidate_count = 0, 0, 0
+            for reference_tokens in references_tokens:
+                reference_counts = self._get_ngrams(reference_tokens, n)
+                hit += self._count_hits(reference_counts, candidate_counts)
+                reference_count += sum(reference_counts.values())
+                candidate_count += sum(candidate_counts.values())
+            metrics[f"rouge-{n}"] = compute_scores(
+                hit, reference_count, candidate_count
+            )
+
+        # The LCS hits are clipped by the unigram counts so that ROUGE-L is never
+        # larger than ROUGE-1
+        candidate_unigrams = Counter(candidate_tokens)
+        candidate_vocabs = [set(sentence) for sentence in candidate_sentences]
+        hit, reference_count, candidate_count = 0, 0, 0
+        for reference_sentences, reference_tokens in zip(
+            references_sentences, references_tokens
+        ):
+            candidate_remaining = Counter(candidate_unigrams)
+            reference_remaining = Counter(reference_tokens)
+            for reference_sentence in reference_sentences:
+                reference_count += len(reference_sentence)
+                if len(reference_sentence) == 0:
+                    continue
+                hit_mask = set()
+                for candidate_sentence, candidate_vocab in zip(
+                    candidate_sentences, candidate_vocabs
+                ):
+                    self._mark_lcs(
+                        reference_sentence,
+                        candidate_sentence,
+                        candidate_vocab,
+                        hit_mask,
+                    )
+                for index in sorted(hit_mask):
+                    token = reference_sentence[index]
+                    if (
+                        reference_remaining[token] > 0
+                        and candidate_remaining[token] > 0
+                    ):
+                        hit += 1
+                        reference_remaining[token] -= 1
+                        candidate_remaining[token] -= 1
+            candidate_count += len(candidate_tokens)
+        metrics["rouge-l"] = compute_scores(hit, reference_count, candidate_count)
+
+        if self.calculate_su4:
+            candidate_counts = self._get_skip_bigrams(candidate_tokens)
+            hit, reference_count, candidate_count = 0, 0, 0
+            for reference_tokens in references_tokens:
+                reference_counts = self._get_skip_bigrams(reference_tokens)
+                hit += self._count_hits(reference_counts, candidate_counts)
+                reference_count += sum(reference_counts.values())
+                candidate_count += sum(candidate_counts.values())
+            metrics["rouge-su4"] = compute_scores(hit, reference_count, candidate_count)
+
+        return metrics
+
+
+def _dump_resources(image: str) -> Tuple[List[str], Dict[str, str]]:
+    command = (
+        "cat ROUGE-1.5.5/data/smart_common_words.txt"
+        " && echo"
+        " && perl -MDB_File -MFcntl -e"
+        ' \'tie(my %h, "DB_File", $ARGV[0], O_RDONLY, 0440, $DB_HASH) or die;'
+        ' while (my ($k, $v) = each %h) { print "$k\\t$v\\n" }\''
+        " ROUGE-1.5.5/data/WordNet-2.0.exc.db"
+    )
+    stdout = run_command(
+        image, command, network_disabled=True, stderr=False, silent=True
+    )
+
+    stopwords, exceptions = [], {}
+    for line in stdout.splitlines():
+        if "\t" in line:
+            key, value = line.split("\t", 1)
+            exceptions[key] = value
+        elif line:
+            stopwords.append(line)
+    return stopwords, exceptions
+
+
+def _get_resources_cache_file(image: str) -> Optional[str]:
+    digest = get_image_digest(image)
+    if digest is None:
+        return None
+    return f"{REPRO_CONFIG['cache_dir']}/lin2004/{digest.replace(':', '-')}.json"
+
+
+def load_resources(image: str) -> Tuple[Set[str], Dict[str, str]]:
+    """
+    Loads the stopwords and the WordNet exceptions database which are used by
+    ROUGE in the Docker image :code:`image`. They are cached in the
+    :code:`"cache_dir"` of the repro config so the image is only run the first time.
+
+    Parameters
+    ----------
+    image : str
+        The name of the ROUGE Docker image
+
+    Returns
+    -------
+    Tuple[Set[str], Dict[str, str]]
+        The stopwords and the exceptions
+    """
+    cache_file = _get_resources_cache_file(image)
+    if cache_file is not None and os.path.exists(cache_file):
+        with open(cache_file, "r") as f:
+            data = json.load(f)
+        return set(data["stopwords"]), data["exceptions"]
+
+    logger.info(f"Loading the ROUGE resources from {image}")
+    stopwords, exceptions = _dump_resources(image)
+
+    # The image may have been pulled by `run_command`, so check the digest again
+    cache_file = _get_resources_cache_file(image)
+    if cache_file is not None:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(cache_file, "w") as out:
+            json.dump({"stopwords": stopwords, "exceptions": exceptions}, out)
+    return set(stopwords), exceptions
@@ -1,8 +1,20 @@
 import math
+import multiprocessing
+import queue
+from concurrent.futures import Future, ThreadPoolExecutor
 from joblib import Parallel, delayed
-from typing import Any, Dict, List, Type, Union
-
-from repro.common import Registrable
+from joblib.externals.loky import ProcessPoolExecutor
+from numbers import Real
+from typing import Any, Dict, List, Optional, Tuple, Type, Union
+
+from repro.common import REPRO_CONFIG, Registrable
+from repro.common.cache import ResultCache, hash_object
+from repro.common.docker import get_image_digest
+from repro.common.util import (
+    aggregate_parallel_metrics,
+    average_dicts,
+    flatten_nested_dict,
+)
 from repro.data.types import DocumentType, SummaryType
 
 
@@ -25,6 +37,87 @@ class Model(Registrable):
         """
         raise NotImplementedError
 
+    def close(self) -> None:
+        """
+        Releases any resources held by the model, such as persistent Docker containers.
+        The default implementation does nothing.
+        """
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# The model owned by a persistent worker process of a `ParallelModel`
+_worker_model = None
+
+
+def _init_worker_model(model_cls: Type[Model], model_kwargs: Dict[str, Any]) -> None:
+    global _worker_model
+    _worker_model = model_cls(**model_kwargs)
+
+
+def _predict_with_worker_model(inputs: List[Dict[str, Any]], kwargs: Dict) -> Any:
+    return _worker_model.predict_batch(inputs, **kwargs)
+
+
+def _close_worker_model() -> None:
+    global _worker_model
+    if _worker_model is not None:
+        _worker_model.close()
+        _worker_model = None
+
+
+class _ParallelWorker(object):
+    """
+    A single worker of a persistent :code:`ParallelModel`. It owns one model instance
+    which stays alive, either in a dedicated process or thread, until :code:`close()`
+    is called.
+    """
+
+    def __init__(
+        self,
+        model_cls: Type[Model],
+        model_kwargs: Dict[str, Any],
+        use_threads: bool,
+    ) -> None:
+        self.model_cls = model_cls
+        self.model_kwargs = model_kwargs
+        self.use_threads = use_threads
+        self.model = None
+        if use_threads:
+            self.executor = ThreadPoolExecutor(max_workers=1)
+        else:
+            self.executor = ProcessPoolExecutor(
+                max_workers=1,
+                initializer=_init_worker_model,
+                initargs=(model_cls, model_kwargs),
+            )
+
+    def _predict_in_thread(self, inputs: List[Dict[str, Any]], kwargs: Dict) -> Any:
+        if self.model is None:
+            self.model = self.model_cls(**self.model_kwargs)
+        return self.model.predict_batch(inputs, **kwargs)
+
+    def submit(self, inputs: List[Dict[str, Any]], kwargs: Dict) -> Future:
+        if self.use_threads:
+            return self.executor.submit(self._predict_in_thread, inputs, kwargs)
+        return self.executor.submit(_predict_with_worker_model, inputs, kwargs)
+
+    def close(self) -> None:
+        try:
+            if self.use_threads:
+                if self.model is not None:
+                    self.executor.submit(self.model.close).result()
+                    self.model = None
+            else:
+                self.executor.submit(_close_worker_model).result()
+        finally:
+            self.executor.shutdown(wait=True)
+
 
 class ParallelModel(Model):
     """
@@ -44,7 +137,8 @@ class ParallelModel(Model):
     and the output from the model must be serializable by :code:`joblib`.
 
     The output from the :code:`predict_batch()` method will be the list of
-    outputs returned by each of the individual processes.
+    outputs returned by each of the individual processes (unless :code:`chunk_size`
+    is set, see below).
 
     If the input ordering matters or the model does some final aggregation over
     all of the items in the :code:`inputs` passed to :code:`predict_batch()`, the
@@ -72,6 +166,30 @@ class ParallelModel(Model):
         passing a list of :code:`num_models` empty :code:`kwargs`
         (i.e., :code:`{}`). Only one of :code:`model_kwargs_list` and
         :code:`num_models` may be set.
+    prefer : str, default=None
+        Passed to :code:`joblib.Parallel` to choose between running the workers
+        as :code:`"processes"` (the default) or :code:`"threads"`. Models which do
+        their work in Docker containers can use threads, which lets the workers
+        share the process-wide :py:class:`repro.common.docker.ContainerPool`
+        so the number of live containers is limited across all of them.
+    chunk_size : int, default=None
+        If set, the :code:`inputs` are divided into chunks of :code:`chunk_size`
+        items instead of one batch per model. The chunks are put on a shared queue
+        and every model takes the next chunk as soon as it finishes its previous one,
+        so a few slow inputs do not stall the whole job. In this mode,
+        :code:`predict_batch()` merges the outputs in the same order as the
+        :code:`inputs`: If the model returns a tuple of macro and micro metrics for
+        each chunk, they are combined with
+        :py:meth:`repro.common.util.aggregate_parallel_metrics`. Otherwise, the
+        outputs are assumed to be lists and are concatenated.
+    persistent : bool, default=False
+        If :code:`True`, the workers and their models are created the first time
+        :code:`predict_batch()` is called and are kept alive for the following calls
+        instead of being recreated every time. This avoids reloading the models
+        and restarting any containers they keep warm. The workers are stopped by
+        :code:`close()`, which is also called when the :code:`ParallelModel` is used
+        as a context manager. Each worker is a dedicated process unless
+        :code:`prefer="threads"`.
 
     Examples
     --------
@@ -143,6 +261,26 @@ class ParallelModel(Model):
 
     This will run two instances of :code:`GPUModel` in parallel. One process will
     use :code:`device=0` and the other :code:`device=2`.
+
+    If the time it takes to process the inputs varies a lot, use :code:`chunk_size`
+    so the models which finish early keep working on the remaining inputs:
+
+    .. code-block:: python
+
+        parallel_model = ParallelModel(TimesTen, num_models=2, chunk_size=1)
+        outputs = parallel_model.predict_batch(inputs)
+
+    Here, :code:`outputs` will be equal to :code:`[0, 10, 20, 30]`, the same as
+    :code:`TimesTen().predict_batch(inputs)`.
+
+    If :code:`predict_batch()` will be called many times, the workers can be kept
+    alive between the calls with :code:`persistent=True`:
+
+    .. code-block:: python
+
+        with ParallelModel(TimesTen, num_models=2, persistent=True) as parallel_model:
+            for batch in batches:
+                output_list = parallel_model.predict_batch(batch)
     """
 
     def __init__(
@@ -150,8 +288,15 @@ class ParallelModel(Model):
         model_cls: Type[Model],
         model_kwargs_list: List[Dict[str, Any]] = None,
         num_models: int = None,
+        prefer: str = None,
+        chunk_size: int = None,
+        persistent: bool = False,
     ) -> None:
         self.model_cls = model_cls
+        self.prefer = prefer
+        self.chunk_size = chunk_size
+        self.persistent = persistent
+        self._workers = None
 
         if not model_kwargs_list and not num_models:
             raise ValueError(
@@ -163,6 +308,8 @@ class ParallelModel(Model):
             )
         if num_models and num_models <= 0:
             raise ValueError(f"`num_models` must be positive")
+        if chunk_size is not None and chunk_size <= 0:
+            raise ValueError(f"`chunk_size` must be positive")
 
         if model_kwargs_list:
             self.model_kwargs_list = model_kwargs_list
@@ -177,13 +324,130 @@ class ParallelModel(Model):
             batches.append(inputs[i : i + batch_size])
         return batches
 
+    @staticmethod
+    def _divide_into_chunks(inputs: List[Any], chunk_size: int) -> List[List[Any]]:
+        return [inputs[i : i + chunk_size] for i in range(0, len(inputs), chunk_size)]
+
     def _process(
         self, model_kwargs: Dict[str, Any], inputs: List[Dict[str, Any]], **kwargs
     ) -> Any:
         model = self.model_cls(**model_kwargs)
-        return model.predict_batch(inputs, **kwargs)
+        try:
+            return model.predict_batch(inputs, **kwargs)
+        finally:
+            model.close()
+
+    def _process_chunks(
+        self, model_kwargs: Dict[str, Any], chunks: queue.Queue, **kwargs
+    ) -> List[Tuple[int, Any]]:
+        # Keeps processing chunks until there are none left. The index of each chunk
+        # is returned with its output so the original order can be restored
+        model = self.model_cls(**model_kwargs)
+        results = []
+        try:
+            while True:
+                try:
+                    index, chunk = chunks.get_nowait()
+                except queue.Empty:
+                    break
+                results.append((index, model.predict_batch(chunk, **kwargs)))
+        finally:
+            model.close()
+        return results
+
+    @staticmethod
+    def _merge_outputs(outputs: List[Any]) -> Any:
+        if len(outputs) > 0 and all(isinstance(output, tuple) for output in outputs):
+            return aggregate_parallel_metrics(outputs)
+        merged = []
+        for output in outputs:
+            merged.extend(output)
+        return merged
+
+    def _predict_batch_chunked(self, inputs: List[Dict[str, Any]], **kwargs) -> Any:
+        chunks = self._divide_into_chunks(inputs, self.chunk_size)
+        num_jobs = min(len(self.model_kwargs_list), len(chunks))
+        if num_jobs == 0:
+            return []
+
+        # Threads can share a regular queue, but processes need one that is
+        # served by a manager process
+        manager = None
+        if self.prefer == "threads":
+            chunk_queue = queue.Queue()
+        else:
+            manager = multiprocessing.Manager()
+            chunk_queue = manager.Queue()
+
+        try:
+            for index, chunk in enumerate(chunks):
+                chunk_queue.put((index, chunk))
+
+            jobs = []
+            for model_kwargs in self.model_kwargs_list[:num_jobs]:
+                jobs.append(
+                    delayed(self._process_chunks)(model_kwargs, chunk_queue, **kwargs)
+                )
+            results = Parallel(n_jobs=num_jobs, prefer=self.prefer)(jobs)
+        finally:
+            if manager is not None:
+                manager.shutdown()
+
+        outputs = [None] * len(chunks)
+        for worker_results in results:
+            for index, output in worker_results:
+                outputs[index] = output
+        return self._merge_outputs(outputs)
+
+    def _get_workers(self) -> List[_ParallelWorker]:
+        if self._workers is None:
+            use_threads = self.prefer == "threads"
+            self._workers = [
+                _ParallelWorker(self.model_cls, model_kwargs, use_threads)
+                for model_kwargs in self.model_kwargs_list
+            ]
+        return self._workers
+
+    def _predict_batch_persistent(self, inputs: List[Dict[str, Any]], **kwargs) -> Any:
+        workers = self._get_workers()
+        if self.chunk_size is None:
+            batches = self._divide_into_batches(inputs, len(workers))
+            futures = [
+                worker.submit(batch, kwargs) for worker, batch in zip(workers, batches)
+            ]
+            return [future.result() for future in futures]
+
+        chunks = self._divide_into_chunks(inputs, self.chunk_size)
+        if len(chunks) == 0:
+            return []
+        chunk_queue = queue.Queue()
+        for index, chunk in enumerate(chunks):
+            chunk_queue.put((index, chunk))
+
+        # Each worker is driven by a thread which sends it the next chunk
+        # as soon as it has finished the previous one
+        outputs = [None] * len(chunks)
+
+        def _drive(worker: _ParallelWorker) -> None:
+            while True:
+                try:
+                    index, chunk = chunk_queue.get_nowait()
+                except queue.Empty:
+                    return
+                outputs[index] = worker.submit(chunk, kwargs).result()
+
+        with ThreadPoolExecutor(max_workers=len(workers)) as drivers:
+            futures = [drivers.submit(_drive, worker) for worker in workers]
+            for future in futures:
+                future.result()
+        return self._merge_outputs(outputs)
 
     def predict_batch(self, inputs: List[Dict[str, Any]], **kwargs) -> List[Any]:
+        if self.persistent:
+            return self._predict_batch_persistent(inputs, **kwargs)
+        if self.chunk_size is not None:
+            return self._predict_batch_chunked(inputs, **kwargs)
+
         # Divide all of the inputs into batches, maintaining the order
         num_jobs = len(self.model_kwargs_list)
         batches = self._divide_into_batches(inputs, num_jobs)
@@ -194,9 +458,222 @@ class ParallelModel(Model):
             jobs.append(delayed(self._process)(model_kwargs, batch))
 
         # Run the jobs
-        results = Parallel(n_jobs=num_jobs)(jobs)
+        results = Parallel(n_jobs=num_jobs, prefer=self.prefer)(jobs)
         return results
 
+    def close(self) -> None:
+        """
+        Stops the workers of a persistent :code:`ParallelModel` and closes their models.
+        A new set of workers will be started if :code:`predict_batch()` is called again.
+        """
+        if self._workers is not None:
+            workers = self._workers
+            self._workers = None
+            for worker in workers:
+                worker.close()
+
+
+def _is_average(macro: Dict[str, Any], micro: List[Dict[str, Any]]) -> bool:
+    # Checks whether the macro metrics are the average of the micro metrics
+    try:
+        average = flatten_nested_dict(average_dicts(micro))
+        macro = flatten_nested_dict(macro)
+    except Exception:
+        return False
+    if macro.keys() != average.keys():
+        return False
+    for key, value in macro.items():
+        if not isinstance(value, Real) or not isinstance(average[key], Real):
+            return False
+        if not math.isclose(value, average[key], rel_tol=1e-5, abs_tol=1e-8):
+            return False
+    return True
+
+
+class CachedModel(Model):
+    """
+    A :code:`CachedModel` wraps a registered :code:`Model` and saves the output for
+    every input instance to an on-disk :py:class:`repro.common.cache.ResultCache`.
+    When :code:`predict_batch()` is called, only the instances which have not been
+    seen before are passed to the wrapped model, and the cached and new outputs are
+    merged back together in the same order as the :code:`inputs`.
+
+    The cache key combines the name of the model, its constructor kwargs, the
+    kwargs passed to :code:`predict_batch()`, the ID of the model's Docker image
+    (from its :code:`image` attribute) and a stable hash of the input instance.
+    Rebuilding or pulling a new version of the image therefore invalidates
+    the cached results. Constructor kwargs which only control how the model
+    runs and not what it outputs (see :code:`ignored_kwargs`) are not included.
+
+    If the wrapped model is a metric which returns a tuple of macro and micro
+    results, the micro results are cached. If all of the instances had to be
+    computed, the model's own macro result is returned. Otherwise, the macro
+    result is the average of the micro results. Results are therefore only cached
+    for metrics whose macro result is the average of the input-level results (the
+    same assumption as :py:meth:`repro.common.util.aggregate_parallel_metrics`).
+    If a metric's macro result is not the average of its micro results (e.g.,
+    ROUGE's confidence intervals) or a model does not return one output per
+    instance (e.g., corpus-level BLEU), nothing is cached and the model's own
+    output for all of the inputs is returned.
+
+    Parameters
+    ----------
+    model_name : str
+        The registered name of the model to wrap
+    model_kwargs : Dict[str, Any], default=None
+        The kwargs to pass to the model's constructor
+    cache_file : str, default=None
+        The path to the cache's database. Defaults to :code:`results.sqlite` in the
+        :code:`"cache_dir"` of the repro config. Different models may share one file.
+    max_size : int, default=None
+        The maximum size of the cache in bytes, after which the least-recently
+        used results are evicted. If :code:`None`, results are never evicted.
+    ignored_kwargs : List[str], default=None
+        The constructor kwargs which are not part of the cache key. Defaults
+        to :code:`CachedModel.DEFAULT_IGNORED_KWARGS`.
+
+    Examples
+    --------
+
+    .. code-block:: python
+
+        from repro.models import CachedModel
+
+        model = CachedModel("bertscore", {"device": 0})
+        macro, micro = model.predict_batch(inputs)
+        # This call does not run BERTScore again
+        macro, micro = model.predict_batch(inputs)
+    """
+
+    DEFAULT_IGNORED_KWARGS = [
+        "device",
+        "persistent",
+        "idle_timeout",
+        "server",
+        "cache_sentences",
+        "cache_qa_pairs",
+        "cache_stus",
+        "embeddings_dir",
+    ]
+
+    def __init__(
+        self,
+        model_name: str,
+        model_kwargs: Dict[str, Any] = None,
+        cache_file: str = None,
+        max_size: int = None,
+        ignored_kwargs: List[str] = None,
+    ) -> None:
+        self.model_name = model_name
+        self.model_kwargs = model_kwargs or {}
+        self.model = Model.by_name(model_name)(**self.model_kwargs)
+
+        cache_file = cache_file or f"{REPRO_CONFIG['cache_dir']}/results.sqlite"
+        self.cache = ResultCache(cache_file, max_size=max_size)
+
+        if ignored_kwargs is None:
+            ignored_kwargs = CachedModel.DEFAULT_IGNORED_KWARGS
+        self.ignored_kwargs = set(ignored_kwargs)
+
+        # Set to `False` once the model's outputs are found to be uncacheable
+        self._cacheable = True
+
+    def _get_config_key(self, kwargs: Dict[str, Any]) -> Optional[str]:
+        # Returns `None` if the results cannot be cached because the
+        # model's image does not exist locally yet
+        image = getattr(self.model, "image", None)
+        image_digest = None
+        if image is not None:
+            image_digest = get_image_digest(image)
+            if image_digest is None:
+                return None
+
+        model_kwargs = {
+            key: value
+            for key, value in self.model_kwargs.items()
+            if key not in self.ignored_kwargs
+        }
+        return hash_object(
+            {
+                "model_name": self.model_name,
+                "model_kwargs": model_kwargs,
+                "predict_kwargs": kwargs,
+                "image_digest": image_digest,
+            }
+        )
+
+    def predict_batch(self, inputs: List[Dict[str, Any]], **kwargs) -> Any:
+        if len(inputs) == 0 or not self._cacheable:
+            return self.model.predict_batch(inputs, **kwargs)
+
+        config_key = self._get_config_key(kwargs)
+        cached = {}
+        if config_key is not None:
+            keys = [hash_object([config_key, inp]) for inp in inputs]
+            cached = self.cache.get_many(keys)
+
+        # Identical instances only need to be computed once
+        missing = {}
+        if config_key is None:
+            missing = {i: i for i in range(len(inputs))}
+        else:
+            first_index = {}
+            for i, key in enumerate(keys):
+                if key not in cached:
+                    missing[i] = first_index.setdefault(key, i)
+        to_compute = sorted(set(missing.values()))
+
+        is_metric = None
+        computed = {}
+        macro = None
+        if len(to_compute) > 0:
+            outputs = self.model.predict_batch(
+                [inputs[i] for i in to_compute], **kwargs
+            )
+            is_metric = isinstance(outputs, tuple)
+            if is_metric:
+                macro, outputs = outputs
+
+            # The outputs cannot be merged with cached outputs, so the
+            # model's output for all of the inputs is returned uncached
+            if len(outputs) != len(to_compute) or (
+                is_metric and not _is_average(macro, outputs)
+            ):
+                self._cacheable = False
+                if len(to_compute) == len(inputs):
+                    return (macro, outputs) if is_metric else outputs
+                return self.model.predict_batch(inputs, **kwargs)
+
+            computed = dict(zip(to_compute, outputs))
+
+            # The image may have been pulled by the model
+            if config_key is None:
+                config_key = self._get_config_key(kwargs)
+                if config_key is not None:
+                    keys = [hash_object([config_key, inp]) for inp in inputs]
+            if config_key is not None:
+                self.cache.put_many(
+                    {keys[i]: [is_metric, output] for i, output in computed.items()}
+                )
+
+        results = []
+        for i in range(len(inputs)):
+            if i in missing:
+                results.append(computed[missing[i]])
+            else:
+                cached_is_metric, output = cached[keys[i]]
+                is_metric = cached_is_metric
+                results.append(output)
+
+        if not is_metric:
+            return results
+        if len(to_compute) == len(inputs):
+            return macro, results
+        return average_dicts(results), results
+
+    def close(self) -> None:
+        self.model.close()
+
 
 class QuestionAnsweringModel(Model):
     def predict(self, context: str, question: str, *args, **kwargs) -> str:
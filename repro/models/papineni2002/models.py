@@ -8,15 +8,31 @@ from repro.common.docker import make_volume_map, run_command
 from repro.common.io import read_jsonl_file
 from repro.data.types import MetricsType, TextType
 from repro.models import Model
-from repro.models.papineni2002 import DEFAULT_IMAGE, MODEL_NAME
+from repro.models.papineni2002 import DEFAULT_IMAGE, MODEL_NAME, python_bleu
 
 logger = logging.getLogger(__name__)
 
 
 @Model.register(f"{MODEL_NAME}-sentbleu")
 class SentBLEU(Model):
-    def __init__(self, image: str = DEFAULT_IMAGE):
+    """
+    Parameters
+    ----------
+    image : str, default=DEFAULT_IMAGE
+        The name of the Docker image
+    backend : str, default="docker"
+        Either "docker" to run sacrebleu in the Docker image or "python" to compute
+        the same scores in-process with
+        :func:`~repro.models.papineni2002.python_bleu.sentence_bleu`, which does not
+        require Docker and avoids starting a container. Each set of references is
+        only tokenized once.
+    """
+
+    def __init__(self, image: str = DEFAULT_IMAGE, backend: str = "docker"):
+        if backend not in ["docker", "python"]:
+            raise ValueError(f"Unknown SentBLEU backend: {backend}")
         self.image = image
+        self.backend = backend
 
     def predict(
         self,
@@ -43,6 +59,12 @@ class SentBLEU(Model):
             for references in references_list
         ]
 
+        if self.backend == "python":
+            scores = python_bleu.sentence_bleu(candidates, references_list)
+            micro_metrics = [{"sentbleu": score} for score in scores]
+            macro_metrics = util.average_dicts(micro_metrics)
+            return macro_metrics, micro_metrics
+
         with TemporaryDirectory() as temp:
             host_input_dir = f"{temp}/input"
             host_output_dir = f"{temp}/output"
@@ -81,8 +103,24 @@ class SentBLEU(Model):
 
 @Model.register(f"{MODEL_NAME}-bleu")
 class BLEU(Model):
-    def __init__(self, image: str = DEFAULT_IMAGE):
+    """
+    Parameters
+    ----------
+    image : str, default=DEFAULT_IMAGE
+        The name of the Docker image
+    backend : str, default="docker"
+        Either "docker" to run sacrebleu in the Docker image or "python" to compute
+        the same scores in-process with
+        :func:`~repro.models.papineni2002.python_bleu.corpus_bleu`, which does not
+        require Docker and avoids starting a container. Each set of references is
+        only tokenized once.
+    """
+
+    def __init__(self, image: str = DEFAULT_IMAGE, backend: str = "docker"):
+        if backend not in ["docker", "python"]:
+            raise ValueError(f"Unknown BLEU backend: {backend}")
         self.image = image
+        self.backend = backend
 
     def predict(
         self,
@@ -109,6 +147,11 @@ class BLEU(Model):
             for references in references_list
         ]
 
+        if self.backend == "python":
+            # BLEU is corpus-level, so there's no micro
+            score = python_bleu.corpus_bleu(candidates, references_list)
+            return {"bleu": score}, []
+
         with TemporaryDirectory() as temp:
             host_input_dir = f"{temp}/input"
             host_output_dir = f"{temp}/output"
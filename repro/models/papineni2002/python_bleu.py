@@ -0,0 +1,174 @@
+"""
+An in-process reimplementation of BLEU and SentBLEU as they are computed by
+:code:`sacrebleu.corpus_bleu` and :code:`sacrebleu.sentence_bleu` in version 1.5.1,
+which is the version installed in the papineni2002 Docker image. Both use the "13a"
+tokenizer, mixed case, and "exp" smoothing (signature
+"BLEU+case.mixed+numrefs.N+smooth.exp+tok.13a+version.1.5.1"). The arithmetic is
+done in the same order as sacrebleu so the scores are identical.
+"""
+import math
+import re
+from collections import Counter
+from typing import List, Tuple
+
+NGRAM_ORDER = 4
+
+_TOKENIZER_13A_REGEXES = [
+    (re.compile(r"([\{-\~\[-\` -\&\(-\+\:-\@\/])"), r" \1 "),
+    (re.compile(r"([^0-9])([\.,])"), r"\1 \2 "),
+    (re.compile(r"([\.,])([^0-9])"), r" \1 \2"),
+    (re.compile(r"([0-9])(-)"), r"\1 \2 "),
+    (re.compile(r"\s+"), r" "),
+]
+
+
+def tokenize_13a(line: str) -> List[str]:
+    """
+    Tokenizes a line with sacrebleu's "13a" tokenizer, which is equivalent to mteval-v13a.
+    """
+    line = line.rstrip()
+    line = line.replace("<skipped>", "")
+    line = line.replace("-\n", "")
+    line = line.replace("\n", " ")
+    line = line.replace("&quot;", '"')
+    line = line.replace("&amp;", "&")
+    line = line.replace("&lt;", "<")
+    line = line.replace("&gt;", ">")
+    line = f" {line} "
+    for regex, replacement in _TOKENIZER_13A_REGEXES:
+        line = regex.sub(replacement, line)
+    return line.split()
+
+
+def _extract_ngrams(tokens: List[str]) -> Counter:
+    ngrams = Counter()
+    for n in range(1, NGRAM_ORDER + 1):
+        for i in range(len(tokens) - n + 1):
+            ngrams[tuple(tokens[i : i + n])] += 1
+    return ngrams
+
+
+class _ReferenceStats(object):
+    def __init__(self, references: List[str]) -> None:
+        # Empty references are ignored by sacrebleu
+        references = [reference for reference in references if reference]
+        if len(references) == 0:
+            raise Exception(f"No valid references for a sentence")
+
+        self.lengths = []
+        self.ngrams = Counter()
+        for reference in references:
+            tokens = tokenize_13a(reference)
+            self.lengths.append(len(tokens))
+            for ngram, count in _extract_ngrams(tokens).items():
+                if count > self.ngrams[ngram]:
+                    self.ngrams[ngram] = count
+
+    def get_closest_length(self, length: int) -> int:
+        closest_diff, closest_length = None, None
+        for reference_length in self.lengths:
+            diff = abs(length - reference_length)
+            if closest_diff is None or diff < closest_diff:
+                closest_diff, closest_length = diff, reference_length
+            elif diff == closest_diff and reference_length < closest_length:
+                closest_length = reference_length
+        return closest_length
+
+
+def _log(value: float) -> float:
+    return math.log(value) if value != 0.0 else -9999999999
+
+
+def compute_bleu(
+    correct: List[int],
+    total: List[int],
+    sys_length: int,
+    ref_length: int,
+    use_effective_order: bool = False,
+) -> float:
+    """
+    Computes BLEU with "exp" smoothing from its sufficient statistics.
+    """
+    precisions = [0.0] * NGRAM_ORDER
+    smooth_mteval = 1.0
+    effective_order = NGRAM_ORDER
+    for n in range(1, NGRAM_ORDER + 1):
+        if total[n - 1] == 0:
+            break
+        if use_effective_order:
+            effective_order = n
+        if correct[n - 1] == 0:
+            smooth_mteval *= 2
+            precisions[n - 1] = 100.0 / (smooth_mteval * total[n - 1])
+        else:
+            precisions[n - 1] = 100.0 * correct[n - 1] / total[n - 1]
+
+    if sys_length < ref_length:
+        bp = math.exp(1 - ref_length / sys_length) if sys_length > 0 else 0.0
+    else:
+        bp = 1.0
+    return bp * math.exp(sum(map(_log, precisions[:effective_order])) / effective_order)
+
+
+def _get_statistics(
+    candidates: List[str], references_list: List[List[str]]
+) -> List[Tuple[List[int], List[int], int, int]]:
+    # The statistics of each set of references are only computed once since the
+    # same references are often used to score many candidates
+    reference_stats = {}
+    statistics = []
+    for candidate, references in zip(candidates, references_list):
+        key = tuple(references)
+        if key not in reference_stats:
+            reference_stats[key] = _ReferenceStats(references)
+        stats = reference_stats[key]
+
+        tokens = tokenize_13a(candidate)
+        correct = [0] * NGRAM_ORDER
+        total = [0] * NGRAM_ORDER
+        for ngram, count in _extract_ngrams(tokens).items():
+            n = len(ngram)
+            correct[n - 1] += min(count, stats.ngrams.get(ngram, 0))
+            total[n - 1] += count
+        statistics.append(
+            (correct, total, len(tokens), stats.get_closest_length(len(tokens)))
+        )
+    return statistics
+
+
+def sentence_bleu(
+    candidates: List[str], references_list: List[List[str]]
+) -> List[float]:
+    """
+    Computes SentBLEU for every candidate, equivalent to calling
+    :code:`sacrebleu.sentence_bleu(candidate, references).score` for each one.
+    """
+    return [
+        compute_bleu(correct, total, sys_length, ref_length, use_effective_order=True)
+        for correct, total, sys_length, ref_length in _get_statistics(
+            candidates, references_list
+        )
+    ]
+
+
+def corpus_bleu(candidates: List[str], references_list: List[List[str]]) -> float:
+    """
+    Computes corpus-level BLEU, equivalent to
+    :code:`sacrebleu.corpus_bleu(candidates, inverted_references_list).score`. The
+    candidates may have different numbers of references.
+    """
+    correct = [0] * NGRAM_ORDER
+    total = [0] * NGRAM_ORDER
+    sys_length, ref_length = 0, 0
+    for (
+        sentence_correct,
+        sentence_total,
+        sentence_sys_length,
+        sentence_ref_length,
+    ) in _get_statistics(candidates, references_list):
+        for n in range(NGRAM_ORDER):
+            correct[n] += sentence_correct[n]
+            total[n] += sentence_total[n]
+        sys_length += sentence_sys_length
+        ref_length += sentence_ref_length
+    return compute_bleu(correct, total, sys_length, ref_length)
@@ -68,6 +68,17 @@ class COMET(Model):
         sources = [util.flatten(source) for source in sources]
         if has_references:
             references = [util.flatten(reference) for reference in references]
+        else:
+            references = [None] * len(candidates)
+
+        # Identical inputs only need to be scored once
+        distinct_inputs, mapping = util.deduplicate(
+            list(zip(candidates, sources, references))
+        )
+        candidates = [candidate for candidate, _, _ in distinct_inputs]
+        sources = [source for _, source, _ in distinct_inputs]
+        references = [reference for _, _, reference in distinct_inputs]
+        logger.info(f"Scoring {len(distinct_inputs)} distinct inputs")
 
         with DockerContainer(self.image) as backend:
             host_src_file = f"{backend.host_dir}/src.txt"
@@ -120,5 +131,6 @@ class COMET(Model):
             micro = []
             for output in outputs:
                 micro.append({metric: output["COMET"]})
+            micro = util.expand_deduplicated(micro, mapping)
             macro = util.average_dicts(micro)
             return macro, micro
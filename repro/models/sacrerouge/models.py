@@ -1,11 +1,12 @@
 import json
 import logging
 import os
-from typing import Dict, List, Union
+from typing import Dict, List, Tuple, Union
 
 from repro.common import TemporaryDirectory
 from repro.common.docker import make_volume_map, run_command
 from repro.common.io import read_jsonl_file, write_to_jsonl_file
+from repro.common.sentence_split import SentenceSplitter
 from repro.data.types import MetricsType, SummaryType
 from repro.models import Model
 from repro.models.sacrerouge import DEFAULT_IMAGE, MODEL_NAME
@@ -52,40 +53,99 @@ def sentence_split(image: str, inputs: List[str]) -> List[List[str]]:
         return sentences
 
 
+def get_sentence_splitter(image: str, **kwargs) -> SentenceSplitter:
+    """
+    Gets a :py:class:`repro.common.sentence_split.SentenceSplitter` which runs
+    :code:`sentence_split()` and caches its output. The kwargs are passed to
+    the splitter's constructor.
+    """
+    return SentenceSplitter(
+        image,
+        sentence_split,
+        MODEL_NAME,
+        server_command="python sentence_split.py --server",
+        **kwargs,
+    )
+
+
 @Model.register(f"{MODEL_NAME}-rouge")
 class SRROUGE(Model):
-    def __init__(self, image: str = DEFAULT_IMAGE):
+    """
+    Parameters
+    ----------
+    image : str, default=DEFAULT_IMAGE
+        The name of the Docker image
+    cache_sentences : bool, default=True
+        Whether or not to cache the output of sentence splitting on disk so texts
+        which were already split, for instance in a previous run, are not split again
+    persistent : bool, default=False
+        Indicates whether the sentence splitter should run as a server in a warm Docker
+        container from the process-wide container pool instead of in a new container
+        for every call to `predict_batch`
+    idle_timeout : float, default=None
+        The number of seconds the sentence splitter's persistent container may be
+        idle before it is stopped
+    """
+
+    def __init__(
+        self,
+        image: str = DEFAULT_IMAGE,
+        cache_sentences: bool = True,
+        persistent: bool = False,
+        idle_timeout: float = None,
+    ):
         self.image = image
+        self.cache_sentences = cache_sentences
+        self.persistent = persistent
+        self.idle_timeout = idle_timeout
+        self.sentence_splitter = get_sentence_splitter(
+            image,
+            persistent=persistent,
+            idle_timeout=idle_timeout,
+            cache=cache_sentences,
+        )
+
+    def close(self) -> None:
+        self.sentence_splitter.close()
 
-    def _maybe_sentence_split(self, summaries: List[SummaryType]) -> List[List[str]]:
+    @staticmethod
+    def _requires_sentence_split(summaries: List[SummaryType]) -> bool:
         if any(isinstance(summary, str) for summary in summaries):
             if not all(isinstance(summary, str) for summary in summaries):
                 raise Exception(
                     f"Input summaries or references are mixed between strings and lists of strings. "
                     f"All must be of the same type"
                 )
-            return sentence_split(self.image, summaries)
-        else:
-            return summaries
-
-    def _maybe_sentence_split_references(
-        self, references_list: List[List[SummaryType]]
-    ) -> List[List[List[str]]]:
-        # Flatten the references into a single list so we can call `_maybe_sentence_split`, then
-        # rearrange the output to be parallel to `references_list`
-        flat_references = []
-        for references in references_list:
-            flat_references.extend(references)
-
-        split_references = self._maybe_sentence_split(flat_references)
-        split_references_list = []
-        index = 0
-        for references in references_list:
-            split_references_list.append([])
-            for _ in references:
-                split_references_list[-1].append(split_references[index])
-                index += 1
-        return split_references_list
+            return True
+        return False
+
+    def _maybe_sentence_split(
+        self,
+        summaries: List[SummaryType],
+        references_list: List[List[SummaryType]],
+    ) -> Tuple[List[List[str]], List[List[List[str]]]]:
+        # The summaries and references which are not already sentence split are split
+        # with one call to the sentence splitter
+        flat_references = [
+            reference for references in references_list for reference in references
+        ]
+        to_split = []
+        if self._requires_sentence_split(summaries):
+            to_split.extend(summaries)
+        if self._requires_sentence_split(flat_references):
+            to_split.extend(flat_references)
+
+        sentences = dict(zip(to_split, self.sentence_splitter.split(to_split)))
+
+        def _get_sentences(summary: SummaryType) -> List[str]:
+            return sentences[summary] if isinstance(summary, str) else summary
+
+        summaries = [_get_sentences(summary) for summary in summaries]
+        references_list = [
+            [_get_sentences(reference) for reference in references]
+            for references in references_list
+        ]
+        return summaries, references_list
 
     def predict(
         self, summary: SummaryType, references: List[SummaryType], **kwargs
@@ -102,8 +162,9 @@ class SRROUGE(Model):
         summaries = [inp["summary"] for inp in inputs]
         references_list = [inp["references"] for inp in inputs]
 
-        summaries = self._maybe_sentence_split(summaries)
-        references_list = self._maybe_sentence_split_references(references_list)
+        summaries, references_list = self._maybe_sentence_split(
+            summaries, references_list
+        )
 
         with TemporaryDirectory() as temp:
             host_input_dir = f"{temp}/input"
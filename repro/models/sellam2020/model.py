@@ -1,10 +1,10 @@
 import json
 import logging
 import numpy as np
-from typing import Dict, List, Tuple, Union
+from typing import ContextManager, Dict, List, Tuple, Union
 
 from repro.common import util
-from repro.common.docker import DockerContainer
+from repro.common.docker import DockerContainer, get_container_pool
 from repro.data.types import MetricsType, TextType
 from repro.models import Model
 from repro.models.sellam2020 import DEFAULT_IMAGE, MODEL_NAME
@@ -20,16 +20,126 @@ class BLEURT(Model):
         model: str = "BLEURT-20",
         device: int = 0,
         batch_size: int = 100,
+        persistent: bool = False,
+        idle_timeout: float = None,
+        server: bool = False,
     ):
+        """
+        Parameters
+        ----------
+        image : str, default=DEFAULT_IMAGE
+            The name of the Docker image
+        model : str, default="BLEURT-20"
+            The name of the BLEURT checkpoint to use
+        device : int, default=0
+            The ID of the GPU to use, -1 if CPU
+        batch_size : int, default=100
+            The batch size for BLEURT
+        persistent : bool, default=False
+            Indicates whether a warm Docker container from the process-wide container pool
+            should be used for each call to `predict_batch` instead of starting a new one
+        idle_timeout : float, default=None
+            The number of seconds the persistent container may be idle before it is stopped
+        server : bool, default=False
+            Indicates the BLEURT checkpoint should be loaded once by a server process inside
+            of a persistent container and reused across calls to `predict_batch`. This
+            implies `persistent=True`
+        """
         self.image = image
         self.model = model
         self.device = device
         self.batch_size = batch_size
+        self.persistent = persistent
+        self.idle_timeout = idle_timeout
+        self.server = server
 
         # I believe only the BLEURT-20 models support length-based batching.
         # The originals, like "bleurt-base-128", do not
         self.length_based_batching = self.model.startswith("BLEURT-20")
 
+    def _get_container(self) -> ContextManager[DockerContainer]:
+        if self.persistent or self.server:
+            return get_container_pool().container(
+                self.image,
+                device=self.device,
+                idle_timeout=self.idle_timeout,
+                owner=self,
+            )
+        return DockerContainer(self.image)
+
+    def close(self) -> None:
+        if self.persistent or self.server:
+            get_container_pool().close(owner=self)
+
+    def _score_with_command(
+        self, backend: DockerContainer, candidates: List[str], references: List[str]
+    ) -> List[float]:
+        host_input_file = f"{backend.host_dir}/input.jsonl"
+        container_input_file = f"{backend.container_dir}/input.jsonl"
+        with open(host_input_file, "w") as out:
+            for candidate, reference in zip(candidates, references):
+                out.write(
+                    json.dumps(
+                        {
+                            "candidate": candidate,
+                            "reference": reference,
+                        }
+                    )
+                    + "\n"
+                )
+
+        host_output_file = f"{backend.host_dir}/output.jsonl"
+        container_output_file = f"{backend.container_dir}/output.jsonl"
+
+        cuda = self.device != -1
+        commands = []
+        if cuda:
+            commands.append(f"export CUDA_VISIBLE_DEVICES={self.device}")
+        commands.append("cd bleurt")
+
+        score_command = (
+            f"python -m bleurt.score_files"
+            f"  -sentence_pairs_file {container_input_file}"
+            f"  -bleurt_checkpoint ../{self.model}"
+            f"  -scores_file {container_output_file}"
+            f"  -bleurt_batch_size {self.batch_size}"
+        )
+        if self.length_based_batching:
+            score_command += " -batch_same_length=True"
+        commands.append(score_command)
+
+        command = " && ".join(commands)
+        backend.run_command(
+            command=command,
+            cuda=cuda,
+            network_disabled=True,
+        )
+
+        results = open(host_output_file, "r").read().splitlines()
+        return list(map(float, results))
+
+    def _score_with_server(
+        self, backend: DockerContainer, candidates: List[str], references: List[str]
+    ) -> List[float]:
+        cuda = self.device != -1
+        commands = []
+        if cuda:
+            commands.append(f"export CUDA_VISIBLE_DEVICES={self.device}")
+
+        server_command = (
+            f"python score.py"
+            f"  --bleurt-checkpoint {self.model}"
+            f"  --bleurt-batch-size {self.batch_size}"
+        )
+        if self.length_based_batching:
+            server_command += " --batch-same-length"
+        commands.append(server_command)
+
+        command = " && ".join(commands)
+        server = backend.get_process(command, cuda=cuda, network_disabled=True)
+        response = server.request({"candidates": candidates, "references": references})
+        return response["outputs"]
+
     def predict(
         self,
         candidate: TextType,
@@ -58,65 +168,41 @@ class BLEURT(Model):
             for references in references_list
         ]
 
-        with DockerContainer(self.image) as backend:
-            host_input_file = f"{backend.host_dir}/input.jsonl"
-            container_input_file = f"{backend.container_dir}/input.jsonl"
-
-            # BLEURT only runs with a single reference, so we write
-            # the candidate with each of its references on its own. Later
-            # the scores will be aggregated.
-            with open(host_input_file, "w") as out:
-                for candidate, references in zip(candidates, references_list):
-                    for reference in references:
-                        out.write(
-                            json.dumps(
-                                {
-                                    "candidate": candidate,
-                                    "reference": reference,
-                                }
-                            )
-                            + "\n"
-                        )
-
-            host_output_file = f"{backend.host_dir}/output.jsonl"
-            container_output_file = f"{backend.container_dir}/output.jsonl"
-
-            cuda = self.device != -1
-            commands = []
-            if cuda:
-                commands.append(f"export CUDA_VISIBLE_DEVICES={self.device}")
-            commands.append("cd bleurt")
-
-            score_command = (
-                f"python -m bleurt.score_files"
-                f"  -sentence_pairs_file {container_input_file}"
-                f"  -bleurt_checkpoint ../{self.model}"
-                f"  -scores_file {container_output_file}"
-                f"  -bleurt_batch_size {self.batch_size}"
-            )
-            if self.length_based_batching:
-                score_command += " -batch_same_length=True"
-            commands.append(score_command)
-
-            command = " && ".join(commands)
-            backend.run_command(
-                command=command,
-                cuda=cuda,
-                network_disabled=True,
-            )
+        # BLEURT only runs with a single reference, so we score
+        # the candidate with each of its references on its own. Later
+        # the scores will be aggregated.
+        pairs = [
+            (candidate, reference)
+            for candidate, references in zip(candidates, references_list)
+            for reference in references
+        ]
 
-            results = open(host_output_file, "r").read().splitlines()
-            results = list(map(float, results))
-
-            # Regroup by reference
-            micro_metrics = []
-            index = 0
-            for references in references_list:
-                scores = results[index : index + len(references)]
-                index += len(references)
-                micro_metrics.append(
-                    {"bleurt": {"mean": np.mean(scores), "max": np.max(scores)}}
+        # Identical pairs only need to be scored once
+        distinct_pairs, mapping = util.deduplicate(pairs)
+        flat_candidates = [candidate for candidate, _ in distinct_pairs]
+        flat_references = [reference for _, reference in distinct_pairs]
+        logger.info(f"Scoring {len(distinct_pairs)} candidate-reference pairs")
+
+        with self._get_container() as backend:
+            if self.server:
+                results = self._score_with_server(
+                    backend, flat_candidates, flat_references
+                )
+            else:
+                results = self._score_with_command(
+                    backend, flat_candidates, flat_references
                 )
+        results = util.expand_deduplicated(results, mapping)
+
+        # Regroup by reference
+        micro_metrics = []
+        index = 0
+        for references in references_list:
+            scores = results[index : index + len(references)]
+            index += len(references)
+            micro_metrics.append(
+                {"bleurt": {"mean": np.mean(scores), "max": np.max(scores)}}
+            )
 
-            macro_metrics = util.average_dicts(micro_metrics)
-            return macro_metrics, micro_metrics
+        macro_metrics = util.average_dicts(micro_metrics)
+        return macro_metrics, micro_metrics
@@ -14,25 +14,45 @@ logger = logging.getLogger(__name__)
 
 class _Prism(Model):
     def __init__(
-        self, image: str = DEFAULT_IMAGE, device: int = 0, language: str = "en"
+        self,
+        image: str = DEFAULT_IMAGE,
+        device: int = 0,
+        language: str = "en",
+        batch_size: int = None,
+        max_tokens: int = None,
     ):
+        """
+        Parameters
+        ----------
+        image : str, default=DEFAULT_IMAGE
+            The name of the Docker image
+        device : int, default=0
+            The ID of the GPU to use, -1 if CPU
+        language : str, default="en"
+            The language of the candidates and references
+        batch_size : int, default=None
+            The maximum number of (candidate, reference or source) pairs in a batch
+        max_tokens : int, default=None
+            The maximum number of tokens in a batch, including padding. If neither
+            `batch_size` nor `max_tokens` is set, the limits of the Prism model are used
+        """
         self.image = image
         self.device = device
         self.language = language
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
 
     @staticmethod
-    def _check_single_text(texts_list: List[List[TextType]]) -> List[TextType]:
-        single_texts = []
+    def _flatten_texts(texts_list: List[List[TextType]]) -> List[List[str]]:
+        flat_texts_list = []
         for texts in texts_list:
             if texts is None:
-                single_texts.append(None)
+                flat_texts_list.append(None)
             else:
-                if len(texts) != 1:
-                    raise Exception(
-                        f"Prism only supports single sources and references. Found: {len(texts)}"
-                    )
-                single_texts.append(texts[0])
-        return single_texts
+                if len(texts) == 0:
+                    raise Exception(f"Prism requires at least one source or reference")
+                flat_texts_list.append([util.flatten(text) for text in texts])
+        return flat_texts_list
 
     def predict_batch(
         self, inputs: List[Dict[str, Union[TextType, List[TextType]]]], **kwargs
@@ -45,41 +65,36 @@ class _Prism(Model):
             inp["references"] if "references" in inp else None for inp in inputs
         ]
 
-        # Prism only supports single sources and references
-        sources = self._check_single_text(sources_list)
-        references = self._check_single_text(references_list)
-
         # Ensure all are strings or None
         candidates = [util.flatten(candidate) for candidate in candidates]
-        sources = [
-            util.flatten(source) if source is not None else None for source in sources
-        ]
-        references = [
-            util.flatten(reference) if reference is not None else None
-            for reference in references
-        ]
+        sources_list = self._flatten_texts(sources_list)
+        references_list = self._flatten_texts(references_list)
 
         # Prism only supports having references xor sources. Ensure this is true
-        has_references = all(reference is not None for reference in references)
-        has_sources = all(source is not None for source in sources)
+        has_references = all(references is not None for references in references_list)
+        has_sources = all(sources is not None for sources in sources_list)
         if has_references and has_sources or (not has_references and not has_sources):
             raise Exception(
                 f"Prism supports having either input references xor sources, not both or neither."
             )
 
+        # Identical inputs only need to be scored once
+        distinct_inputs, mapping = util.deduplicate(
+            list(zip(candidates, sources_list, references_list))
+        )
+        logger.info(f"Scoring {len(distinct_inputs)} distinct inputs")
+
         with DockerContainer(self.image) as backend:
             host_input_file = f"{backend.host_dir}/input.jsonl"
             container_input_file = f"{backend.container_dir}/input.jsonl"
             with open(host_input_file, "w") as out:
-                for candidate, source, reference in zip(
-                    candidates, sources, references
-                ):
+                for candidate, sources, references in distinct_inputs:
                     out.write(
                         json.dumps(
                             {
                                 "candidate": candidate,
-                                "source": source,
-                                "reference": reference,
+                                "sources": sources,
+                                "references": references,
                             }
                         )
                         + "\n"
@@ -94,16 +109,24 @@ class _Prism(Model):
                 commands.append(f"export CUDA_VISIBLE_DEVICES={self.device}")
 
             commands.append("cd prism")
-            commands.append(
+            score_command = (
                 f"python score.py"
                 f"  --input-file {container_input_file}"
                 f"  --language {self.language}"
                 f"  --output-file {container_output_file}"
+                f"  --segment-scores-only"
             )
+            if self.batch_size is not None:
+                score_command += f" --batch-size {self.batch_size}"
+            if self.max_tokens is not None:
+                score_command += f" --max-tokens {self.max_tokens}"
+            commands.append(score_command)
 
             command = " && ".join(commands)
             backend.run_command(command=command, cuda=cuda, network_disabled=True)
-            micro_metrics = read_jsonl_file(host_output_file)
+            micro_metrics = util.expand_deduplicated(
+                read_jsonl_file(host_output_file), mapping
+            )
             macro_metrics = util.average_dicts(micro_metrics)
             return macro_metrics, micro_metrics
 
@@ -164,29 +187,15 @@ class Prism(_Prism):
     def predict_batch(
         self, inputs: List[Dict[str, Union[TextType, List[TextType]]]], **kwargs
     ) -> Tuple[MetricsType, List[MetricsType]]:
-        logger.info(f"Calculating Prism for {len(inputs)} inputs")
-
-        candidates = [inp["candidate"] for inp in inputs]
-        references_list = [inp["references"] for inp in inputs]
-
-        # Create an input for each reference
-        indices = []
-        unrolled_inputs = []
-        for i, (candidate, references) in enumerate(zip(candidates, references_list)):
-            for reference in references:
-                indices.append(i)
-                unrolled_inputs.append(
-                    {"candidate": candidate, "references": [reference]}
-                )
-
-        # Score using the base class
-        _, unrolled_micro = super().predict_batch(unrolled_inputs)
-
-        # Re-aggregate based on reference group
-        micro = util.aggregate_metrics_by_group(indices, unrolled_micro)
-        macro = util.average_dicts(micro)
-
-        return macro, micro
+        # All of the references are scored in one call to the base class, which
+        # averages each candidate's scores over its references
+        return super().predict_batch(
+            [
+                {"candidate": inp["candidate"], "references": inp["references"]}
+                for inp in inputs
+            ],
+            **kwargs,
+        )
 
 
 @Model.register(f"{MODEL_NAME}-prism-src")
@@ -205,24 +214,12 @@ class PrismSrc(_Prism):
     def predict_batch(
         self, inputs: List[Dict[str, Union[TextType, List[TextType]]]], **kwargs
     ) -> Tuple[MetricsType, List[MetricsType]]:
-        logger.info(f"Calculating Prism for {len(inputs)} inputs")
-
-        candidates = [inp["candidate"] for inp in inputs]
-        sources_list = [inp["sources"] for inp in inputs]
-
-        # Create an input for each reference
-        indices = []
-        unrolled_inputs = []
-        for i, (candidate, sources) in enumerate(zip(candidates, sources_list)):
-            for source in sources:
-                indices.append(i)
-                unrolled_inputs.append({"candidate": candidate, "sources": [source]})
-
-        # Score using the base class
-        _, unrolled_micro = super().predict_batch(unrolled_inputs)
-
-        # Re-aggregate based on source group
-        micro = util.aggregate_metrics_by_group(indices, unrolled_micro)
-        macro = util.average_dicts(micro)
-
-        return macro, micro
+        # All of the sources are scored in one call to the base class, which
+        # averages each candidate's scores over its sources
+        return super().predict_batch(
+            [
+                {"candidate": inp["candidate"], "sources": inp["sources"]}
+                for inp in inputs
+            ],
+            **kwargs,
+        )
@@ -1,17 +1,17 @@
-import json
 import logging
-import os
-from typing import Dict, List, Tuple, Union
+from typing import ContextManager, Dict, List, Tuple, Union
 
-from repro.common import TemporaryDirectory, util
-from repro.common.docker import make_volume_map, run_command
-from repro.common.io import read_jsonl_file
+from repro.common import REPRO_CONFIG, util
+from repro.common.docker import DockerContainer, get_container_pool
 from repro.data.types import MetricsType, TextType
 from repro.models import Model
 from repro.models.zhang2020 import DEFAULT_IMAGE, MODEL_NAME
 
 logger = logging.getLogger(__name__)
 
+# The path where the embedding store is mounted in the container
+EMBEDDING_STORE_DIR = "/embeddings"
+
 
 @Model.register(f"{MODEL_NAME}-bertscore")
 class BERTScore(Model):
@@ -21,13 +21,141 @@ class BERTScore(Model):
         model: str = None,
         device: int = 0,
         batch_size: int = 64,
+        max_tokens: int = None,
         language: str = "en",
+        persistent: bool = False,
+        idle_timeout: float = None,
+        server: bool = False,
+        cache_embeddings: bool = False,
+        embeddings_dir: str = None,
     ):
+        """
+        Parameters
+        ----------
+        image : str, default=DEFAULT_IMAGE
+            The name of the Docker image
+        model : str, default=None
+            The name of the BERT model to use. If `None`, the default for the language is used
+        device : int, default=0
+            The ID of the GPU to use, -1 if CPU
+        batch_size : int, default=64
+            The batch size for the BERT model
+        max_tokens : int, default=None
+            If set, the inputs are batched so each batch has at most this many tokens
+            including padding instead of `batch_size` inputs. Short inputs are then
+            scored in larger batches and long inputs in smaller ones. In both cases, the
+            inputs are grouped into batches of similar lengths
+        language : str, default="en"
+            The language of the texts
+        persistent : bool, default=False
+            Indicates whether a warm Docker container from the process-wide container pool
+            should be used for each call to `predict_batch` instead of starting a new one
+        idle_timeout : float, default=None
+            The number of seconds the persistent container may be idle before it is stopped
+        server : bool, default=False
+            Indicates the BERT model should be loaded once by a server process inside of
+            a persistent container and reused across calls to `predict_batch`. This
+            implies `persistent=True`
+        cache_embeddings : bool, default=False
+            Indicates whether the BERT embeddings of the texts should be saved to an
+            on-disk store keyed by the model, layer, and text so that texts which were
+            already scored (e.g., references shared by many systems) are not encoded
+            again. The embeddings are stored as float16, so all of the embeddings are
+            rounded to float16 if this is `True`, which changes the scores slightly.
+        embeddings_dir : str, default=None
+            The directory of the embedding store. Defaults to "embeddings/zhang2020"
+            in the "cache_dir" of the repro config
+        """
         self.image = image
         self.model = model
         self.device = device
         self.batch_size = batch_size
+        self.max_tokens = max_tokens
         self.language = language
+        self.persistent = persistent
+        self.idle_timeout = idle_timeout
+        self.server = server
+        self.cache_embeddings = cache_embeddings
+        self.embeddings_dir = (
+            embeddings_dir or f"{REPRO_CONFIG['cache_dir']}/embeddings/{MODEL_NAME}"
+        )
+
+    def _get_mounts(self) -> Dict[str, str]:
+        if self.cache_embeddings:
+            return {self.embeddings_dir: EMBEDDING_STORE_DIR}
+        return {}
+
+    def _get_container(self) -> ContextManager[DockerContainer]:
+        if self.persistent or self.server:
+            return get_container_pool().container(
+                self.image,
+                device=self.device,
+                idle_timeout=self.idle_timeout,
+                mounts=self._get_mounts(),
+                owner=self,
+            )
+        return DockerContainer(self.image, mounts=self._get_mounts())
+
+    def close(self) -> None:
+        if self.persistent or self.server:
+            get_container_pool().close(owner=self)
+
+    def _get_score_command(self, *args: str) -> Tuple[str, bool]:
+        cuda = self.device != -1
+        commands = []
+        if cuda:
+            commands.append(f"export CUDA_VISIBLE_DEVICES={self.device}")
+            predict_device = 0
+        else:
+            predict_device = -1
+
+        score_command = (
+            f"python score.py"
+            f"  --cuda-device {predict_device}"
+            f"  --batch-size {self.batch_size}"
+        )
+        if self.max_tokens is not None:
+            score_command += f"  --max-tokens {self.max_tokens}"
+        if self.model is not None:
+            score_command += f" --model-name {self.model}"
+        if self.language is not None:
+            score_command += f"  --language {self.language}"
+        if self.cache_embeddings:
+            score_command += f"  --embedding-store {EMBEDDING_STORE_DIR}"
+        for arg in args:
+            score_command += f"  {arg}"
+        commands.append(score_command)
+
+        command = " && ".join(commands)
+        return command, cuda
+
+    def _score_with_command(
+        self,
+        backend: DockerContainer,
+        candidates: List[str],
+        references_list: List[List[str]],
+    ) -> List[Dict[str, float]]:
+        # The inputs and scores are streamed through the container's
+        # stdin and stdout instead of being written to files
+        records = (
+            {"candidate": candidate, "references": references}
+            for candidate, references in zip(candidates, references_list)
+        )
+        command, cuda = self._get_score_command("--stream")
+        return list(backend.stream_command(command, records, cuda=cuda))
+
+    def _score_with_server(
+        self,
+        backend: DockerContainer,
+        candidates: List[str],
+        references_list: List[List[str]],
+    ) -> List[Dict[str, float]]:
+        command, cuda = self._get_score_command("--server")
+        server = backend.get_process(command, cuda=cuda)
+        response = server.request(
+            {"candidates": candidates, "references_list": references_list}
+        )
+        return response["outputs"]
 
     def predict(
         self,
@@ -63,71 +191,34 @@ class BERTScore(Model):
             candidates, references_list
         )
 
-        with TemporaryDirectory() as temp:
-            host_input_dir = f"{temp}/input"
-            host_output_dir = f"{temp}/output"
-            volume_map = make_volume_map(host_input_dir, host_output_dir)
-            container_input_dir = volume_map[host_input_dir]
-            container_output_dir = volume_map[host_output_dir]
-
-            host_input_file = f"{host_input_dir}/input.jsonl"
-            container_input_file = f"{container_input_dir}/input.jsonl"
-            os.makedirs(host_input_dir)
-            with open(host_input_file, "w") as out:
-                for candidate, references in zip(candidates, references_list):
-                    out.write(
-                        json.dumps(
-                            {
-                                "candidate": candidate,
-                                "references": references,
-                            }
-                        )
-                        + "\n"
-                    )
-
-            host_output_file = f"{host_output_dir}/output.jsonl"
-            container_output_file = f"{container_output_dir}/output.jsonl"
-
-            cuda = self.device != -1
-            commands = []
-            if cuda:
-                commands.append(f"export CUDA_VISIBLE_DEVICES={self.device}")
-                predict_device = 0
+        # Identical inputs, such as a candidate repeated for every reference in a
+        # batch, are only scored once
+        distinct_inputs, mapping = util.deduplicate(
+            list(zip(candidates, references_list))
+        )
+        candidates = [candidate for candidate, _ in distinct_inputs]
+        references_list = [references for _, references in distinct_inputs]
+
+        with self._get_container() as backend:
+            if self.server:
+                scores_list = self._score_with_server(
+                    backend, candidates, references_list
+                )
             else:
-                predict_device = -1
-
-            score_command = (
-                f"python score.py"
-                f"  --input-file {container_input_file}"
-                f"  --cuda-device {predict_device}"
-                f"  --batch-size {self.batch_size}"
-                f"  --output-file {container_output_file}"
-            )
-            if self.model is not None:
-                score_command += f" --model-name {self.model}"
-            if self.language is not None:
-                score_command += f"  --language {self.language}"
-            commands.append(score_command)
-
-            command = " && ".join(commands)
-            os.makedirs(host_output_dir)
-            run_command(
-                self.image,
-                command,
-                volume_map=volume_map,
-                cuda=cuda,
-            )
-
-            micro_metrics = read_jsonl_file(host_output_file)
-            micro_metrics = [{"bertscore": scores} for scores in micro_metrics]
-
-            # Insert default metric values for inputs which were empty. All of the
-            # scored inputs should have the same keys, so we can get a default set
-            # of metrics from just the first set of metrics
-            empty_value = util.get_default_dict(micro_metrics[0], default=0.0)
-            micro_metrics = util.insert_empty_values(
-                micro_metrics, empty_indices, empty_value
-            )
+                scores_list = self._score_with_command(
+                    backend, candidates, references_list
+                )
+        scores_list = util.expand_deduplicated(scores_list, mapping)
+
+        micro_metrics = [{"bertscore": scores} for scores in scores_list]
+
+        # Insert default metric values for inputs which were empty. All of the
+        # scored inputs should have the same keys, so we can get a default set
+        # of metrics from just the first set of metrics
+        empty_value = util.get_default_dict(micro_metrics[0], default=0.0)
+        micro_metrics = util.insert_empty_values(
+            micro_metrics, empty_indices, empty_value
+        )
 
-            macro_metrics = util.average_dicts(micro_metrics)
-            return macro_metrics, micro_metrics
+        macro_metrics = util.average_dicts(micro_metrics)
+        return macro_metrics, micro_metrics
@@ -1,9 +1,10 @@
 import json
 import logging
-from typing import Dict, List, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
 
-from repro.common import util
-from repro.common.docker import DockerContainer
+from repro.common import REPRO_CONFIG, util
+from repro.common.cache import ResultCache, hash_object
+from repro.common.docker import DockerContainer, get_image_digest
 from repro.data.types import MetricsType, TextType
 from repro.models import Model
 from repro.models.zhang2021 import DEFAULT_IMAGE, MODEL_NAME
@@ -21,10 +22,44 @@ class Lite3Pyramid(Model):
         image: str = DEFAULT_IMAGE,
         device: int = 0,
         model: str = None,
+        cache_stus: bool = True,
     ):
+        """
+        Parameters
+        ----------
+        image : str, default=DEFAULT_IMAGE
+            The name of the Docker image
+        device : int, default=0
+            The ID of the GPU to use, -1 if CPU
+        model : str, default=None
+            The name of the model which scores the STUs. If `None`, the default is used
+        cache_stus : bool, default=True
+            Indicates whether the STUs which are extracted by `extract_stus` should be
+            saved to `stus.sqlite` in the repro `cache_dir`, keyed by the Docker image ID,
+            `use_coref`, and the text, so the STUs of a reference are only extracted once
+            even if it is scored against many different candidates in different calls
+        """
         self.image = image
         self.device = device
         self.model = model
+        self.cache_stus = cache_stus
+        self.cache = None
+        if cache_stus:
+            self.cache = ResultCache(f"{REPRO_CONFIG['cache_dir']}/stus.sqlite")
+
+    def _get_config_key(self, use_coref: bool) -> Optional[str]:
+        # Returns `None` if the STUs cannot be cached because the
+        # image does not exist locally yet
+        image_digest = get_image_digest(self.image)
+        if image_digest is None:
+            return None
+        return hash_object(
+            {
+                "model": f"{MODEL_NAME}-stus",
+                "image_digest": image_digest,
+                "use_coref": use_coref,
+            }
+        )
 
     def extract_stus(
         self, texts: Union[str, List[str]], use_coref: bool
@@ -33,6 +68,43 @@ class Lite3Pyramid(Model):
         if is_single_input:
             texts = [texts]
 
+        # Only the texts which are not in the cache are passed to the extraction
+        stus_dict = {}
+        config_key = None
+        if self.cache is not None:
+            config_key = self._get_config_key(use_coref)
+        if config_key is not None:
+            keys = {hash_object([config_key, text]): text for text in texts}
+            cached = self.cache.get_many(keys.keys())
+            stus_dict = {keys[key]: stus for key, stus in cached.items()}
+
+        missing = list(dict.fromkeys(text for text in texts if text not in stus_dict))
+
+        if len(missing) > 0:
+            extracted = self._run_stu_extraction(missing, use_coref)
+            if len(extracted) != len(missing):
+                raise Exception(
+                    f"STU extraction returned {len(extracted)} instances but expected {len(missing)}"
+                )
+            stus_dict.update(zip(missing, extracted))
+
+            # The image may have been pulled by the extraction
+            if self.cache is not None:
+                config_key = config_key or self._get_config_key(use_coref)
+                if config_key is not None:
+                    self.cache.put_many(
+                        {
+                            hash_object([config_key, text]): stus
+                            for text, stus in zip(missing, extracted)
+                        }
+                    )
+
+        # Make a copy so the STUs aren't the same object in case any
+        # downstream processing assumes they aren't
+        outputs = [stus_dict[text].copy() for text in texts]
+        return outputs[0] if is_single_input else outputs
+
+    def _run_stu_extraction(self, texts: List[str], use_coref: bool) -> List[List[str]]:
         logger.info(f"Extracting STUs for {len(texts)} inputs")
         with DockerContainer(self.image) as backend:
             host_summaries_file = f"{backend.host_dir}/summaries.txt"
@@ -84,8 +156,7 @@ class Lite3Pyramid(Model):
                 for line in f:
                     stus = line.strip().split("\t")
                     outputs.append(stus)
-
-            return outputs[0] if is_single_input else outputs
+            return outputs
 
     def _assert_valid_inputs(self, references_list: List, units_lists: List) -> None:
         # The inputs must either have references xor units, and all input instances
@@ -2,7 +2,7 @@ import json
 import logging
 from typing import Dict, List, Optional, Tuple, Union
 
-from repro.common import util
+from repro.common import REPRO_CONFIG, util
 from repro.common.docker import DockerContainer
 from repro.common.io import read_jsonl_file
 from repro.data.types import MetricsType, TextType
@@ -11,6 +11,9 @@ from repro.models.zhao2019 import DEFAULT_IMAGE, MODEL_NAME
 
 logger = logging.getLogger(__name__)
 
+# The path where the embedding store is mounted in the container
+EMBEDDING_STORE_DIR = "/embeddings"
+
 
 @Model.register(f"{MODEL_NAME}-moverscore")
 class MoverScore(Model):
@@ -19,10 +22,35 @@ class MoverScore(Model):
         image: str = DEFAULT_IMAGE,
         model: str = "distilbert-base-uncased",
         device: int = 0,
+        cache_embeddings: bool = False,
+        embeddings_dir: str = None,
     ):
+        """
+        Parameters
+        ----------
+        image : str, default=DEFAULT_IMAGE
+            The name of the Docker image
+        model : str, default="distilbert-base-uncased"
+            The name of the BERT model to use
+        device : int, default=0
+            The ID of the GPU to use, -1 if CPU
+        cache_embeddings : bool, default=False
+            Indicates whether the BERT embeddings of the texts should be saved to an
+            on-disk store keyed by the model, layer, and text so that texts which were
+            already scored (e.g., references shared by many systems) are not encoded
+            again. The embeddings are stored as float16, so all of the embeddings are
+            rounded to float16 if this is `True`, which changes the scores slightly.
+        embeddings_dir : str, default=None
+            The directory of the embedding store. Defaults to "embeddings/zhao2019"
+            in the "cache_dir" of the repro config
+        """
         self.image = image
         self.device = device
         self.model = model
+        self.cache_embeddings = cache_embeddings
+        self.embeddings_dir = (
+            embeddings_dir or f"{REPRO_CONFIG['cache_dir']}/embeddings/{MODEL_NAME}"
+        )
 
     def predict(
         self,
@@ -55,11 +83,21 @@ class MoverScore(Model):
             for references in references_list
         ]
 
-        with DockerContainer(self.image) as backend:
+        # All of the inputs are scored in one batched pass, so identical
+        # inputs only need to be included once
+        distinct_inputs, mapping = util.deduplicate(
+            list(zip(candidates, references_list))
+        )
+
+        mounts = {}
+        if self.cache_embeddings:
+            mounts[self.embeddings_dir] = EMBEDDING_STORE_DIR
+
+        with DockerContainer(self.image, mounts=mounts) as backend:
             host_input_file = f"{backend.host_dir}/input.jsonl"
             container_input_file = f"{backend.container_dir}/input.jsonl"
             with open(host_input_file, "w") as out:
-                for candidate, references in zip(candidates, references_list):
+                for candidate, references in distinct_inputs:
                     out.write(
                         json.dumps(
                             {
@@ -87,12 +125,14 @@ class MoverScore(Model):
             )
             if batch_size is not None:
                 score_command += f" --batch-size {batch_size}"
+            if self.cache_embeddings:
+                score_command += f" --embedding-store {EMBEDDING_STORE_DIR}"
             commands.append(score_command)
 
             command = " && ".join(commands)
             backend.run_command(command=command, cuda=cuda)
 
-            micro = read_jsonl_file(host_output_file)
+            micro = util.expand_deduplicated(read_jsonl_file(host_output_file), mapping)
             macro = util.average_dicts(micro)
             return macro, micro
 
@@ -1,7 +1,15 @@
+import json
+import os
 import unittest
 from typing import List
 
-from repro.commands.predict import predict_with_model
+from repro.commands.predict import (
+    get_progress_file,
+    predict_in_chunks,
+    predict_with_model,
+)
+from repro.common import TemporaryDirectory
+from repro.data.output_writers import DefaultOutputWriter, MetricsOutputWriter
 from repro.models import Model
 
 
@@ -67,3 +75,94 @@ class TestPredict(unittest.TestCase):
             model, instances, kwargs='{"mode": "concatenate"}'
         )
         assert predictions == ["abc1", "def2", "ghi3"]
+
+    def test_predict_in_chunks(self):
+        model = _Model()
+        instances = [
+            {"instance_id": str(i), "input1": "abc", "input2": i} for i in range(10)
+        ]
+        expected = [f"cba{i}" for i in range(10)]
+
+        with TemporaryDirectory() as temp_dir:
+            output_file = f"{temp_dir}/output.jsonl"
+            predict_in_chunks(
+                model, instances, DefaultOutputWriter(), output_file, "test-model", 3
+            )
+            with open(output_file, "r") as f:
+                predictions = [json.loads(line)["prediction"] for line in f]
+            assert predictions == expected
+            with open(get_progress_file(output_file), "r") as f:
+                assert len(f.readlines()) == 4
+
+            # Writers without one prediction per instance are not supported
+            with self.assertRaises(ValueError):
+                predict_in_chunks(
+                    model, instances, MetricsOutputWriter(), output_file, "test", 3
+                )
+
+    def test_predict_in_chunks_resume(self):
+        class _FailingModel(_Model):
+            def predict_batch(self, inputs: List, **kwargs):
+                if any(inp["input2"] == 7 for inp in inputs):
+                    raise Exception("Failed")
+                return super().predict_batch(inputs, **kwargs)
+
+        instances = [
+            {"instance_id": str(i), "input1": "abc", "input2": i} for i in range(10)
+        ]
+        # Instance IDs do not have to be unique
+        instances.append({"instance_id": "0", "input1": "abc", "input2": 10})
+        expected = [f"cba{i}" for i in range(11)]
+
+        with TemporaryDirectory() as temp_dir:
+            output_file = f"{temp_dir}/output.jsonl"
+            with self.assertRaises(Exception):
+                predict_in_chunks(
+                    _FailingModel(),
+                    instances,
+                    DefaultOutputWriter(),
+                    output_file,
+                    "test-model",
+                    3,
+                )
+
+            # Simulate a crash while the output for a chunk was being written
+            with open(output_file, "a") as out:
+                out.write('{"instance_id": "6", "prediction"')
+
+            # Only the remaining instances should be passed to the model
+            seen = []
+
+            class _RecordingModel(_Model):
+                def predict_batch(self, inputs: List, **kwargs):
+                    seen.extend(inp["input2"] for inp in inputs)
+                    return super().predict_batch(inputs, **kwargs)
+
+            predict_in_chunks(
+                _RecordingModel(),
+                instances,
+                DefaultOutputWriter(),
+                output_file,
+                "test-model",
+                3,
+                resume=True,
+            )
+            assert seen == [6, 7, 8, 9, 10]
+
+            with open(output_file, "r") as f:
+                predictions = [json.loads(line)["prediction"] for line in f]
+            assert predictions == expected
+
+            # Resuming a finished run does nothing
+            seen.clear()
+            predict_in_chunks(
+                _RecordingModel(),
+                instances,
+                DefaultOutputWriter(),
+                output_file,
+                "test-model",
+                3,
+                resume=True,
+            )
+            assert seen == []
+            assert os.path.getsize(output_file) > 0
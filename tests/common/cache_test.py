@@ -0,0 +1,43 @@
+import unittest
+
+from repro.common import TemporaryDirectory
+from repro.common.cache import ResultCache, hash_object
+
+
+class TestCache(unittest.TestCase):
+    def test_hash_object(self):
+        assert hash_object({"a": 1, "b": [1, 2]}) == hash_object({"b": [1, 2], "a": 1})
+        assert hash_object({"a": 1}) != hash_object({"a": 2})
+        assert hash_object(["text"]) != hash_object("text")
+        # The digest is stable across processes and runs
+        assert hash_object("text") == "ab28bd09bca0612a6098ff4e1b85b735"
+
+    def test_result_cache(self):
+        with TemporaryDirectory() as temp_dir:
+            cache = ResultCache(f"{temp_dir}/cache.sqlite")
+            assert cache.get_many(["a", "b"]) == {}
+
+            cache.put_many({"a": {"f1": 1.0}, "b": [1, 2]})
+            assert cache.get_many(["a", "b", "c"]) == {"a": {"f1": 1.0}, "b": [1, 2]}
+            assert len(cache) == 2
+
+            # The results persist across instances
+            cache = ResultCache(f"{temp_dir}/cache.sqlite")
+            assert cache.get_many(["a"]) == {"a": {"f1": 1.0}}
+
+            cache.clear()
+            assert len(cache) == 0
+
+    def test_result_cache_eviction(self):
+        with TemporaryDirectory() as temp_dir:
+            # Each value is 10 bytes once serialized
+            cache = ResultCache(f"{temp_dir}/cache.sqlite", max_size=25)
+            cache.put_many({"a": "12345678"})
+            cache.put_many({"b": "12345678"})
+            # Accessing "a" makes "b" the least-recently used
+            cache.get_many(["a"])
+            cache.put_many({"c": "12345678"})
+            assert set(cache.get_many(["a", "b", "c"]).keys()) == {"a", "c"}
+
+        with self.assertRaises(ValueError):
+            ResultCache("cache.sqlite", max_size=0)
@@ -1,4 +1,7 @@
 import json
+import os
+import threading
+import time
 import unittest
 
 from repro.common import TemporaryDirectory, docker
@@ -29,6 +32,24 @@ class TestDocker(unittest.TestCase):
         docker.remove_image(image)
         assert not docker.image_exists(image)
 
+    def test_get_image_digest(self):
+        image = "python-3.8"
+        if docker.image_exists(image):
+            docker.remove_image(image)
+        assert docker.get_image_digest(image) is None
+
+        docker.build_image(f"{FIXTURES_ROOT}/dockerfiles/python-3.8", image)
+        digest = docker.get_image_digest(image)
+        assert digest is not None
+        # The cached digest is returned until the image is changed
+        assert docker.get_image_digest(image) == digest
+
+        docker.remove_image(image)
+        assert docker.get_image_digest(image) is None
+
+    def test_get_client(self):
+        assert docker.get_client() is docker.get_client()
+
     def test_build_image_build_args(self):
         """
         Tests whether `build_image` correctly passes build arguments (roughly equivalent
@@ -198,6 +219,318 @@ class TestDocker(unittest.TestCase):
                 )
                 assert open(f"{temp}/results.txt").read().strip() == "Offline"
 
+    def test_stream_command(self):
+        """
+        Tests that records are streamed through the container's stdin and stdout
+        in both a new container and a persistent container.
+        """
+        image = "python-3.8"
+        if not docker.image_exists(image):
+            docker.build_image(
+                f"{FIXTURES_ROOT}/dockerfiles/python-3.8", image, silent=True
+            )
+
+        script = (
+            "import json, sys\n"
+            "for line in sys.stdin:\n"
+            "    data = json.loads(line)\n"
+            "    print(json.dumps(data['value'] * 10), flush=True)\n"
+        )
+        command = f'python -c "{script}"'
+        records = [{"value": value} for value in range(1000)]
+        expected = [value * 10 for value in range(1000)]
+
+        assert list(docker.stream_command(image, command, iter(records))) == expected
+
+        with docker.DockerContainer(image) as backend:
+            assert list(backend.stream_command(command, iter(records))) == expected
+
+        container = docker.DockerContainer(image, persistent=True)
+        try:
+            with container as backend:
+                for _ in range(2):
+                    outputs = backend.stream_command(command, iter(records))
+                    assert list(outputs) == expected
+        finally:
+            container.close()
+
+        # A failing command raises an exception
+        with self.assertRaises(Exception):
+            list(docker.stream_command(image, "exit 1", iter(records)))
+
+
+class TestDockerContainer(unittest.TestCase):
+    def test_persistent_container(self):
+        """
+        Tests that a persistent container reuses the same container across commands
+        by writing a file to a container-only directory and reading it back in a later
+        command. The mounted host directory should be cleared between `with` blocks.
+        """
+        image = "python-3.8"
+        if not docker.image_exists(image):
+            docker.build_image(
+                f"{FIXTURES_ROOT}/dockerfiles/python-3.8", image, silent=True
+            )
+
+        container = docker.DockerContainer(image, persistent=True)
+        try:
+            with container as backend:
+                backend.run_command(command="echo persisted > /persisted.txt")
+                with open(f"{backend.host_dir}/input.txt", "w") as out:
+                    out.write("input")
+                output = backend.run_command(
+                    command=f"cat {backend.container_dir}/input.txt", silent=True
+                )
+                assert output.strip() == "input"
+                host_dir = backend.host_dir
+
+            assert container.is_running
+            assert os.listdir(host_dir) == []
+
+            with container as backend:
+                output = backend.run_command(command="cat /persisted.txt", silent=True)
+                assert output.strip() == "persisted"
+        finally:
+            container.close()
+
+        assert not container.is_running
+        assert not os.path.exists(host_dir)
+
+    def test_persistent_container_idle_timeout(self):
+        image = "python-3.8"
+        if not docker.image_exists(image):
+            docker.build_image(
+                f"{FIXTURES_ROOT}/dockerfiles/python-3.8", image, silent=True
+            )
+
+        container = docker.DockerContainer(image, persistent=True, idle_timeout=0.1)
+        try:
+            with container as backend:
+                backend.run_command(command="echo persisted > /persisted.txt")
+            assert container.is_running
+            time.sleep(1)
+            assert not container.is_running
+
+            # The container is restarted, so the file no longer exists
+            with container as backend:
+                output = backend.run_command(
+                    command="ls /persisted.txt || echo missing", silent=True
+                )
+                assert "missing" in output
+        finally:
+            container.close()
+
+    def test_get_process(self):
+        """
+        Tests that a process started with `get_process` answers json requests
+        over stdin and stdout and that the same process is reused.
+        """
+        image = "python-3.8"
+        if not docker.image_exists(image):
+            docker.build_image(
+                f"{FIXTURES_ROOT}/dockerfiles/python-3.8", image, silent=True
+            )
+
+        script = (
+            "import json, sys\n"
+            "for line in sys.stdin:\n"
+            "    data = json.loads(line)\n"
+            "    sys.stderr.write('logging\\n')\n"
+            "    print(json.dumps({'outputs': data['value'] * 10}), flush=True)\n"
+        )
+        command = f'python -c "{script}"'
+
+        container = docker.DockerContainer(image, persistent=True)
+        try:
+            with container as backend:
+                process = backend.get_process(command)
+                assert process.request({"value": 1}) == {"outputs": 10}
+                assert process.request({"value": 2}) == {"outputs": 20}
+                assert backend.get_process(command) is process
+        finally:
+            container.close()
+
+        assert not process.is_running
+
+        # Processes can only be run in persistent containers
+        with docker.DockerContainer(image) as backend:
+            with self.assertRaises(Exception):
+                backend.get_process(command)
+
+    def test_container_mounts(self):
+        with TemporaryDirectory() as temp:
+            mount_dir = f"{temp}/mount"
+            with docker.DockerContainer(
+                "image", mounts={mount_dir: "/data"}
+            ) as backend:
+                # The mounted directory is created and mapped in addition to the temp dir
+                assert os.path.isdir(mount_dir)
+                assert backend.volume_map[mount_dir] == "/data"
+                assert backend.volume_map[backend.host_dir] == backend.container_dir
+                with open(f"{mount_dir}/file.txt", "w") as out:
+                    out.write("test")
+
+            # The mounted directory is not deleted with the temp dir
+            assert os.path.exists(f"{mount_dir}/file.txt")
+
+    def test_read_only_volumes(self):
+        volumes = docker._get_volumes({"/host1": "/data1", "/host2": "/data2:ro"})
+        assert volumes == {
+            "/host1": {"bind": "/data1", "mode": "rw"},
+            "/host2": {"bind": "/data2", "mode": "ro"},
+        }
+
+    def test_persistent_container_requires_with(self):
+        container = docker.DockerContainer("python-3.8", persistent=True)
+        with self.assertRaises(Exception):
+            container.run_command(command="echo test")
+        container.close()
+
+
+class TestContainerPool(unittest.TestCase):
+    def test_reuse(self):
+        pool = docker.ContainerPool()
+        container1 = pool.acquire("image", device=0)
+        assert container1.persistent
+        pool.release(container1)
+
+        # The same configuration gets the same warm container
+        container2 = pool.acquire("image", device=0)
+        assert container2 is container1
+
+        # A different configuration gets a new container
+        container3 = pool.acquire("image", device=1)
+        assert container3 is not container1
+        pool.release(container2)
+        pool.release(container3)
+        pool.close()
+
+    def test_mounts(self):
+        pool = docker.ContainerPool()
+        container1 = pool.acquire("image", mounts={"/host": "/data"})
+        assert container1.mounts == {"/host": "/data"}
+        pool.release(container1)
+
+        # Containers are only reused for the same mounts
+        container2 = pool.acquire("image")
+        assert container2 is not container1
+        container3 = pool.acquire("image", mounts={"/host": "/data"})
+        assert container3 is container1
+        pool.release(container2)
+        pool.release(container3)
+        pool.close()
+
+    def test_close_owner(self):
+        class _Owner:
+            pass
+
+        owner1, owner2, owner3 = _Owner(), _Owner(), _Owner()
+        pool = docker.ContainerPool()
+        shared = pool.acquire("image", owner=owner1)
+        pool.release(shared)
+        assert pool.acquire("image", owner=owner2) is shared
+        pool.release(shared)
+        other = pool.acquire("image", device=0, owner=owner3)
+        pool.release(other)
+
+        # The shared container is still used by `owner2`
+        pool.close(owner=owner1)
+        assert pool.acquire("image") is shared
+        pool.release(shared)
+
+        # Only the containers without any other owner are stopped
+        pool.close(owner=owner2)
+        assert shared not in pool._keys
+        assert other in pool._keys
+
+        # A closed owner can acquire new containers
+        container = pool.acquire("image", owner=owner1)
+        assert container is not shared
+        pool.release(container)
+        pool.close(owner=owner1)
+        assert container not in pool._keys
+        assert other in pool._keys
+        pool.close()
+        assert len(pool._keys) == 0
+
+    def test_max_containers_per_image(self):
+        pool = docker.ContainerPool(max_containers_per_image=1)
+        container1 = pool.acquire("image", device=0)
+
+        # The limit is reached and the container is in use
+        with self.assertRaises(Exception):
+            pool.acquire("image", device=1, timeout=0.1)
+
+        # Other images are not limited
+        container2 = pool.acquire("other", device=1)
+        pool.release(container2)
+
+        # Once released, the idle container is replaced by one for the new device
+        pool.release(container1)
+        container3 = pool.acquire("image", device=1)
+        assert container3 is not container1
+        pool.release(container3)
+        pool.close()
+
+    def test_max_containers_per_device(self):
+        pool = docker.ContainerPool(max_containers_per_device=1)
+        container1 = pool.acquire("image1", device=0)
+
+        with self.assertRaises(Exception):
+            pool.acquire("image2", device=0, timeout=0.1)
+
+        # The CPU and other GPUs are not limited
+        container2 = pool.acquire("image2", device=-1)
+        container3 = pool.acquire("image2", device=-1)
+        container4 = pool.acquire("image2", device=1)
+        for container in [container1, container2, container3, container4]:
+            pool.release(container)
+        pool.close()
+
+    def test_waiting(self):
+        # A caller waits until another caller releases its container
+        pool = docker.ContainerPool(max_containers_per_image=1)
+        container = pool.acquire("image")
+
+        acquired = []
+
+        def _acquire():
+            acquired.append(pool.acquire("image"))
+
+        thread = threading.Thread(target=_acquire)
+        thread.start()
+        time.sleep(0.1)
+        assert len(acquired) == 0
+
+        pool.release(container)
+        thread.join(timeout=5)
+        assert acquired == [container]
+        pool.release(container)
+        pool.close()
+
+    def test_context_manager(self):
+        pool = docker.ContainerPool(max_containers_per_image=1)
+        with pool.container("image") as backend:
+            assert backend.host_dir is not None
+            with self.assertRaises(Exception):
+                pool.acquire("image", timeout=0.1)
+
+        # The container was released
+        container = pool.acquire("image", timeout=0.1)
+        assert container is backend
+        pool.release(container)
+        pool.close()
+
+    def test_input_validation(self):
+        with self.assertRaises(ValueError):
+            docker.ContainerPool(max_containers_per_image=0)
+        with self.assertRaises(ValueError):
+            docker.ContainerPool(max_containers_per_device=-1)
+
+        pool = docker.ContainerPool()
+        with self.assertRaises(Exception):
+            pool.release(docker.ContainerPool().acquire("image"))
+
 
 class TestDockerTestContextManager(unittest.TestCase):
     def test_docker_context_manager(self):
@@ -0,0 +1,32 @@
+import unittest
+
+from repro.common import TemporaryDirectory
+from repro.models.lin2004 import DEFAULT_IMAGE
+from repro.models.lin2004.commands import get_sentence_splitter, sentence_split
+
+
+class TestSentenceSplitter(unittest.TestCase):
+    def test_sentence_splitter(self):
+        texts = ["The first sentence. The second.", "One sentence", "One sentence"]
+        expected = sentence_split(DEFAULT_IMAGE, texts)
+        with TemporaryDirectory() as temp_dir:
+            splitter = get_sentence_splitter(
+                DEFAULT_IMAGE, cache_file=f"{temp_dir}/sentences.sqlite"
+            )
+            assert splitter.split(texts) == expected
+            # The duplicate text is only cached once
+            assert len(splitter.cache) == 2
+
+            # The cached sentences are reused
+            splitter.split_function = None
+            assert splitter.split(texts[::-1]) == expected[::-1]
+
+    def test_persistent_sentence_splitter(self):
+        texts = ["The first sentence. The second.", "One sentence"]
+        expected = sentence_split(DEFAULT_IMAGE, texts)
+        splitter = get_sentence_splitter(DEFAULT_IMAGE, persistent=True, cache=False)
+        try:
+            assert splitter.split(texts) == expected
+            assert splitter.split(texts[:1]) == expected[:1]
+        finally:
+            splitter.close()
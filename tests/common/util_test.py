@@ -11,6 +11,39 @@ class TestUtil(unittest.TestCase):
         assert util.flatten(["1", "2"]) == "1 2"
         assert util.flatten(["1", "2"], separator="-") == "1-2"
 
+    def test_hash_texts(self):
+        assert util.hash_texts(["A", "B"]) == util.hash_texts(["A", "B"])
+        assert util.hash_texts(["A", "B"]) != util.hash_texts(["B", "A"])
+        # A single reference with two sentences is not the same as two references
+        assert util.hash_texts([["A", "B"]]) != util.hash_texts(["A", "B"])
+        # The digest does not depend on the process
+        assert util.hash_texts(["A"]) == "b2674fbc6d7e2278a5f810be628c82e8"
+
+    def test_group_by_references_keys(self):
+        candidates = ["1", "2", "3"]
+        references_list = [["A"], ["B"], ["A"]]
+        (
+            grouped_candidates_list,
+            grouped_references_list,
+            mapping,
+            keys,
+        ) = util.group_by_references(candidates, references_list, return_keys=True)
+        assert grouped_candidates_list == [["1", "3"], ["2"]]
+        assert keys == [util.hash_texts(["A"]), util.hash_texts(["B"])]
+
+    def test_deduplicate(self):
+        items = [("1", "A"), ("2", "A"), ("1", "A"), ("1", ["A"]), ("2", "A")]
+        distinct_items, mapping = util.deduplicate(items)
+        assert distinct_items == [("1", "A"), ("2", "A"), ("1", ["A"])]
+        assert mapping == [0, 1, 0, 2, 1]
+
+        values = ["a", "b", "c"]
+        assert util.expand_deduplicated(values, mapping) == ["a", "b", "a", "c", "b"]
+        expanded = util.expand_deduplicated([{"a": 1}], [0, 0])
+        assert expanded == [{"a": 1}, {"a": 1}]
+        assert expanded[0] is not expanded[1]
+        assert util.deduplicate([]) == ([], [])
+
     def test_group_by_references(self):
         # Each `references` can either be
         #   (1) a List[str] of length 1 for a single reference
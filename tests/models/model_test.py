@@ -1,9 +1,12 @@
 import json
+import os
 import pytest
+import time
 import unittest
 from typing import List
 
-from repro.models import Model, ParallelModel
+from repro.common import TemporaryDirectory
+from repro.models import CachedModel, Model, ParallelModel
 from repro.models.zhang2020 import BERTScore
 from repro.testing import (
     FIXTURES_ROOT,
@@ -12,6 +15,144 @@ from repro.testing import (
 )
 
 
+@Model.register("cached-model-test-metric", exist_ok=True)
+class _CountingMetric(Model):
+    """A metric which records the values it scored"""
+
+    scored = []
+
+    def __init__(self, scale: int = 1, device: int = -1):
+        self.scale = scale
+
+    def predict_batch(self, inputs: List, **kwargs):
+        _CountingMetric.scored.extend(inp["value"] for inp in inputs)
+        micro = [{"value": inp["value"] * self.scale} for inp in inputs]
+        macro = {"value": sum(m["value"] for m in micro) / len(micro)}
+        return macro, micro
+
+
+@Model.register("cached-model-test-corpus-metric", exist_ok=True)
+class _CorpusMetric(Model):
+    """A corpus-level metric which does not return input-level scores"""
+
+    def __init__(self, device: int = -1):
+        pass
+
+    def predict_batch(self, inputs: List, **kwargs):
+        return {"total": sum(inp["value"] for inp in inputs)}, []
+
+
+@Model.register("cached-model-test-interval-metric", exist_ok=True)
+class _IntervalMetric(Model):
+    """A metric whose macro results include more than the average"""
+
+    scored = []
+
+    def __init__(self, device: int = -1):
+        pass
+
+    def predict_batch(self, inputs: List, **kwargs):
+        _IntervalMetric.scored.extend(inp["value"] for inp in inputs)
+        micro = [{"value": inp["value"]} for inp in inputs]
+        values = [m["value"] for m in micro]
+        macro = {
+            "value": sum(values) / len(values),
+            "value_ci": [min(values), max(values)],
+        }
+        return macro, micro
+
+
+class TestCachedModel(unittest.TestCase):
+    def test_cached_model(self):
+        with TemporaryDirectory() as temp_dir:
+            cache_file = f"{temp_dir}/cache.sqlite"
+            model = CachedModel("cached-model-test-metric", cache_file=cache_file)
+
+            _CountingMetric.scored.clear()
+            inputs = [{"value": value} for value in [1, 2, 3]]
+            assert model.predict_batch(inputs) == (
+                {"value": 2.0},
+                [{"value": 1}, {"value": 2}, {"value": 3}],
+            )
+            assert _CountingMetric.scored == [1, 2, 3]
+
+            # Only the new instances are scored and the order is preserved
+            _CountingMetric.scored.clear()
+            inputs = [{"value": value} for value in [4, 3, 4, 1]]
+            macro, micro = model.predict_batch(inputs)
+            assert _CountingMetric.scored == [4]
+            assert macro == {"value": 3.0}
+            assert micro == [{"value": 4}, {"value": 3}, {"value": 4}, {"value": 1}]
+
+            # Different kwargs are cached separately, except for ignored kwargs
+            _CountingMetric.scored.clear()
+            model = CachedModel(
+                "cached-model-test-metric", {"scale": 2}, cache_file=cache_file
+            )
+            _, micro = model.predict_batch([{"value": 1}])
+            assert micro == [{"value": 2}]
+            assert _CountingMetric.scored == [1]
+
+            _CountingMetric.scored.clear()
+            model = CachedModel(
+                "cached-model-test-metric", {"device": 0}, cache_file=cache_file
+            )
+            macro, micro = model.predict_batch([{"value": 1}])
+            assert macro == {"value": 1.0}
+            assert micro == [{"value": 1}]
+            assert _CountingMetric.scored == []
+
+    def test_cached_model_corpus_metric(self):
+        # Corpus-level metrics cannot be cached, so their output is returned
+        with TemporaryDirectory() as temp_dir:
+            cache_file = f"{temp_dir}/cache.sqlite"
+            model = CachedModel(
+                "cached-model-test-corpus-metric", cache_file=cache_file
+            )
+
+            inputs = [{"value": value} for value in [1, 2, 3]]
+            assert model.predict_batch(inputs) == ({"total": 6}, [])
+            assert model.predict_batch(inputs) == ({"total": 6}, [])
+
+            # Duplicate inputs are scored too
+            inputs = [{"value": value} for value in [1, 2, 2]]
+            assert model.predict_batch(inputs) == ({"total": 5}, [])
+
+    def test_cached_model_non_average_macro(self):
+        # The macro results are not the average of the micro results, so they
+        # would be wrong if some of the inputs came from the cache
+        with TemporaryDirectory() as temp_dir:
+            cache_file = f"{temp_dir}/cache.sqlite"
+            model = CachedModel(
+                "cached-model-test-interval-metric", cache_file=cache_file
+            )
+
+            _IntervalMetric.scored.clear()
+            inputs = [{"value": value} for value in [1, 3]]
+            assert model.predict_batch(inputs) == (
+                {"value": 2.0, "value_ci": [1, 3]},
+                [{"value": 1}, {"value": 3}],
+            )
+
+            _IntervalMetric.scored.clear()
+            inputs = [{"value": value} for value in [1, 3, 5, 5]]
+            macro, micro = model.predict_batch(inputs)
+            assert macro == {"value": 3.5, "value_ci": [1, 5]}
+            assert micro == [{"value": 1}, {"value": 3}, {"value": 5}, {"value": 5}]
+            # Nothing was cached, and the model is now called directly
+            assert _IntervalMetric.scored == [1, 3, 5, 5]
+
+            # A new wrapper has to score the distinct inputs before it
+            # finds out and scores all of the inputs again
+            _IntervalMetric.scored.clear()
+            model = CachedModel(
+                "cached-model-test-interval-metric", cache_file=cache_file
+            )
+            macro, _ = model.predict_batch(inputs)
+            assert macro == {"value": 3.5, "value_ci": [1, 5]}
+            assert _IntervalMetric.scored == [1, 3, 5, 1, 3, 5, 5]
+
+
 class TestParallelModel(unittest.TestCase):
     def test_cpu_parallel(self):
         # Tests to ensure all of the inputs are batched, processed
@@ -38,6 +179,127 @@ class TestParallelModel(unittest.TestCase):
                 expected += 1
         assert expected == num_inputs
 
+    def test_cpu_parallel_threads(self):
+        # The threads backend should return the same results as processes
+        class _IdentityModel(Model):
+            def predict_batch(self, inputs: List, **kwargs) -> List:
+                return inputs
+
+        model = ParallelModel(_IdentityModel, num_models=4, prefer="threads")
+        inputs = [{"value": value} for value in range(10)]
+        outputs_list = model.predict_batch(inputs)
+
+        assert len(outputs_list) == 4
+        values = [value["value"] for output in outputs_list for value in output]
+        assert values == list(range(10))
+
+    def test_cpu_parallel_chunked(self):
+        # The outputs should be merged in the same order as the inputs even
+        # though the chunks finish in a different order
+        class _SlowIdentityModel(Model):
+            def predict_batch(self, inputs: List, **kwargs) -> List:
+                if inputs[0]["value"] == 0:
+                    time.sleep(0.5)
+                return inputs
+
+        inputs = [{"value": value} for value in range(100)]
+        for prefer in [None, "threads"]:
+            model = ParallelModel(
+                _SlowIdentityModel, num_models=4, prefer=prefer, chunk_size=3
+            )
+            assert model.predict_batch(inputs) == inputs
+
+        # There can be more models than chunks
+        model = ParallelModel(_SlowIdentityModel, num_models=4, chunk_size=10)
+        assert model.predict_batch(inputs[:5]) == inputs[:5]
+        assert model.predict_batch([]) == []
+
+    def test_cpu_parallel_chunked_metrics(self):
+        class _Metric(Model):
+            def predict_batch(self, inputs: List, **kwargs):
+                micro = [{"value": inp["value"]} for inp in inputs]
+                macro = {"value": sum(inp["value"] for inp in inputs) / len(inputs)}
+                return macro, micro
+
+        inputs = [{"value": value} for value in range(10)]
+        model = ParallelModel(_Metric, num_models=3, chunk_size=4)
+        macro, micro = model.predict_batch(inputs)
+        assert macro == {"value": 4.5}
+        assert micro == inputs
+
+    def test_persistent(self):
+        # The same model instances should be used across calls
+        class _CountingModel(Model):
+            def __init__(self):
+                self.num_calls = 0
+
+            def predict_batch(self, inputs: List, **kwargs) -> List:
+                self.num_calls += 1
+                return [(os.getpid(), self.num_calls, inp["value"]) for inp in inputs]
+
+        inputs = [{"value": value} for value in range(8)]
+        for prefer in [None, "threads"]:
+            with ParallelModel(
+                _CountingModel, num_models=2, prefer=prefer, persistent=True
+            ) as model:
+                first = model.predict_batch(inputs)
+                second = model.predict_batch(inputs)
+
+            assert len(first) == len(second) == 2
+            for first_output, second_output in zip(first, second):
+                assert all(num_calls == 1 for _, num_calls, _ in first_output)
+                assert all(num_calls == 2 for _, num_calls, _ in second_output)
+                assert [pid for pid, _, _ in first_output] == [
+                    pid for pid, _, _ in second_output
+                ]
+            values = [value for output in second for _, _, value in output]
+            assert values == list(range(8))
+            assert model._workers is None
+
+    def test_models_are_closed(self):
+        # The models which are created for a single call are closed afterward,
+        # even if they fail
+        closed = []
+
+        class _ClosingModel(Model):
+            def predict_batch(self, inputs: List, **kwargs) -> List:
+                if any(inp["value"] < 0 for inp in inputs):
+                    raise ValueError("Negative value")
+                return inputs
+
+            def close(self) -> None:
+                closed.append(self)
+
+        inputs = [{"value": value} for value in range(8)]
+        for chunk_size in [None, 2]:
+            closed.clear()
+            model = ParallelModel(
+                _ClosingModel, num_models=2, prefer="threads", chunk_size=chunk_size
+            )
+            model.predict_batch(inputs)
+            assert len(closed) == 2
+
+            closed.clear()
+            with self.assertRaises(ValueError):
+                model.predict_batch(inputs + [{"value": -1}])
+            assert len(closed) == 2
+
+    def test_persistent_chunked(self):
+        class _IdentityModel(Model):
+            def predict_batch(self, inputs: List, **kwargs) -> List:
+                return inputs
+
+        inputs = [{"value": value} for value in range(50)]
+        model = ParallelModel(
+            _IdentityModel, num_models=3, chunk_size=4, persistent=True
+        )
+        try:
+            assert model.predict_batch(inputs) == inputs
+            assert model.predict_batch(inputs[:10]) == inputs[:10]
+            assert model.predict_batch([]) == []
+        finally:
+            model.close()
+
     @pytest.mark.skipif(
         len(get_testing_device_parameters(gpu_only=True)) < 2,
         reason="Test requres at least 2 available GPUs",
@@ -84,3 +346,7 @@ class TestParallelModel(unittest.TestCase):
         # Only one is allowed
         with self.assertRaises(ValueError):
             ParallelModel(_DummyModel, [{}, {}], num_models=2)
+
+        # The chunk size must be positive
+        with self.assertRaises(ValueError):
+            ParallelModel(_DummyModel, num_models=2, chunk_size=0)